@@ -0,0 +1,186 @@
+from elasticsearch import ApiError, ConnectionError, ConnectionTimeout, NotFoundError
+from elasticsearch.helpers import async_streaming_bulk
+from collections import deque
+import asyncio
+import time
+from create_inference import ELSER_INFERENCE_CONFIG
+from create_inference_openai import extract_completion
+from endpoint_cache import registry
+from retry import CircuitOpenError, retry_call_async
+from search_cache import search_cache
+from ingest import ELSER_MODEL_ID, REFRESH_POLICIES, iter_batches
+from search_profiles import DEFAULT_PROFILE
+from usage_examples import build_semantic_search_body
+
+# asyncio versions of the toolkit functions, built on AsyncElasticsearch
+# (see es_client.build_async_client). They mirror the synchronous functions in
+# create_inference.py, create_inference_openai.py, usage_examples.py and
+# streamlit_app.py so a slow inference call only blocks its own task.
+
+
+async def create_or_get_inference(client, inference_id, task_type="sparse_embedding", inference_config=None,
+                                  allow_new_id=True):
+    if inference_config is None:
+        inference_config = ELSER_INFERENCE_CONFIG
+    cached_id = registry.get(task_type, inference_id)
+    if cached_id:
+        return cached_id
+
+    endpoint = f"inference/{task_type}/{inference_id}"
+    try:
+        # Check if inference already exists
+        try:
+            await retry_call_async(client.inference.get, task_type=task_type, inference_id=inference_id,
+                                   endpoint=endpoint, operation="inference.get")
+            registry.put(task_type, inference_id)
+            return inference_id
+        except NotFoundError:
+            # Inference doesn't exist, proceed with creation
+            pass
+
+        await retry_call_async(
+            client.inference.put,
+            task_type=task_type,
+            inference_id=inference_id,
+            inference_config=inference_config,
+            endpoint=endpoint, operation="inference.put"
+        )
+        registry.put(task_type, inference_id)
+        return inference_id
+    except (ConnectionError, ConnectionTimeout, CircuitOpenError) as e:
+        print(f"Unable to create inference: {e}")
+        return None
+    except ApiError as e:
+        print(f"Error creating inference: {e}")
+        if "Model IDs must be unique" in str(e) and allow_new_id:
+            new_id = f"{inference_id}_{int(time.time())}"
+            print(f"Attempting to create inference with a new ID: {new_id}")
+            resolved_id = await create_or_get_inference(client, new_id, task_type, inference_config,
+                                                        allow_new_id=False)
+            if resolved_id:
+                registry.put(task_type, inference_id, resolved_id)
+            return resolved_id
+        return None
+
+
+async def semantic_search(client, index_name, query, profile=DEFAULT_PROFILE, size=10, search_after=None,
+                          mode="text_expansion", inference_id=None, pruning_config=None):
+    search_body = build_semantic_search_body(query, profile, size=size, search_after=search_after,
+                                             mode=mode, inference_id=inference_id, pruning_config=pruning_config)
+    return await client.search(index=index_name, body=search_body)
+
+
+async def use_openai_inference(client, inference_id, input_text):
+    resp = await retry_call_async(
+        client.inference.inference,
+        task_type="completion",
+        inference_id=inference_id,
+        input=input_text,
+        endpoint=f"inference/completion/{inference_id}", operation="inference.completion"
+    )
+    return extract_completion(resp)
+
+
+async def embed_batch(client, docs, model_id=ELSER_MODEL_ID, text_field="content", vector_field="content_vector"):
+    resp = await retry_call_async(
+        client.ml.infer_trained_model,
+        model_id=model_id,
+        docs=[{"text_field": doc[text_field]} for doc in docs],
+        endpoint=f"ml/{model_id}", operation="ml.infer_trained_model"
+    )
+    for doc, result in zip(docs, resp["inference_results"]):
+        doc[vector_field] = result["predicted_value"]
+    return docs
+
+
+async def index_documents(client, index_name, documents, batch_size=32, max_in_flight=4,
+                          refresh="end", pipeline=None):
+    if refresh not in REFRESH_POLICIES:
+        raise ValueError(f"Unknown refresh policy '{refresh}', expected one of {REFRESH_POLICIES}")
+
+    async def batches():
+        if pipeline:
+            for batch in iter_batches(documents, batch_size):
+                yield batch
+            return
+        # Keep up to max_in_flight embedding requests running ahead of the bulk writer
+        pending = deque()
+        try:
+            for batch in iter_batches(documents, batch_size):
+                if len(pending) >= max_in_flight:
+                    yield await pending.popleft()
+                pending.append(asyncio.ensure_future(embed_batch(client, batch)))
+            while pending:
+                yield await pending.popleft()
+        finally:
+            # After a failure, don't leave embeddings running against the endpoint
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    embedded = batches()
+
+    async def actions():
+        next_id = 1
+        async for batch in embedded:
+            for doc in batch:
+                doc = dict(doc)
+                doc_id = doc.pop("_id", None)
+                if doc_id is None:
+                    doc_id = next_id
+                    next_id += 1
+                yield {"_index": index_name, "_id": str(doc_id), "_source": doc}
+
+    bulk_kwargs = {"chunk_size": batch_size, "raise_on_error": False}
+    if pipeline:
+        bulk_kwargs["pipeline"] = pipeline
+    if refresh in ("wait_for", "true"):
+        bulk_kwargs["refresh"] = refresh
+
+    stats = {"indexed": 0, "failed": 0, "seconds": 0.0, "docs_per_sec": 0.0}
+    start = time.perf_counter()
+    try:
+        async for ok, item in async_streaming_bulk(client, actions(), **bulk_kwargs):
+            if ok:
+                stats["indexed"] += 1
+            else:
+                stats["failed"] += 1
+    finally:
+        # Also when the bulk load itself fails
+        await embedded.aclose()
+
+    if refresh == "end":
+        await client.indices.refresh(index=index_name)
+    search_cache.invalidate_index(index_name)
+
+    stats["seconds"] = time.perf_counter() - start
+    if stats["seconds"] > 0:
+        stats["docs_per_sec"] = stats["indexed"] / stats["seconds"]
+    return stats
+
+
+async def gather_bounded(factories, limit=10, return_exceptions=False):
+    # Run coroutine factories concurrently with at most `limit` in flight.
+    # Factories (zero-argument callables) are used instead of coroutine objects
+    # so work that is waiting for the semaphore hasn't been created yet.
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(factory):
+        async with semaphore:
+            return await factory()
+
+    return await asyncio.gather(*(run(f) for f in factories), return_exceptions=return_exceptions)
+
+
+async def search_many(client, index_name, queries, limit=10, return_exceptions=False):
+    return await gather_bounded(
+        [lambda q=q: semantic_search(client, index_name, q) for q in queries],
+        limit=limit, return_exceptions=return_exceptions
+    )
+
+
+async def complete_many(client, inference_id, inputs, limit=10, return_exceptions=False):
+    return await gather_bounded(
+        [lambda text=text: use_openai_inference(client, inference_id, text) for text in inputs],
+        limit=limit, return_exceptions=return_exceptions
+    )
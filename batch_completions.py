@@ -0,0 +1,178 @@
+from elasticsearch import ApiError, ConnectionError, ConnectionTimeout
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import argparse
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from create_inference_openai import create_or_get_inference, extract_completion
+from es_client import get_client
+from ingest import read_jsonl
+from latency import summarize
+from retry import CircuitOpenError, RetryPolicy, default_policy, retry_metrics, single_attempt
+
+load_dotenv()
+
+
+class TokenBucket:
+    # Allows `rate` requests per second on average with bursts of up to `burst`.
+    # pause() stops every worker until the given time, e.g. for a Retry-After.
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait_for = (1 - self.tokens) / self.rate
+                else:
+                    wait_for = self.paused_until - now
+            time.sleep(wait_for)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.updated = max(self.updated, self.paused_until)
+            self.tokens = 0
+
+
+def complete_prompt(client, inference_id, record, bucket, policy):
+    prompt = record.get("input", record.get("prompt"))
+    latencies = []
+
+    def attempt():
+        bucket.acquire()
+        start = time.perf_counter()
+        try:
+            return client.inference.inference(task_type="completion", inference_id=inference_id, input=prompt)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    def on_retry(error, delay):
+        # Throttle every worker, not just this one, when the service pushes back
+        if isinstance(error, ApiError) and error.meta.status == 429:
+            bucket.pause(delay)
+
+    try:
+        resp = policy.call(attempt, endpoint=f"inference/completion/{inference_id}",
+                           operation="inference.completion", on_retry=on_retry)
+    except (ApiError, ConnectionError, ConnectionTimeout, CircuitOpenError) as e:
+        return {"id": record["id"], "input": prompt, "error": str(e), "attempts": len(latencies)}
+    return {
+        "id": record["id"],
+        "input": prompt,
+        "completion": extract_completion(resp),
+        "latency_ms": latencies[-1] * 1000,
+        "attempts": len(latencies),
+    }
+
+
+def completed_ids(output_path):
+    # IDs that already have a successful result, so a rerun can resume
+    done = set()
+    if os.path.exists(output_path):
+        for record in read_jsonl(output_path):
+            if "error" not in record:
+                done.add(record["id"])
+    return done
+
+
+def iter_prompts(input_path, skip_ids):
+    for line_number, record in enumerate(read_jsonl(input_path), start=1):
+        if isinstance(record, str):
+            record = {"input": record}
+        record.setdefault("id", line_number)
+        if record["id"] not in skip_ids:
+            yield record
+
+
+def run_batch(client, inference_id, input_path, output_path, workers=8, rate=5.0, burst=None, max_retries=5):
+    skip_ids = completed_ids(output_path)
+    bucket = TokenBucket(rate, burst)
+    policy = RetryPolicy(
+        max_attempts=max_retries,
+        base_delay=default_policy.base_delay,
+        max_delay=default_policy.max_delay,
+        deadline=default_policy.deadline,
+    )
+    # Without transport retries every HTTP request takes a token and 429s reach
+    # the policy (and bucket.pause) instead of being retried immediately
+    client = single_attempt(client)
+    latencies = []
+    summary = {"succeeded": 0, "failed": 0, "skipped": len(skip_ids)}
+    start = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+
+        def drain(block_until):
+            done, still_pending = wait(pending, return_when=block_until)
+            for future in done:
+                result = future.result()
+                if "error" in result:
+                    summary["failed"] += 1
+                else:
+                    summary["succeeded"] += 1
+                    latencies.append(result["latency_ms"] / 1000)
+                out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            return still_pending
+
+        # Prompts are read lazily; at most 2 * workers are queued at once
+        for record in iter_prompts(input_path, skip_ids):
+            if len(pending) >= workers * 2:
+                pending = drain(FIRST_COMPLETED)
+            pending.add(executor.submit(complete_prompt, client, inference_id, record, bucket, policy))
+        while pending:
+            pending = drain(FIRST_COMPLETED)
+
+    elapsed = time.perf_counter() - start
+    summary["elapsed_seconds"] = elapsed
+    summary["latency"] = summarize(latencies, elapsed)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run completions for every prompt in a JSONL file")
+    parser.add_argument("input", help="JSONL with {'id': ..., 'input': ...} objects (or plain strings)")
+    parser.add_argument("output", help="JSONL results file; existing successful results are skipped")
+    parser.add_argument("--inference-id", default="openai_chat_completions")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=5.0, help="requests per second")
+    parser.add_argument("--burst", type=int, default=None, help="token bucket size (defaults to the rate)")
+    parser.add_argument("--max-retries", type=int, default=5)
+    args = parser.parse_args()
+
+    client = get_client()
+    inference_id = create_or_get_inference(client, args.inference_id)
+    if not inference_id:
+        print("Failed to create or get inference. Aborting.")
+        return
+
+    summary = run_batch(client, inference_id, args.input, args.output, workers=args.workers,
+                        rate=args.rate, burst=args.burst, max_retries=args.max_retries)
+    latency = summary["latency"]
+    print(f"Succeeded: {summary['succeeded']}, failed: {summary['failed']}, "
+          f"skipped (already done): {summary['skipped']}")
+    print(f"Elapsed: {summary['elapsed_seconds']:.1f}s, "
+          f"throughput: {latency.get('throughput_per_sec', 0):.2f} completions/sec")
+    print(f"Latency p50: {latency['p50_ms']:.0f} ms, p95: {latency['p95_ms']:.0f} ms, "
+          f"p99: {latency['p99_ms']:.0f} ms")
+    retries = retry_metrics.snapshot().get("inference.completion", {})
+    print(f"Retries: {retries.get('retries', 0)}, time spent backing off: {retries.get('backoff_seconds', 0):.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import time
+from async_toolkit import create_or_get_inference, gather_bounded, index_documents, semantic_search, use_openai_inference
+from benchmarks.corpus import WORDS, synthetic_documents
+from es_client import build_async_client
+from latency import summarize
+from mock_elasticsearch import start_mock_server
+
+# Shows how latency and throughput of the async search and completion paths
+# scale with the concurrency limit, against the mock Elasticsearch with a fixed
+# per-request latency.
+
+INDEX_NAME = "bench_async"
+
+
+async def timed(call, latencies):
+    start = time.perf_counter()
+    result = await call()
+    latencies.append(time.perf_counter() - start)
+    return result
+
+
+async def run_level(client, operation, requests, concurrency):
+    latencies = []
+    if operation == "search":
+        factories = [
+            lambda i=i: timed(lambda: semantic_search(client, INDEX_NAME, f"{WORDS[i % len(WORDS)]} benefits"), latencies)
+            for i in range(requests)
+        ]
+    else:
+        factories = [
+            lambda i=i: timed(lambda: use_openai_inference(client, "openai_chat_completions", f"Prompt {i}"), latencies)
+            for i in range(requests)
+        ]
+    start = time.perf_counter()
+    await gather_bounded(factories, limit=concurrency)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def run(args, url):
+    levels = [int(level) for level in args.levels.split(",")]
+    client = build_async_client(hosts=[url], connections_per_node=max(levels))
+    try:
+        await client.options(ignore_status=[400, 404]).indices.delete(index=INDEX_NAME)
+        await index_documents(client, INDEX_NAME, synthetic_documents(args.docs, words_per_doc=40))
+        await create_or_get_inference(client, "openai_chat_completions", task_type="completion",
+                                      inference_config={"service": "openai", "service_settings": {}})
+
+        print(f"\n{'operation':<11} {'concurrency':>11} {'req/sec':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for operation in ("search", "completion"):
+            for concurrency in levels:
+                s = await run_level(client, operation, args.requests, concurrency)
+                print(f"{operation:<11} {concurrency:>11} {s['throughput_per_sec']:>9.1f} "
+                      f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}")
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark async fan-out against the mock Elasticsearch")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--levels", default="1,4,16,64", help="comma-separated concurrency limits")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated latency per request")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(latency=args.latency)
+    try:
+        asyncio.run(run(args, url))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
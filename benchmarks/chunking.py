@@ -0,0 +1,108 @@
+import argparse
+import random
+import time
+from benchmarks.corpus import WORDS
+from chunking import create_chunked_index, index_chunked_documents, parent_results
+from es_client import build_client
+from ingest import bulk_index_documents
+from latency import summarize
+from mock_elasticsearch import start_mock_server
+from semantic_text import index_size_in_bytes
+from usage_examples import create_index, semantic_search
+
+# Chunk size vs. ingest throughput, index size and recall. Each long document
+# hides a "needle" phrase at a random depth; a query for the needle should
+# return its document. Without chunking, needles past ELSER's 512-token
+# window are never embedded, which is what the recall column shows.
+
+INDEX_NAME = "bench_chunking"
+
+
+def long_documents(count, words_per_doc=1500, seed=7):
+    rng = random.Random(seed)
+    docs, needles = [], []
+    for i in range(count):
+        sentences = []
+        while sum(len(s.split()) for s in sentences) < words_per_doc:
+            words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        needle = f"needle{i}alpha needle{i}beta needle{i}gamma"
+        sentences.insert(rng.randrange(len(sentences)), needle.capitalize() + ".")
+        # Paragraphs of five sentences
+        content = "\n\n".join(" ".join(sentences[j:j + 5]) for j in range(0, len(sentences), 5))
+        docs.append({"_id": str(i), "title": f"Document {i}", "content": content})
+        needles.append((str(i), needle))
+    return docs, needles
+
+
+def measure_recall(client, needles, k, chunk_storage):
+    hits, latencies = 0, []
+    for doc_id, needle in needles:
+        start = time.perf_counter()
+        resp = semantic_search(client, INDEX_NAME, needle, size=k, chunk_storage=chunk_storage)
+        latencies.append(time.perf_counter() - start)
+        if chunk_storage:
+            ids = [result["parent_id"] for result in parent_results(resp, chunk_storage)]
+        else:
+            ids = [hit["_id"] for hit in resp["hits"]["hits"]]
+        hits += doc_id in ids
+    return hits / len(needles), summarize(latencies)
+
+
+def run_config(client, docs, needles, storage, strategy, max_tokens, overlap, k):
+    start = time.perf_counter()
+    if storage is None:
+        create_index(client, INDEX_NAME)
+        stats = bulk_index_documents(client, INDEX_NAME, [dict(doc) for doc in docs])
+    else:
+        create_chunked_index(client, INDEX_NAME, storage)
+        stats = index_chunked_documents(client, INDEX_NAME, [dict(doc) for doc in docs], storage=storage,
+                                        strategy=strategy, max_tokens=max_tokens, overlap=overlap)
+    elapsed = time.perf_counter() - start
+    recall, latency = measure_recall(client, needles, k, storage)
+    return {
+        "config": "no chunking" if storage is None else f"{storage}/{strategy}/{max_tokens}",
+        "indexed": stats["indexed"],
+        "docs_per_sec": len(docs) / elapsed,
+        "index_mb": index_size_in_bytes(client, INDEX_NAME) / 1e6,
+        "recall": recall,
+        "p50_ms": latency["p50_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunk size vs. throughput and recall")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--words-per-doc", type=int, default=1500)
+    parser.add_argument("--sizes", default="128,256,512", help="comma-separated max_tokens values")
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--strategy", default="sentence", choices=("token", "sentence", "paragraph"))
+    parser.add_argument("--storage", default="separate,nested", help="comma-separated storage layouts")
+    parser.add_argument("--k", type=int, default=10, help="recall@k")
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated latency per request")
+    parser.add_argument("--infer-latency-per-doc", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    server, url = start_mock_server(latency=args.latency, infer_latency_per_doc=args.infer_latency_per_doc)
+    client = build_client(hosts=[url])
+    docs, needles = long_documents(args.docs, args.words_per_doc)
+    configs = [(None, None, None)] + [
+        (storage, args.strategy, int(size))
+        for storage in args.storage.split(",") for size in args.sizes.split(",")
+    ]
+    try:
+        results = [
+            run_config(client, docs, needles, storage, strategy, max_tokens, args.overlap, args.k)
+            for storage, strategy, max_tokens in configs
+        ]
+    finally:
+        server.shutdown()
+
+    print(f"\n{'config':<26} {'indexed':>8} {'docs/sec':>9} {'index MB':>9} {f'recall@{args.k}':>10} {'p50 ms':>7}")
+    for r in results:
+        print(f"{r['config']:<26} {r['indexed']:>8} {r['docs_per_sec']:>9.1f} {r['index_mb']:>9.2f} "
+              f"{r['recall']:>10.2f} {r['p50_ms']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import random
+
+WORDS = (
+    "exercise health sleep diet muscle heart weight glucose insulin recovery cognitive nutrient "
+    "vegetable fruit grain protein energy calorie stress memory focus training running walking "
+    "strength balance hydration vitamin mineral metabolism obesity diabetes blood pressure mental "
+    "wellbeing routine habit recovery posture stretching cardio endurance rest immune system"
+).split()
+
+
+def synthetic_documents(count, words_per_doc=120, seed=42):
+    rng = random.Random(seed)
+    for i in range(count):
+        title = " ".join(rng.choice(WORDS) for _ in range(4)).title()
+        content = " ".join(rng.choice(WORDS) for _ in range(words_per_doc))
+        yield {"title": title, "content": content}
@@ -0,0 +1,73 @@
+import argparse
+import time
+from benchmarks.corpus import WORDS, synthetic_documents
+from es_client import build_client
+from hybrid_search import build_fusion_searches, hybrid_search, rrf_fuse
+from ingest import bulk_index_documents
+from latency import summarize
+from mock_elasticsearch import start_mock_server
+from usage_examples import create_index, semantic_search
+
+# Hybrid search latency against the single-mode semantic search. "two searches"
+# is the naive client-side hybrid (one lexical and one semantic search back to
+# back), which is what the single-request methods avoid.
+
+INDEX_NAME = "bench_hybrid"
+
+
+def two_searches(client, index_name, query):
+    responses = [client.search(index=index_name, body=body) for body in build_fusion_searches(query)]
+    return rrf_fuse(responses)
+
+
+def measure(server, queries, search):
+    server.cluster.reset_stats()
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - start)
+    summary = summarize(latencies)
+    summary["requests_per_query"] = server.cluster.stats["requests"] / len(queries)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hybrid BM25 + ELSER search against semantic search")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated latency per request")
+    args = parser.parse_args()
+
+    queries = [f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} benefits" for i in range(args.queries)]
+    server, url = start_mock_server(latency=args.latency)
+    # The same mock without the retriever API, to exercise the _msearch fallback
+    legacy_server, legacy_url = start_mock_server(latency=args.latency, retrievers=False)
+    client = build_client(hosts=[url])
+    legacy_client = build_client(hosts=[legacy_url])
+    rows = []
+    try:
+        for c in (client, legacy_client):
+            create_index(c, INDEX_NAME)
+            bulk_index_documents(c, INDEX_NAME, synthetic_documents(args.docs))
+
+        rows.append(("semantic only", measure(server, queries, lambda q: semantic_search(client, INDEX_NAME, q))))
+        for method in ("rrf", "linear", "client"):
+            rows.append((f"hybrid {method}", measure(
+                server, queries, lambda q, m=method: hybrid_search(client, INDEX_NAME, q, method=m)
+            )))
+        rows.append(("hybrid rrf (fallback)", measure(
+            legacy_server, queries, lambda q: hybrid_search(legacy_client, INDEX_NAME, q, method="rrf")
+        )))
+        rows.append(("two searches", measure(server, queries, lambda q: two_searches(client, INDEX_NAME, q))))
+    finally:
+        server.shutdown()
+        legacy_server.shutdown()
+
+    print(f"\n{'search':<22} {'requests/q':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, r in rows:
+        print(f"{name:<22} {r['requests_per_query']:>10.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
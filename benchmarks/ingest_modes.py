@@ -0,0 +1,68 @@
+import argparse
+from es_client import build_client
+from mock_elasticsearch import start_mock_server
+from ingest import bulk_index_documents, create_or_get_ingest_pipeline
+from create_inference import create_or_get_inference
+from benchmarks.corpus import synthetic_documents
+
+# Compares client-side embedding (infer_trained_model + bulk with vectors)
+# against server-side embedding through an ingest pipeline, on docs/sec and
+# bytes sent to the cluster, using the in-memory mock Elasticsearch.
+
+INDEX_NAME = "bench_ingest_modes"
+
+
+def run_mode(client, cluster, mode, docs, batch_size, workers, pipeline_id):
+    client.options(ignore_status=[400, 404]).indices.delete(index=INDEX_NAME)
+    client.indices.create(index=INDEX_NAME, mappings={
+        "properties": {
+            "title": {"type": "text"},
+            "content": {"type": "text"},
+            "content_vector": {"type": "sparse_vector"}
+        }
+    })
+    cluster.reset_stats()
+    stats = bulk_index_documents(
+        client, INDEX_NAME, synthetic_documents(docs),
+        batch_size=batch_size, thread_count=workers, max_in_flight=workers,
+        pipeline=pipeline_id if mode == "pipeline" else None
+    )
+    return {
+        "mode": mode,
+        "docs": stats["indexed"],
+        "docs_per_sec": stats["docs_per_sec"],
+        "bytes_sent": cluster.stats["bytes_received"],
+        "requests": cluster.stats["requests"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark client-side vs ingest-pipeline embedding")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated network latency per request")
+    parser.add_argument("--infer-latency-per-doc", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    server, url = start_mock_server(latency=args.latency, infer_latency_per_doc=args.infer_latency_per_doc)
+    client = build_client(hosts=[url])
+    try:
+        inference_id = create_or_get_inference(client, "elser_embeddings")
+        pipeline_id = create_or_get_ingest_pipeline(client, "bench_elser_pipeline", inference_id)
+
+        results = [
+            run_mode(client, server.cluster, mode, args.docs, args.batch_size, args.workers, pipeline_id)
+            for mode in ("client", "pipeline")
+        ]
+    finally:
+        server.shutdown()
+
+    print(f"\n{'mode':<10} {'docs':>8} {'docs/sec':>10} {'bytes sent':>12} {'bytes/doc':>10} {'requests':>9}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['docs']:>8} {r['docs_per_sec']:>10.1f} {r['bytes_sent']:>12} "
+              f"{r['bytes_sent'] / max(r['docs'], 1):>10.1f} {r['requests']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import time
+import numpy as np
+from es_client import build_client
+from knn_search import knn_search
+from latency import summarize
+from mock_elasticsearch import start_mock_server
+from vector_loader import create_vector_index, load_vectors
+
+# Recall vs. latency of approximate kNN for each quantization and several
+# num_candidates values. Ground truth is exact cosine scoring of the same
+# vectors in NumPy; its per-query time is printed too. With --filtered every
+# document gets one of ten groups and each query is restricted to one group.
+
+INDEX_NAME = "bench_knn"
+GROUPS = 10
+
+
+def clustered_vectors(count, dims, clusters=50, seed=11):
+    # Real embeddings are clumpy; uniform noise would make every method look the same
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dims)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.35 * rng.standard_normal((count, dims))
+    return vectors.astype(np.float32)
+
+
+def exact_top_k(normalized, query, k, allowed=None):
+    scores = normalized @ (query / np.linalg.norm(query))
+    if allowed is not None:
+        scores = np.where(allowed, scores, -np.inf)
+    top = np.argpartition(-scores, k)[:k]
+    return {str(i) for i in top[np.argsort(-scores[top])]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark approximate kNN recall and latency vs exact NumPy")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--num-candidates", default="10,20,50,100,200,500")
+    parser.add_argument("--index-types", default="hnsw,int8_hnsw,int4_hnsw,bbq_hnsw")
+    parser.add_argument("--filtered", action="store_true", help="restrict each query to one of ten groups")
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated latency per request")
+    parser.add_argument("--latency-per-candidate", type=float, default=0.00002,
+                        help="simulated HNSW cost per candidate")
+    args = parser.parse_args()
+
+    vectors = clustered_vectors(args.docs, args.dims)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    groups = np.arange(args.docs) % GROUPS
+    texts = [f"group{g}" for g in groups] if args.filtered else None
+    rng = np.random.default_rng(5)
+    queries = vectors[rng.integers(0, args.docs, args.queries)] + 0.2 * rng.standard_normal((args.queries, args.dims))
+    query_groups = rng.integers(0, GROUPS, args.queries)
+
+    truth, exact_latencies = [], []
+    for query, group in zip(queries, query_groups):
+        start = time.perf_counter()
+        truth.append(exact_top_k(normalized, query, args.k, groups == group if args.filtered else None))
+        exact_latencies.append(time.perf_counter() - start)
+    exact = summarize(exact_latencies)
+
+    server, url = start_mock_server(latency=args.latency, knn_latency_per_candidate=args.latency_per_candidate)
+    client = build_client(hosts=[url])
+    rows = []
+    try:
+        for index_type in args.index_types.split(","):
+            create_vector_index(client, INDEX_NAME, args.dims, index_type)
+            load_vectors(client, INDEX_NAME, vectors, texts=texts)
+            for num_candidates in sorted(int(n) for n in args.num_candidates.split(",")):
+                if num_candidates < args.k:
+                    continue
+                hits, latencies = 0, []
+                for query, group, expected in zip(queries, query_groups, truth):
+                    knn_filter = {"match": {"text": f"group{group}"}} if args.filtered else None
+                    start = time.perf_counter()
+                    resp = knn_search(client, INDEX_NAME, query, k=args.k, num_candidates=num_candidates,
+                                      filter=knn_filter)
+                    latencies.append(time.perf_counter() - start)
+                    hits += len(expected & {hit["_id"] for hit in resp["hits"]["hits"]})
+                latency = summarize(latencies)
+                rows.append((index_type, num_candidates, hits / (args.k * args.queries),
+                             latency["p50_ms"], latency["p95_ms"]))
+    finally:
+        server.shutdown()
+
+    print(f"\nexact NumPy ({args.docs} x {args.dims}): p50 {exact['p50_ms']:.2f} ms, p95 {exact['p95_ms']:.2f} ms")
+    print(f"{'index type':<11} {'num_candidates':>14} {f'recall@{args.k}':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for index_type, num_candidates, recall, p50, p95 in rows:
+        print(f"{index_type:<11} {num_candidates:>14} {recall:>10.3f} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import csv
+import itertools
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.corpus import WORDS, synthetic_documents
+from create_inference_openai import create_or_get_inference, run_completion
+from es_client import build_client
+from latency import LatencyHistogram
+from mock_elasticsearch import start_mock_server
+from search_coalescer import SearchCoalescer, format_stats
+from usage_examples import create_index, index_documents, semantic_search
+
+# Load generator for the search and completion paths.
+#   closed loop - N users each send a request, wait for the answer, then send
+#                 the next one; throughput follows latency
+#   open loop   - requests are sent on a fixed schedule (RPS) whether or not
+#                 earlier ones have finished; latency is measured from the
+#                 scheduled send time so queueing delay isn't hidden
+#                 (coordinated omission)
+# Runs against the bundled mock by default, so CI can fail the build with
+# --max-p99-ms / --max-error-rate; pass --url to load a real cluster.
+
+INDEX_NAME = "bench_load"
+INFERENCE_ID = "openai_chat_completions"
+
+
+class OperationStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.errors = 0
+        self.error_types = {}
+        self._lock = threading.Lock()
+
+    def record_error(self, error):
+        with self._lock:
+            self.errors += 1
+            name = type(error).__name__
+            self.error_types[name] = self.error_types.get(name, 0) + 1
+
+    def report(self, elapsed):
+        requests = self.histogram.count + self.errors
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": self.errors / requests if requests else 0.0,
+            "error_types": self.error_types,
+            "throughput_per_sec": self.histogram.count / elapsed if elapsed else 0.0,
+            "latency": self.histogram.summary(),
+            "histogram": self.histogram.distribution(),
+        }
+
+
+def make_operations(client, names, index_name, inference_id, mode, coalescer=None):
+    queries = [f"{a} {b}" for a, b in zip(WORDS, WORDS[3:] + WORDS[:3])]
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def next_query():
+        # Shared by every worker thread, so the position is taken under a lock
+        with lock:
+            position = next(counter)
+        return queries[position % len(queries)]
+
+    operations = {
+        "search": lambda: semantic_search(client, index_name, next_query(), mode=mode, coalescer=coalescer),
+        "completion": lambda: run_completion(client, inference_id, f"Summarize the benefits of {next_query()}"),
+    }
+    return {name: operations[name] for name in names}
+
+
+def timed_call(operation, stats, scheduled_at=None):
+    start = scheduled_at if scheduled_at is not None else time.perf_counter()
+    try:
+        operation()
+    except Exception as e:
+        stats.record_error(e)
+        return
+    stats.histogram.record(time.perf_counter() - start)
+
+
+def run_closed_loop(operations, stats, users, duration, think_time=0.0):
+    deadline = time.perf_counter() + duration
+    names = list(operations)
+
+    def user(number):
+        # Users alternate between the selected operations
+        for turn in itertools.count(number):
+            if time.perf_counter() >= deadline:
+                return
+            name = names[turn % len(names)]
+            timed_call(operations[name], stats[name])
+            if think_time:
+                time.sleep(think_time)
+
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(user, range(users)))
+
+
+def run_open_loop(operations, stats, rps, duration, max_in_flight=256):
+    names = list(operations)
+    total = int(rps * duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for i in range(total):
+            scheduled_at = start + i / rps
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            name = names[i % len(names)]
+            executor.submit(timed_call, operations[name], stats[name], scheduled_at)
+
+
+def run_load(client, args, index_name=INDEX_NAME, inference_id=INFERENCE_ID, coalescer=None):
+    operations = make_operations(client, args.operations.split(","), index_name, inference_id, args.query_mode,
+                                 coalescer)
+    stats = {name: OperationStats() for name in operations}
+    start = time.perf_counter()
+    if args.loop == "open":
+        run_open_loop(operations, stats, args.rps, args.duration, args.max_in_flight)
+    else:
+        run_closed_loop(operations, stats, args.users, args.duration, args.think_time)
+    elapsed = time.perf_counter() - start
+    return {
+        "loop": args.loop,
+        "rps": args.rps if args.loop == "open" else None,
+        "users": args.users if args.loop == "closed" else None,
+        "duration_seconds": elapsed,
+        "operations": {name: s.report(elapsed) for name, s in stats.items()},
+    }
+
+
+def write_csv(report, path):
+    fields = ["operation", "requests", "errors", "error_rate", "throughput_per_sec",
+              "min_ms", "mean_ms", "p50_ms", "p90_ms", "p95_ms", "p99_ms", "p999_ms", "max_ms"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for name, op in report["operations"].items():
+            writer.writerow({"operation": name, **op, **op["latency"]})
+
+
+def print_report(report):
+    load = f"{report['rps']} req/s" if report["loop"] == "open" else f"{report['users']} users"
+    print(f"\n{report['loop']}-loop, {load}, {report['duration_seconds']:.1f}s")
+    print(f"{'operation':<11} {'requests':>8} {'errors':>7} {'req/sec':>8} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'p99.9 ms':>9} {'max ms':>8}")
+    for name, op in report["operations"].items():
+        lat = op["latency"]
+        print(f"{name:<11} {op['requests']:>8} {op['errors']:>7} {op['throughput_per_sec']:>8.1f} "
+              f"{lat['p50_ms']:>8.1f} {lat['p90_ms']:>8.1f} {lat['p99_ms']:>8.1f} {lat['p999_ms']:>9.1f} "
+              f"{lat['max_ms']:>8.1f}")
+
+
+def check_thresholds(report, max_p99_ms=None, max_error_rate=None):
+    failures = []
+    for name, op in report["operations"].items():
+        if max_p99_ms is not None and op["latency"]["p99_ms"] > max_p99_ms:
+            failures.append(f"{name}: p99 {op['latency']['p99_ms']:.1f} ms > {max_p99_ms} ms")
+        if max_error_rate is not None and op["error_rate"] > max_error_rate:
+            failures.append(f"{name}: error rate {op['error_rate']:.2%} > {max_error_rate:.2%}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test semantic search and completions")
+    parser.add_argument("--loop", choices=("closed", "open"), default="closed")
+    parser.add_argument("--users", type=int, default=8, help="closed loop: concurrent users")
+    parser.add_argument("--think-time", type=float, default=0.0, help="closed loop: pause between requests")
+    parser.add_argument("--rps", type=float, default=50.0, help="open loop: requests per second")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="open loop: worker threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--operations", default="search,completion", help="comma-separated: search,completion")
+    parser.add_argument("--query-mode", default="text_expansion")
+    parser.add_argument("--coalesce-ms", type=float, default=None,
+                        help="batch concurrent searches into _msearch requests within this window")
+    parser.add_argument("--docs", type=int, default=500, help="documents indexed into the mock")
+    parser.add_argument("--latency", type=float, default=0.005, help="mock latency per request")
+    parser.add_argument("--url", help="load this cluster instead of the mock (index and endpoint must exist)")
+    parser.add_argument("--index", default=INDEX_NAME)
+    parser.add_argument("--inference-id", default=INFERENCE_ID)
+    parser.add_argument("--json", help="write the full report, including histograms, to this file")
+    parser.add_argument("--csv", help="write one summary row per operation to this file")
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="exit 1 if any p99 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="exit 1 if any error rate exceeds this")
+    args = parser.parse_args()
+
+    server = None
+    connections = args.users if args.loop == "closed" else args.max_in_flight
+    if args.url:
+        client = build_client(hosts=[args.url], connections_per_node=connections)
+    else:
+        server, url = start_mock_server(latency=args.latency)
+        client = build_client(hosts=[url], connections_per_node=connections)
+        create_index(client, args.index)
+        index_documents(client, args.index, synthetic_documents(args.docs, words_per_doc=40),
+                        use_embedding_cache=False)
+        create_or_get_inference(client, args.inference_id)
+
+    coalescer = SearchCoalescer(client, max_wait=args.coalesce_ms / 1000) if args.coalesce_ms is not None else None
+    try:
+        report = run_load(client, args, args.index, args.inference_id, coalescer)
+    finally:
+        if coalescer is not None:
+            coalescer.close()
+        if server:
+            server.shutdown()
+
+    print_report(report)
+    if coalescer is not None:
+        report["coalescing"] = coalescer.stats()
+        print(format_stats(report["coalescing"]))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.csv:
+        write_csv(report, args.csv)
+
+    failures = check_thresholds(report, args.max_p99_ms, args.max_error_rate)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
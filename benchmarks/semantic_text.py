@@ -0,0 +1,67 @@
+import argparse
+import time
+from benchmarks.corpus import WORDS, synthetic_documents
+from create_inference import create_or_get_inference
+from es_client import build_client
+from latency import summarize
+from mock_elasticsearch import start_mock_server
+from semantic_text import (DEFAULT_PRUNING_CONFIG, create_semantic_text_index, index_semantic_text_documents,
+                           index_size_in_bytes)
+from usage_examples import create_index, index_documents, semantic_search
+
+# Compares the current text_expansion setup with the sparse_vector query (with
+# token pruning) and the semantic_text mapping on ingest time, index size and
+# query latency, against the mock Elasticsearch.
+
+LEGACY_INDEX = "bench_legacy_sparse"
+SEMANTIC_INDEX = "bench_semantic_text"
+
+
+def query_latencies(client, index_name, queries, **search_kwargs):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        semantic_search(client, index_name, query, **search_kwargs)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text_expansion vs sparse_vector vs semantic_text")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    queries = [f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} benefits" for i in range(args.queries)]
+    server, url = start_mock_server(latency=args.latency)
+    client = build_client(hosts=[url])
+    rows = []
+    try:
+        inference_id = create_or_get_inference(client, "elser_embeddings")
+
+        create_index(client, LEGACY_INDEX)
+        legacy = index_documents(client, LEGACY_INDEX, documents=synthetic_documents(args.docs),
+                                 use_embedding_cache=False)
+        legacy_size = index_size_in_bytes(client, LEGACY_INDEX)
+        rows.append(("text_expansion", legacy, legacy_size,
+                     query_latencies(client, LEGACY_INDEX, queries)))
+        rows.append(("sparse_vector+prune", legacy, legacy_size,
+                     query_latencies(client, LEGACY_INDEX, queries, mode="sparse_vector",
+                                     inference_id=inference_id, pruning_config=DEFAULT_PRUNING_CONFIG)))
+
+        create_semantic_text_index(client, SEMANTIC_INDEX, inference_id)
+        semantic = index_semantic_text_documents(client, SEMANTIC_INDEX, synthetic_documents(args.docs))
+        rows.append(("semantic_text", semantic, index_size_in_bytes(client, SEMANTIC_INDEX),
+                     query_latencies(client, SEMANTIC_INDEX, queries, mode="semantic_text")))
+    finally:
+        server.shutdown()
+
+    print(f"\n{'mode':<20} {'ingest docs/s':>13} {'index bytes':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode, ingest, size, q in rows:
+        print(f"{mode:<20} {ingest['docs_per_sec']:>13.1f} {size:>12} "
+              f"{q['p50_ms']:>8.2f} {q['p95_ms']:>8.2f} {q['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import copy
+import re
+from ingest import ELSER_MODEL_ID, bulk_index_documents, embed_batch, embedded_batches
+from search_cache import search_cache
+
+# ELSER only looks at the first 512 tokens of its input, so the tail of a long
+# document is never embedded. Chunking splits content into overlapping
+# passages that are embedded separately. Sizes are counted in words, which is a
+# little under ELSER's wordpiece tokens; 256 words stays clear of the limit.
+#   "token"     - fixed windows of max_tokens words
+#   "sentence"  - whole sentences packed up to max_tokens words
+#   "paragraph" - whole paragraphs (blank-line separated) packed up to max_tokens
+# Overlap is always in words: for sentence/paragraph chunks, trailing units
+# totalling at most `overlap` words are repeated at the start of the next chunk.
+#
+# Two storage layouts:
+#   "separate" - one document per passage with parent_id, collapsed back to the
+#                parent at search time
+#   "nested"   - one document per parent with a nested "passages" field; the
+#                parent scores as its best passage
+STRATEGIES = ("token", "sentence", "paragraph")
+STORAGE_MODES = ("separate", "nested")
+
+PASSAGES_FIELD = "passages"
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def split_tokens(text, max_tokens=256, overlap=32):
+    words = text.split()
+    if len(words) <= max_tokens:
+        return [" ".join(words)] if words else []
+    step = max(1, max_tokens - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + max_tokens]))
+        if start + max_tokens >= len(words):
+            break
+    return chunks
+
+
+def pack_units(units, max_tokens=256, overlap=32):
+    chunks, current, length = [], [], 0
+    for unit in units:
+        size = len(unit.split())
+        if size > max_tokens:
+            # A single oversized sentence/paragraph falls back to word windows
+            if current:
+                chunks.append(" ".join(current))
+                current, length = [], 0
+            chunks.extend(split_tokens(unit, max_tokens, overlap))
+            continue
+        if current and length + size > max_tokens:
+            chunks.append(" ".join(current))
+            carried = []
+            for previous in reversed(current):
+                if sum(len(u.split()) for u in carried) + len(previous.split()) > overlap:
+                    break
+                carried.insert(0, previous)
+            current = carried
+            length = sum(len(u.split()) for u in current)
+            while current and length + size > max_tokens:
+                length -= len(current.pop(0).split())
+        current.append(unit)
+        length += size
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def chunk_text(text, strategy="sentence", max_tokens=256, overlap=32):
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy '{strategy}', expected one of {STRATEGIES}")
+    if strategy == "token":
+        return split_tokens(text, max_tokens, overlap)
+    pattern = SENTENCE_RE if strategy == "sentence" else PARAGRAPH_RE
+    units = [unit.strip() for unit in pattern.split(text) if unit.strip()]
+    return pack_units(units, max_tokens, overlap)
+
+
+def chunk_mappings(storage="separate"):
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown chunk storage '{storage}', expected one of {STORAGE_MODES}")
+    if storage == "nested":
+        return {
+            "properties": {
+                "title": {"type": "text"},
+                "content": {"type": "text"},
+                PASSAGES_FIELD: {
+                    "type": "nested",
+                    "properties": {
+                        "text": {"type": "text"},
+                        "vector": {"type": "sparse_vector"}
+                    }
+                }
+            }
+        }
+    return {
+        "properties": {
+            "title": {"type": "text"},
+            "content": {"type": "text"},
+            "content_vector": {"type": "sparse_vector"},
+            "parent_id": {"type": "keyword"},
+            "chunk": {"type": "integer"}
+        }
+    }
+
+
+def create_chunked_index(client, index_name, storage="separate"):
+    client.options(ignore_status=[400, 404]).indices.delete(index=index_name)
+    client.indices.create(index=index_name, mappings=chunk_mappings(storage))
+    search_cache.invalidate_index(index_name)
+    print(f"Index '{index_name}' created for {storage} chunks.")
+
+
+def passage_documents(documents, strategy="sentence", max_tokens=256, overlap=32, text_field="content",
+                      start_id=1):
+    # "separate" layout: one document per passage, IDs "<parent>_<n>"
+    next_id = start_id
+    for doc in documents:
+        doc = dict(doc)
+        parent_id = doc.pop("_id", None)
+        if parent_id is None:
+            parent_id = next_id
+            next_id += 1
+        for number, passage in enumerate(chunk_text(doc.get(text_field, ""), strategy, max_tokens, overlap)):
+            yield dict(doc, **{"_id": f"{parent_id}_{number}", "parent_id": str(parent_id), "chunk": number,
+                               text_field: passage})
+
+
+def nested_documents(documents, strategy="sentence", max_tokens=256, overlap=32, text_field="content"):
+    # "nested" layout: the parent keeps its content and gains a passages list
+    for doc in documents:
+        passages = chunk_text(doc.get(text_field, ""), strategy, max_tokens, overlap)
+        yield dict(doc, **{PASSAGES_FIELD: [{"text": passage} for passage in passages]})
+
+
+def embed_passages(client, docs, model_id=ELSER_MODEL_ID, cache=None, passage_batch_size=32):
+    # Passages are embedded passage_batch_size at a time so long documents don't
+    # make one oversized inference call; embed_batch sets the vector on each
+    # passage dict, which its parent document still holds.
+    passages = [passage for doc in docs for passage in doc[PASSAGES_FIELD]]
+    for start in range(0, len(passages), passage_batch_size):
+        embed_batch(client, passages[start:start + passage_batch_size], model_id=model_id, text_field="text",
+                    vector_field="vector", cache=cache)
+    return docs
+
+
+def index_chunked_documents(client, index_name, documents, storage="separate", strategy="sentence",
+                            max_tokens=256, overlap=32, batch_size=32, max_in_flight=4, model_id=ELSER_MODEL_ID,
+                            embedding_cache=None, **bulk_kwargs):
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown chunk storage '{storage}', expected one of {STORAGE_MODES}")
+    if storage == "separate":
+        return bulk_index_documents(
+            client, index_name, passage_documents(documents, strategy, max_tokens, overlap),
+            batch_size=batch_size, max_in_flight=max_in_flight, model_id=model_id,
+            embedding_cache=embedding_cache, **bulk_kwargs
+        )
+    batches = embedded_batches(
+        client, nested_documents(documents, strategy, max_tokens, overlap),
+        batch_size=batch_size, max_in_flight=max_in_flight, embed_fn=embed_passages,
+        model_id=model_id, cache=embedding_cache, passage_batch_size=batch_size
+    )
+    return bulk_index_documents(
+        client, index_name, (doc for batch in batches for doc in batch),
+        batch_size=batch_size, max_in_flight=max_in_flight, embed=False, **bulk_kwargs
+    )
+
+
+def chunked_search_body(search_body, storage="separate", passages_per_hit=3):
+    # Rewrites a content_vector search from build_semantic_search_body so that
+    # each hit is a parent document with its best-matching passages attached
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown chunk storage '{storage}', expected one of {STORAGE_MODES}")
+    if "search_after" in search_body:
+        raise ValueError("search_after pagination is not supported on collapsed chunk results; use from/size")
+    body = copy.deepcopy(search_body)
+    body.pop("sort", None)
+    if storage == "separate":
+        body["collapse"] = {
+            "field": "parent_id",
+            "inner_hits": {"name": PASSAGES_FIELD, "size": passages_per_hit, "_source": ["content", "chunk"]}
+        }
+        return body
+
+    query = body["query"]
+    if "text_expansion" in query:
+        _, config = next(iter(query["text_expansion"].items()))
+        query = {"text_expansion": {f"{PASSAGES_FIELD}.vector": config}}
+    elif "sparse_vector" in query:
+        query = {"sparse_vector": dict(query["sparse_vector"], field=f"{PASSAGES_FIELD}.vector")}
+    else:
+        raise ValueError("Only text_expansion and sparse_vector queries can target nested passages; "
+                         "semantic_text fields already chunk server-side")
+    body["query"] = {
+        "nested": {
+            "path": PASSAGES_FIELD,
+            "query": query,
+            "score_mode": "max",
+            "inner_hits": {"size": passages_per_hit, "_source": [f"{PASSAGES_FIELD}.text"]}
+        }
+    }
+    # The matching passages come back as inner hits; don't ship all of them
+    source = body.setdefault("_source", {})
+    if isinstance(source, dict):
+        source.setdefault("excludes", []).append(PASSAGES_FIELD)
+    return body
+
+
+def parent_results(resp, storage="separate"):
+    # [{"parent_id", "score", "title", "passages": [...]}] from a chunked search
+    results = []
+    for hit in resp["hits"]["hits"]:
+        source = hit.get("_source", {})
+        inner = hit.get("inner_hits", {}).get(PASSAGES_FIELD, {}).get("hits", {}).get("hits", [])
+        if storage == "separate":
+            parent_id = source.get("parent_id") or hit.get("fields", {}).get("parent_id", [None])[0]
+            passages = [h["_source"]["content"] for h in inner]
+        else:
+            parent_id = hit["_id"]
+            passages = [h["_source"]["text"] for h in inner]
+        results.append({"parent_id": parent_id, "score": hit["_score"], "title": source.get("title"),
+                        "passages": passages})
+    return results
@@ -1,19 +1,28 @@
-from elasticsearch import Elasticsearch, ApiError, ConnectionTimeout, NotFoundError
+from elasticsearch import ApiError, ConnectionError, ConnectionTimeout, NotFoundError
 import os
 import time
 from dotenv import load_dotenv
+from endpoint_cache import registry
+from es_client import get_client
+from retry import CircuitOpenError, retry_call
 load_dotenv() 
 
+ELSER_INFERENCE_CONFIG = {
+    "service": "elser",
+    "service_settings": {
+        # Run elser_autotune.py to pick these for your load
+        "num_allocations": int(os.getenv("ELSER_NUM_ALLOCATIONS", "1")),
+        "num_threads": int(os.getenv("ELSER_NUM_THREADS", "1"))
+    }
+}
+
 def main():
     api_key = os.getenv("ELASTIC_API_KEY")
     if not api_key:
         print("Error: ELASTIC_API_KEY environment variable is not set.")
         return
 
-    client = Elasticsearch(
-        "https://my-elastic-project-a943bc.es.us-east-1.aws.elastic.cloud:443",
-        api_key=api_key
-    )
+    client = get_client()
 
     # Check connection and print cluster info
     try:
@@ -28,49 +37,53 @@ def main():
     inference_id = "elser_embeddings"
     create_or_get_inference(client, inference_id)
 
-def create_or_get_inference(client, inference_id):
-    max_retries = 3
-    retry_delay = 5
+def create_or_get_inference(client, inference_id, allow_new_id=True):
+    # Skip the inference.get round-trip when the endpoint was seen recently
+    cached_id = registry.get("sparse_embedding", inference_id)
+    if cached_id:
+        return cached_id
 
-    for attempt in range(max_retries):
+    endpoint = f"inference/sparse_embedding/{inference_id}"
+    try:
+        # Check if inference already exists
         try:
-            # Check if inference already exists
-            try:
-                existing_inference = client.inference.get(task_type="sparse_embedding", inference_id=inference_id)
-                print(f"Inference '{inference_id}' already exists:")
-                print(existing_inference)
-                return
-            except NotFoundError:
-                # Inference doesn't exist, proceed with creation
-                pass
-
-            resp = client.inference.put(
-                task_type="sparse_embedding",
-                inference_id=inference_id,
-                inference_config={
-                    "service": "elser",
-                    "service_settings": {
-                        "num_allocations": 1,
-                        "num_threads": 1
-                    }
-                }
+            existing_inference = retry_call(
+                client.inference.get, task_type="sparse_embedding", inference_id=inference_id,
+                endpoint=endpoint, operation="inference.get"
             )
-            print("Inference creation response:")
-            print(resp)
-            return
-        except ConnectionTimeout:
-            if attempt < max_retries - 1:
-                print(f"Connection timed out. Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                print("Max retries reached. Unable to create inference due to connection timeout.")
-        except ApiError as e:
-            print(f"Error creating inference: {e}")
-            if "Model IDs must be unique" in str(e):
-                new_id = f"{inference_id}_{int(time.time())}"
-                print(f"Attempting to create inference with a new ID: {new_id}")
-                create_or_get_inference(client, new_id)
-            return
+            print(f"Inference '{inference_id}' already exists:")
+            print(existing_inference)
+            registry.put("sparse_embedding", inference_id)
+            return inference_id
+        except NotFoundError:
+            # Inference doesn't exist, proceed with creation
+            pass
+
+        resp = retry_call(
+            client.inference.put,
+            task_type="sparse_embedding",
+            inference_id=inference_id,
+            inference_config=ELSER_INFERENCE_CONFIG,
+            endpoint=endpoint, operation="inference.put"
+        )
+        print("Inference creation response:")
+        print(resp)
+        registry.put("sparse_embedding", inference_id)
+        return inference_id
+    except (ConnectionError, ConnectionTimeout, CircuitOpenError) as e:
+        print(f"Unable to create inference: {e}")
+        return None
+    except ApiError as e:
+        print(f"Error creating inference: {e}")
+        # Only one fallback ID is ever minted per call
+        if "Model IDs must be unique" in str(e) and allow_new_id:
+            new_id = f"{inference_id}_{int(time.time())}"
+            print(f"Attempting to create inference with a new ID: {new_id}")
+            resolved_id = create_or_get_inference(client, new_id, allow_new_id=False)
+            if resolved_id:
+                registry.put("sparse_embedding", inference_id, resolved_id)
+            return resolved_id
+        return None
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,85 +1,135 @@
-from elasticsearch import Elasticsearch, ApiError, ConnectionTimeout, NotFoundError
+from elasticsearch import ApiError, ConnectionError, ConnectionTimeout, NotFoundError
+import argparse
 import os
 import time
 from dotenv import load_dotenv
+from endpoint_cache import registry
+from es_client import get_client
+from instrumentation import run_with_summary
+from retry import CircuitOpenError, retry_call
+from streaming import StreamError, StreamTimings, stream_completion
 
 load_dotenv()
 
-def create_or_get_inference(client, inference_id):
-    max_retries = 3
-    retry_delay = 5
+def openai_inference_config():
+    return {
+        "service": "openai",
+        "service_settings": {
+            "api_key": os.getenv("OPENAI_API_KEY"),
+            "model_id": "gpt-3.5-turbo"  # Changed from 'model' to 'model_id'
+        }
+    }
 
-    for attempt in range(max_retries):
-        try:
-            # Check if inference already exists
-            try:
-                existing_inference = client.inference.get(task_type="completion", inference_id=inference_id)
-                print(f"Inference '{inference_id}' already exists:")
-                print(existing_inference)
-                return True
-            except NotFoundError:
-                # Inference doesn't exist, proceed with creation
-                pass
+def create_or_get_inference(client, inference_id, allow_new_id=True):
+    # Skip the inference.get round-trip when the endpoint was seen recently
+    cached_id = registry.get("completion", inference_id)
+    if cached_id:
+        return cached_id
 
-            resp = client.inference.put(
-                task_type="completion",
-                inference_id=inference_id,
-                inference_config={
-                    "service": "openai",
-                    "service_settings": {
-                        "api_key": os.getenv("OPENAI_API_KEY"),
-                        "model_id": "gpt-3.5-turbo"  # Changed from 'model' to 'model_id'
-                    }
-                }
+    endpoint = f"inference/completion/{inference_id}"
+    try:
+        # Check if inference already exists
+        try:
+            existing_inference = retry_call(
+                client.inference.get, task_type="completion", inference_id=inference_id,
+                endpoint=endpoint, operation="inference.get"
             )
-            if resp:
-                print("Inference creation response:")
-                print(resp)
-                return True
-            else:
-                print("No response received from the inference creation request.")
-                return False
-        except ConnectionTimeout:
-            if attempt < max_retries - 1:
-                print(f"Connection timed out. Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                print("Max retries reached. Unable to create inference due to connection timeout.")
-                return False
-        except ApiError as e:
-            print(f"Error creating inference: {e}")
-            if "Model IDs must be unique" in str(e):
-                new_id = f"{inference_id}_{int(time.time())}"
-                print(f"Attempting to create inference with a new ID: {new_id}")
-                return create_or_get_inference(client, new_id)
+            print(f"Inference '{inference_id}' already exists:")
+            print(existing_inference)
+            registry.put("completion", inference_id)
+            return inference_id
+        except NotFoundError:
+            # Inference doesn't exist, proceed with creation
+            pass
+
+        resp = retry_call(
+            client.inference.put,
+            task_type="completion",
+            inference_id=inference_id,
+            inference_config=openai_inference_config(),
+            endpoint=endpoint, operation="inference.put"
+        )
+        if resp:
+            print("Inference creation response:")
+            print(resp)
+            registry.put("completion", inference_id)
+            return inference_id
+        else:
+            print("No response received from the inference creation request.")
             return False
+    except (ConnectionError, ConnectionTimeout, CircuitOpenError) as e:
+        print(f"Unable to create inference: {e}")
+        return False
+    except ApiError as e:
+        print(f"Error creating inference: {e}")
+        # Only one fallback ID is ever minted per call
+        if "Model IDs must be unique" in str(e) and allow_new_id:
+            new_id = f"{inference_id}_{int(time.time())}"
+            print(f"Attempting to create inference with a new ID: {new_id}")
+            resolved_id = create_or_get_inference(client, new_id, allow_new_id=False)
+            if resolved_id:
+                registry.put("completion", inference_id, resolved_id)
+            return resolved_id
+        return False
+
+def run_completion(client, inference_id, input_text):
+    return retry_call(
+        client.inference.inference,
+        task_type="completion",
+        inference_id=inference_id,
+        input=input_text,
+        endpoint=f"inference/completion/{inference_id}", operation="inference.completion"
+    )
+
+def extract_completion(resp):
+    # Check if 'completion' is directly in the response
+    if 'completion' in resp:
+        return resp['completion']
+    # Check if 'inference_results' is in the response
+    elif 'inference_results' in resp and len(resp['inference_results']) > 0:
+        return resp['inference_results'][0].get('completion', 'No completion found')
+    else:
+        return "Unable to extract completion from response"
+
+def print_streamed_completion(inference_id, input_text):
+    timings = StreamTimings()
+    try:
+        for delta in stream_completion(inference_id, input_text, timings=timings):
+            print(delta, end="", flush=True)
+        print()
+    except (StreamError, OSError) as e:
+        print(f"\nError during streaming inference: {e}")
+        return
+    if timings.first_token_at:
+        print(f"Time to first token: {timings.time_to_first_token * 1000:.0f} ms, "
+              f"total: {timings.total * 1000:.0f} ms, {timings.tokens} chunks")
 
 def main():
+    parser = argparse.ArgumentParser(description="Create or get the OpenAI completion endpoint and run a prompt")
+    parser.add_argument("--input", default="What is Elastic?")
+    parser.add_argument("--stream", action="store_true", help="print tokens as they are generated")
+    args = parser.parse_args()
+
     api_key = os.getenv("ELASTIC_API_KEY")
     if not api_key:
         print("Error: ELASTIC_API_KEY environment variable is not set.")
         return
 
-    client = Elasticsearch(
-        "https://my-elastic-project-a943bc.es.us-east-1.aws.elastic.cloud:443",
-        api_key=api_key
-    )
+    client = get_client()
 
-    inference_id = "openai_chat_completions"
-    if create_or_get_inference(client, inference_id):
+    inference_id = create_or_get_inference(client, "openai_chat_completions")
+    if inference_id and args.stream:
+        print_streamed_completion(inference_id, args.input)
+    elif inference_id:
         # Use the created inference
         try:
-            resp = client.inference.inference(
-                task_type="completion",
-                inference_id=inference_id,
-                input="What is Elastic?",
-            )
+            resp = run_completion(client, inference_id, args.input)
             print("Inference response:")
             print(resp)
-        except ApiError as e:
+        except (ApiError, ConnectionError, ConnectionTimeout, CircuitOpenError) as e:
             print(f"Error during inference: {e}")
     else:
         print("Failed to create or get inference. Skipping inference request.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_with_summary("create_inference_openai", main)
\ No newline at end of file
@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import time
+from dotenv import load_dotenv
+from es_client import build_client, get_client
+from ingest import read_jsonl
+from latency import summarize
+from provision import print_report, reconcile
+from retry import retry_call
+
+load_dotenv()
+
+# Sweeps ELSER num_allocations x num_threads, measuring embedding throughput
+# and latency for ingest-sized and query-sized batches, then recommends (or
+# applies) the best setting. One tuning endpoint is deployed per thread count
+# and rescaled in place for each allocation count, because changing threads
+# needs a redeploy but changing allocations does not. Pass --offline to run
+# against the mock server with a simulated deployment latency curve.
+
+
+def tuning_texts(corpus=None, text_field="content", count=256):
+    if corpus:
+        return [record[text_field] for record in read_jsonl(corpus) if record.get(text_field)]
+    # The synthetic corpus lives with the benchmarks; only needed without --corpus
+    from benchmarks.corpus import synthetic_documents
+    return [doc["content"] for doc in synthetic_documents(count)]
+
+
+def wait_for_allocations(client, deployment_id, allocations, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = client.ml.get_trained_models_stats(model_id=deployment_id)["trained_model_stats"]
+        status = stats[0].get("deployment_stats", {}).get("allocation_status", {}) if stats else {}
+        if status.get("allocation_count", 0) >= allocations:
+            return
+        time.sleep(2)
+    raise TimeoutError(f"Deployment '{deployment_id}' did not reach {allocations} allocations in {timeout}s")
+
+
+def deploy(client, inference_id, allocations, threads):
+    client.options(ignore_status=404).inference.delete(task_type="sparse_embedding", inference_id=inference_id,
+                                                       force=True)
+    retry_call(
+        client.inference.put,
+        task_type="sparse_embedding",
+        inference_id=inference_id,
+        inference_config={"service": "elser",
+                          "service_settings": {"num_allocations": allocations, "num_threads": threads}},
+        operation="inference.put",
+    )
+    wait_for_allocations(client, inference_id, allocations)
+
+
+def scale(client, inference_id, allocations):
+    retry_call(client.ml.update_trained_model_deployment, model_id=inference_id,
+               number_of_allocations=allocations, operation="ml.update_trained_model_deployment")
+    wait_for_allocations(client, inference_id, allocations)
+
+
+def run_workload(client, inference_id, texts, batch_size, requests, concurrency):
+    batches = [
+        [texts[(i * batch_size + j) % len(texts)] for j in range(batch_size)]
+        for i in range(requests)
+    ]
+    latencies = []
+
+    def call(batch):
+        start = time.perf_counter()
+        client.inference.inference(task_type="sparse_embedding", inference_id=inference_id, input=batch)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, batches))
+    elapsed = time.perf_counter() - start
+    summary = summarize(latencies, elapsed)
+    summary["docs_per_sec"] = requests * batch_size / elapsed
+    return summary
+
+
+def sweep(client, texts, settings, args):
+    results = []
+    for threads in sorted({threads for _, threads in settings}):
+        inference_id = f"{args.inference_id}_autotune_t{threads}"
+        allocations_list = sorted(allocations for allocations, t in settings if t == threads)
+        try:
+            for position, allocations in enumerate(allocations_list):
+                if position == 0:
+                    deploy(client, inference_id, allocations, threads)
+                else:
+                    scale(client, inference_id, allocations)
+                # Warm up so model loading doesn't land in the measurements
+                run_workload(client, inference_id, texts, args.query_batch, args.concurrency, args.concurrency)
+                ingest = run_workload(client, inference_id, texts, args.ingest_batch, args.ingest_requests,
+                                      args.concurrency)
+                query = run_workload(client, inference_id, texts, args.query_batch, args.query_requests,
+                                     args.concurrency)
+                result = {"num_allocations": allocations, "num_threads": threads,
+                          "vcpus": allocations * threads, "ingest": ingest, "query": query}
+                results.append(result)
+                print_result(result)
+        finally:
+            client.options(ignore_status=404).inference.delete(task_type="sparse_embedding",
+                                                               inference_id=inference_id, force=True)
+    return results
+
+
+def recommend(results, p95_budget_ms=None, tolerance=0.05):
+    # Highest ingest throughput among settings that keep query p95 within the
+    # budget; within `tolerance` of the best, the one using fewest vCPUs wins
+    candidates = [r for r in results if p95_budget_ms is None or r["query"]["p95_ms"] <= p95_budget_ms]
+    if not candidates:
+        return None
+    best_rate = max(r["ingest"]["docs_per_sec"] for r in candidates)
+    close = [r for r in candidates if r["ingest"]["docs_per_sec"] >= best_rate * (1 - tolerance)]
+    return min(close, key=lambda r: (r["vcpus"], r["query"]["p95_ms"]))
+
+
+def print_header():
+    print(f"\n{'allocs':>6} {'threads':>7} {'vcpus':>5} | {'ingest docs/s':>13} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'p99 ms':>7} | {'query p50':>9} {'p95 ms':>7} {'p99 ms':>7}")
+
+
+def print_result(r):
+    ingest, query = r["ingest"], r["query"]
+    print(f"{r['num_allocations']:>6} {r['num_threads']:>7} {r['vcpus']:>5} | {ingest['docs_per_sec']:>13.1f} "
+          f"{ingest['p50_ms']:>7.1f} {ingest['p95_ms']:>7.1f} {ingest['p99_ms']:>7.1f} | "
+          f"{query['p50_ms']:>9.1f} {query['p95_ms']:>7.1f} {query['p99_ms']:>7.1f}")
+
+
+def apply_setting(client, inference_id, best):
+    # provision.reconcile scales the deployment in place when only the
+    # allocations change, and recreates the endpoint when the threads change
+    spec = {"inference_endpoints": [{
+        "inference_id": inference_id,
+        "task_type": "sparse_embedding",
+        "service": "elser",
+        "service_settings": {"num_allocations": best["num_allocations"], "num_threads": best["num_threads"]},
+    }]}
+    print_report(reconcile(client, spec), dry_run=False)
+
+
+def parse_levels(value):
+    return [int(level) for level in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and tune ELSER num_allocations / num_threads")
+    parser.add_argument("--inference-id", default="elser_embeddings", help="endpoint to tune and apply to")
+    parser.add_argument("--allocations", default="1,2,4", help="comma-separated num_allocations to try")
+    parser.add_argument("--threads", default="1,2,4", help="comma-separated num_threads to try")
+    parser.add_argument("--max-vcpus", type=int, default=None, help="skip settings using more vCPUs")
+    parser.add_argument("--corpus", help="JSONL corpus to embed (defaults to a synthetic one)")
+    parser.add_argument("--text-field", default="content")
+    parser.add_argument("--ingest-batch", type=int, default=32, help="documents per ingest-sized request")
+    parser.add_argument("--query-batch", type=int, default=1, help="texts per query-sized request")
+    parser.add_argument("--ingest-requests", type=int, default=24)
+    parser.add_argument("--query-requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--p95-budget-ms", type=float, default=None, help="maximum query-sized p95 latency")
+    parser.add_argument("--apply", action="store_true", help="apply the recommendation to --inference-id")
+    parser.add_argument("--output", help="write the raw results as JSON")
+    parser.add_argument("--offline", action="store_true", help="use the mock server with a simulated deployment")
+    parser.add_argument("--base-ms", type=float, default=5.0, help="offline: fixed cost per request")
+    parser.add_argument("--per-doc-ms", type=float, default=4.0, help="offline: single-thread cost per document")
+    parser.add_argument("--parallel-fraction", type=float, default=0.7,
+                        help="offline: share of per-document work that threads speed up")
+    parser.add_argument("--processors", type=int, default=8, help="offline: ML processors on the node")
+    args = parser.parse_args()
+
+    server = None
+    if args.offline:
+        # The mock cluster is only needed offline
+        from mock_elasticsearch import DeploymentModel, start_mock_server
+        model = DeploymentModel(args.base_ms, args.per_doc_ms, args.parallel_fraction, args.processors)
+        server, url = start_mock_server(deployment_model=model)
+        client = build_client(hosts=[url], connections_per_node=args.concurrency)
+    else:
+        client = get_client()
+
+    try:
+        settings = [
+            (allocations, threads)
+            for threads in parse_levels(args.threads) for allocations in parse_levels(args.allocations)
+            if args.max_vcpus is None or allocations * threads <= args.max_vcpus
+        ]
+        texts = tuning_texts(args.corpus, args.text_field)
+        print(f"Sweeping {len(settings)} allocation/thread settings over "
+              f"{len(texts)} texts (ingest batch {args.ingest_batch}, query batch {args.query_batch}, "
+              f"concurrency {args.concurrency})")
+        print_header()
+        results = sweep(client, texts, settings, args)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+        best = recommend(results, args.p95_budget_ms)
+        if best is None:
+            print(f"\nNo setting kept query p95 under {args.p95_budget_ms} ms")
+            return
+        print(f"\nRecommended: num_allocations={best['num_allocations']}, num_threads={best['num_threads']} "
+              f"({best['ingest']['docs_per_sec']:.1f} docs/s ingest, {best['query']['p95_ms']:.1f} ms query p95)")
+        print(f"Set ELSER_NUM_ALLOCATIONS={best['num_allocations']} ELSER_NUM_THREADS={best['num_threads']} "
+              f"for create_inference.py, or use them in a provision.py spec")
+        if args.apply:
+            apply_setting(client, args.inference_id, best)
+    finally:
+        if server:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
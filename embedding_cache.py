@@ -0,0 +1,191 @@
+from array import array
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Persistent cache of ELSER embeddings keyed by (model ID, SHA-256 of the text),
+# so rebuilding an index only sends new or changed documents to inference.
+# Vectors are stored compactly as a NUL-joined token blob plus a float32 weight
+# array. Eviction is least-recently-used, bounded by a maximum entry count.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    tokens BLOB NOT NULL,
+    weights BLOB NOT NULL,
+    embed_ms REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model_id, content_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector):
+    return "\0".join(vector).encode("utf-8"), array("f", vector.values()).tobytes()
+
+
+def unpack_vector(tokens, weights):
+    if not tokens:
+        return {}
+    values = array("f")
+    values.frombytes(weights)
+    # float32 holds ~7 significant digits; rounding keeps the bulk JSON short
+    return {token: float(f"{value:.7g}") for token, value in zip(tokens.decode("utf-8").split("\0"), values)}
+
+
+class EmbeddingCache:
+    def __init__(self, path="embedding_cache.sqlite3", max_entries=200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+        # One connection shared by the embedding worker threads, guarded by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def get_many(self, model_id, hashes):
+        # Returns {content_hash: vector} for the hashes that are cached
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT content_hash, tokens, weights, embed_ms FROM embeddings "
+                    f"WHERE model_id = ? AND content_hash IN ({','.join('?' * len(chunk))})",
+                    [model_id, *chunk],
+                ).fetchall()
+                for key, tokens, weights, embed_ms in rows:
+                    found[key] = unpack_vector(tokens, weights)
+                    self.seconds_saved += embed_ms / 1000
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model_id = ? AND content_hash = ?",
+                    [(now, model_id, key) for key in found],
+                )
+                self._db.commit()
+            self.hits += len(found)
+            self.misses += len(set(hashes)) - len(found)
+        return found
+
+    def put_many(self, model_id, vectors, embed_seconds=0.0):
+        # `embed_seconds` is the inference time for the whole batch; each entry
+        # keeps its share so later hits can report the time they saved
+        if not vectors:
+            return
+        embed_ms = embed_seconds * 1000 / len(vectors)
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)",
+                [(model_id, key, *pack_vector(vector), embed_ms, now) for key, vector in vectors.items()],
+            )
+            self._db.commit()
+        self.evict()
+
+    def evict(self, max_entries=None, max_age_days=None):
+        # Drop entries unused for max_age_days, then the least recently used
+        # ones beyond max_entries; returns how many were removed
+        max_entries = max_entries if max_entries is not None else self.max_entries
+        removed = 0
+        with self._lock:
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                removed += self._db.execute("DELETE FROM embeddings WHERE last_used < ?", (cutoff,)).rowcount
+            count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if max_entries and count > max_entries:
+                removed += self._db.execute(
+                    "DELETE FROM embeddings WHERE (model_id, content_hash) IN "
+                    "(SELECT model_id, content_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - max_entries,),
+                ).rowcount
+            if removed:
+                self._db.commit()
+        return removed
+
+    def clear(self, model_id=None):
+        with self._lock:
+            if model_id is None:
+                self._db.execute("DELETE FROM embeddings")
+            else:
+                self._db.execute("DELETE FROM embeddings WHERE model_id = ?", (model_id,))
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "seconds_saved": self.seconds_saved,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    # Shared cache, opened on first use; off unless EMBEDDING_CACHE_PATH is set
+    global _cache
+    path = os.getenv("EMBEDDING_CACHE_PATH", "")
+    if not path:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(path, max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")))
+        return _cache
+
+
+def format_stats(stats):
+    return (f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate), {stats['seconds_saved']:.1f}s of inference saved, "
+            f"{stats['entries']} entries, {stats['size_bytes'] / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or trim the embedding cache")
+    parser.add_argument("command", choices=("stats", "evict", "clear"))
+    parser.add_argument("--path", default=os.getenv("EMBEDDING_CACHE_PATH") or "embedding_cache.sqlite3")
+    parser.add_argument("--max-entries", type=int, default=None)
+    parser.add_argument("--max-age-days", type=float, default=None)
+    parser.add_argument("--model-id", default=None, help="clear: only this model's entries")
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(args.path)
+    if args.command == "evict":
+        print(f"Evicted {cache.evict(args.max_entries, args.max_age_days)} entries")
+    elif args.command == "clear":
+        cache.clear(args.model_id)
+        print("Cache cleared")
+    stats = cache.stats()
+    print(f"{stats['entries']} entries, {stats['size_bytes'] / 1e6:.1f} MB in {args.path}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Remembers which inference endpoints are known to exist so create_or_get_inference
+# can skip the inference.get round-trip (the Streamlit app calls it on every rerun).
+# Entries are keyed by (task_type, requested ID) and store the ID that actually
+# exists, which differs from the requested one when a "<id>_<timestamp>" fallback
+# endpoint had to be created.
+
+
+class EndpointRegistry:
+    def __init__(self, ttl=300.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, task_type, inference_id):
+        with self._lock:
+            entry = self._entries.get((task_type, inference_id))
+            if entry is not None and entry[1] > self.clock():
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[(task_type, inference_id)]
+            self.misses += 1
+            return None
+
+    def put(self, task_type, inference_id, resolved_id=None):
+        resolved_id = resolved_id or inference_id
+        expires_at = self.clock() + self.ttl
+        with self._lock:
+            self._entries[(task_type, inference_id)] = (resolved_id, expires_at)
+            # The fallback ID is an endpoint in its own right
+            self._entries[(task_type, resolved_id)] = (resolved_id, expires_at)
+
+    def invalidate(self, task_type=None, inference_id=None):
+        # With no arguments everything is dropped; otherwise only entries that
+        # match the given task type and/or ID (requested or resolved)
+        with self._lock:
+            for key, (resolved_id, _) in list(self._entries.items()):
+                if task_type is not None and key[0] != task_type:
+                    continue
+                if inference_id is not None and inference_id not in (key[1], resolved_id):
+                    continue
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+registry = EndpointRegistry(ttl=float(os.getenv("INFERENCE_REGISTRY_TTL", "300")))
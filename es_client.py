@@ -0,0 +1,101 @@
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+import os
+import threading
+from dotenv import load_dotenv
+from instrumentation import instrument
+
+load_dotenv()
+
+DEFAULT_URL = "https://my-elastic-project-a943bc.es.us-east-1.aws.elastic.cloud:443"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _orjson_serializer():
+    # orjson is optional: it is several times faster on large bodies and
+    # serializes NumPy arrays directly instead of going through tolist()
+    try:
+        from elasticsearch.serializer import OrjsonSerializer
+    except ImportError:
+        return None
+    return OrjsonSerializer()
+
+
+def client_settings():
+    # Every setting can be overridden from the environment so the same code can
+    # be pointed at Elastic Cloud, a local node or the mock server
+    settings = {
+        "hosts": [url.strip() for url in os.getenv("ELASTIC_URL", DEFAULT_URL).split(",")],
+        # Connections are kept alive and reused per node; size the pool for the
+        # number of threads that share the client (bulk workers, Streamlit sessions)
+        "connections_per_node": int(os.getenv("ES_CONNECTIONS_PER_NODE", "16")),
+        "http_compress": _env_bool("ES_HTTP_COMPRESS", True),
+        "request_timeout": float(os.getenv("ES_REQUEST_TIMEOUT", "30")),
+        "max_retries": int(os.getenv("ES_MAX_RETRIES", "3")),
+        "retry_on_timeout": _env_bool("ES_RETRY_ON_TIMEOUT", True),
+    }
+    # Sniffing needs direct access to the nodes, so it is off by default
+    # (Elastic Cloud sits behind a proxy). The client turns on sniffing before
+    # requests whenever min_delay_between_sniffing is passed, so the sniff
+    # options are only set when sniffing is asked for.
+    sniff_on_start = _env_bool("ES_SNIFF_ON_START", False)
+    sniff_on_node_failure = _env_bool("ES_SNIFF_ON_NODE_FAILURE", False)
+    if sniff_on_start or sniff_on_node_failure:
+        settings["sniff_on_start"] = sniff_on_start
+        settings["sniff_on_node_failure"] = sniff_on_node_failure
+        settings["min_delay_between_sniffing"] = float(os.getenv("ES_SNIFF_INTERVAL", "60"))
+    api_key = os.getenv("ELASTIC_API_KEY")
+    if api_key:
+        settings["api_key"] = api_key
+    serializer = _orjson_serializer() if _env_bool("ES_ORJSON", True) else None
+    if serializer is not None:
+        settings["serializer"] = serializer
+    return settings
+
+
+def build_client(**overrides):
+    settings = client_settings()
+    if "basic_auth" in overrides:
+        settings.pop("api_key", None)
+    settings.update(overrides)
+    # A no-op unless ES_INSTRUMENTATION is set
+    return instrument(Elasticsearch(**settings))
+
+
+def build_async_client(**overrides):
+    # AsyncElasticsearch takes the same transport settings (needs aiohttp)
+    settings = client_settings()
+    if "basic_auth" in overrides:
+        settings.pop("api_key", None)
+    settings.update(overrides)
+    return instrument(AsyncElasticsearch(**settings))
+
+
+def get_client(request_timeout=None):
+    # Process-wide client: all callers share one connection pool, so TLS
+    # handshakes happen once per connection instead of once per script/rerun
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_client()
+    if request_timeout is not None:
+        # options() returns a view that shares the same transport and pool
+        return _client.options(request_timeout=request_timeout)
+    return _client
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,162 @@
+from elasticsearch import ApiError
+import weakref
+from search_coalescer import MultiSearchError
+from search_profiles import DEFAULT_PROFILE, apply_profile
+from usage_examples import build_semantic_query
+
+# Hybrid search: a BM25 match on title/content combined with the ELSER query,
+# so exact terms (names, codes, rare words) still rank even when the sparse
+# expansion drifts. All methods cost the cluster a single round-trip:
+#   "rrf"    - RRF retriever. Rank-based, so the different score scales of BM25
+#              and ELSER don't matter. Needs 8.14+ and a license that includes RRF.
+#   "linear" - one bool query with the lexical and semantic queries as boosted
+#              should clauses. Works everywhere, but the weights have to be tuned
+#              because BM25 scores are unbounded and ELSER scores are not.
+#   "client" - lexical and semantic searches in one _msearch, fused with RRF in
+#              the client. Same ranking as "rrf" for clusters without retrievers.
+# "rrf" falls back to "client" when the cluster rejects the retriever and keeps
+# using the fallback for that client afterwards.
+HYBRID_METHODS = ("rrf", "linear", "client")
+
+LEXICAL_FIELDS = ("title^2", "content")
+RANK_CONSTANT = 60
+RANK_WINDOW_SIZE = 50
+
+# Transports (shared by client.options() copies) that rejected the retriever
+_no_retrievers = weakref.WeakKeyDictionary()
+
+
+def build_lexical_query(query, fields=LEXICAL_FIELDS):
+    return {"multi_match": {"query": query, "fields": list(fields)}}
+
+
+def boosted(clause, weight):
+    # text_expansion and match keep their options one level down, under the field
+    kind, config = next(iter(clause.items()))
+    if kind in ("text_expansion", "match"):
+        field, options = next(iter(config.items()))
+        if not isinstance(options, dict):
+            options = {"query": options}
+        return {kind: {field: dict(options, boost=weight)}}
+    return {kind: dict(config, boost=weight)}
+
+
+def build_hybrid_search_body(query, method="rrf", profile=DEFAULT_PROFILE, size=10, search_after=None,
+                             mode="text_expansion", inference_id=None, pruning_config=None,
+                             lexical_weight=1.0, semantic_weight=1.0, rank_constant=RANK_CONSTANT,
+                             rank_window_size=RANK_WINDOW_SIZE):
+    if method not in ("rrf", "linear"):
+        raise ValueError(f"Hybrid method '{method}' is not a single search body, expected 'rrf' or 'linear'")
+    lexical = build_lexical_query(query)
+    semantic = build_semantic_query(query, mode, inference_id, pruning_config)["query"]
+    if method == "linear":
+        return apply_profile({"query": {"bool": {"should": [
+            boosted(lexical, lexical_weight), boosted(semantic, semantic_weight)
+        ]}}}, profile, size=size, search_after=search_after)
+
+    if search_after is not None:
+        raise ValueError("search_after pagination is not supported with the RRF retriever; use from/size")
+    body = apply_profile({"retriever": {"rrf": {
+        "retrievers": [{"standard": {"query": lexical}}, {"standard": {"query": semantic}}],
+        "rank_constant": rank_constant,
+        # Each side has to contribute at least a page of candidates
+        "rank_window_size": max(rank_window_size, size),
+    }}}, profile, size=size)
+    # Retrievers define their own order
+    body.pop("sort", None)
+    return body
+
+
+def build_fusion_searches(query, profile=DEFAULT_PROFILE, size=10, mode="text_expansion", inference_id=None,
+                          pruning_config=None, rank_window_size=RANK_WINDOW_SIZE):
+    # The two legs of client-side fusion, lexical first
+    bodies = []
+    for leg in (build_lexical_query(query), build_semantic_query(query, mode, inference_id, pruning_config)["query"]):
+        body = apply_profile({"query": leg}, profile, size=max(rank_window_size, size))
+        body.pop("sort", None)
+        bodies.append(body)
+    return bodies
+
+
+def rrf_fuse(responses, size=10, rank_constant=RANK_CONSTANT):
+    # score(doc) = sum over result lists of 1 / (rank_constant + rank)
+    scores, hits = {}, {}
+    for resp in responses:
+        for rank, hit in enumerate(resp["hits"]["hits"], start=1):
+            key = (hit["_index"], hit["_id"])
+            scores[key] = scores.get(key, 0.0) + 1 / (rank_constant + rank)
+            # The first list (lexical) wins, so BM25 highlights are kept
+            hits.setdefault(key, hit)
+    ranked = sorted(scores, key=lambda key: -scores[key])
+    return {
+        "took": max((resp.get("took", 0) for resp in responses), default=0),
+        "timed_out": any(resp.get("timed_out") for resp in responses),
+        "hits": {
+            "total": {"value": len(ranked), "relation": "eq"},
+            "max_score": scores[ranked[0]] if ranked else None,
+            "hits": [dict(hits[key], _score=scores[key]) for key in ranked[:size]],
+        },
+    }
+
+
+def client_fusion_search(client, index_name, query, profile=DEFAULT_PROFILE, size=10, mode="text_expansion",
+                         inference_id=None, pruning_config=None, rank_constant=RANK_CONSTANT,
+                         rank_window_size=RANK_WINDOW_SIZE, coalescer=None):
+    bodies = build_fusion_searches(query, profile, size, mode, inference_id, pruning_config, rank_window_size)
+    if coalescer is not None:
+        # Both legs join the same batch as everyone else's searches
+        futures = [coalescer.submit(index_name, body) for body in bodies]
+        return rrf_fuse([future.result() for future in futures], size, rank_constant)
+    searches = []
+    for body in bodies:
+        searches.extend([{"index": index_name}, body])
+    responses = client.msearch(searches=searches)["responses"]
+    for resp in responses:
+        if "error" in resp:
+            raise MultiSearchError(resp.get("status"), resp["error"])
+    return rrf_fuse(responses, size, rank_constant)
+
+
+def retriever_unsupported(error):
+    # Older clusters don't parse "retriever"; a basic license rejects RRF with 403
+    reason = str(error.body).lower()
+    return error.status_code == 403 or (error.status_code == 400 and ("retriever" in reason or "rrf" in reason))
+
+
+def hybrid_search(client, index_name, query, cache=None, method="rrf", profile=DEFAULT_PROFILE, size=10,
+                  search_after=None, mode="text_expansion", inference_id=None, pruning_config=None,
+                  lexical_weight=1.0, semantic_weight=1.0, rank_constant=RANK_CONSTANT,
+                  rank_window_size=RANK_WINDOW_SIZE, coalescer=None):
+    if method not in HYBRID_METHODS:
+        raise ValueError(f"Unknown hybrid method '{method}', expected one of {HYBRID_METHODS}")
+    if method != "linear" and search_after is not None:
+        raise ValueError("search_after pagination is only supported by the 'linear' hybrid method")
+
+    search = coalescer.search if coalescer is not None else client.search
+
+    def run():
+        if method == "rrf" and client.transport not in _no_retrievers:
+            body = build_hybrid_search_body(query, "rrf", profile, size, mode=mode, inference_id=inference_id,
+                                            pruning_config=pruning_config, rank_constant=rank_constant,
+                                            rank_window_size=rank_window_size)
+            try:
+                return search(index=index_name, body=body)
+            except (ApiError, MultiSearchError) as e:
+                if not retriever_unsupported(e):
+                    raise
+                print(f"RRF retriever not available ({e.status_code}), fusing results client-side")
+                _no_retrievers[client.transport] = True
+        if method == "linear":
+            body = build_hybrid_search_body(query, "linear", profile, size, search_after, mode, inference_id,
+                                            pruning_config, lexical_weight, semantic_weight)
+            return search(index=index_name, body=body)
+        return client_fusion_search(client, index_name, query, profile, size, mode, inference_id, pruning_config,
+                                    rank_constant, rank_window_size, coalescer)
+
+    if cache is not None:
+        return cache.get_or_search(
+            index_name, query, run, hybrid=method, profile=profile, size=size, search_after=search_after,
+            mode=mode, inference_id=inference_id, pruning_config=pruning_config,
+            weights=[lexical_weight, semantic_weight], rank=[rank_constant, rank_window_size]
+        )
+    return run()
@@ -0,0 +1,165 @@
+from elasticsearch import helpers
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from dotenv import load_dotenv
+from embedding_cache import format_stats, get_embedding_cache
+from es_client import get_client
+from ingest import ELSER_MODEL_ID, bulk_index_documents, iter_batches, read_jsonl
+from retry import retry_call
+from search_cache import search_cache
+from usage_examples import INDEX_MAPPINGS
+
+load_dotenv()
+
+# Incremental sync: every document carries a fingerprint of its content in
+# `content_hash`. A sync reads the source in batches, fetches the stored
+# fingerprints for each batch with one mget, and only embeds and upserts the
+# documents that are new or changed. Documents missing from the source are then
+# deleted by scanning the index IDs. Only the set of seen IDs is held in memory.
+
+HASH_FIELD = "content_hash"
+TEXT_EXTENSIONS = (".txt", ".md", ".rst", ".html")
+
+
+def fingerprint(doc, model_id=ELSER_MODEL_ID):
+    # The model is part of the fingerprint so switching models re-embeds everything
+    canonical = json.dumps([model_id, doc], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def iter_directory(path):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(TEXT_EXTENSIONS):
+                continue
+            full_path = os.path.join(root, name)
+            with open(full_path, encoding="utf-8", errors="replace") as f:
+                yield {
+                    "id": os.path.relpath(full_path, path).replace(os.sep, "/"),
+                    "title": os.path.splitext(name)[0],
+                    "content": f.read(),
+                }
+
+
+def iter_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_source(path, id_field="id"):
+    # Yields (doc_id, doc) from a JSONL file, a CSV file or a directory of text files
+    if os.path.isdir(path):
+        records, id_field = iter_directory(path), "id"
+    elif path.endswith(".csv"):
+        records = iter_csv(path)
+    else:
+        records = read_jsonl(path)
+    for line_number, record in enumerate(records, start=1):
+        doc = dict(record)
+        doc_id = doc.pop(id_field, None)
+        if doc_id in (None, ""):
+            # Positional IDs would turn every insertion into a cascade of changes
+            raise ValueError(f"Record {line_number} of {path} has no '{id_field}' field")
+        yield str(doc_id), doc
+
+
+def changed_documents(client, index_name, source, summary, seen_ids, batch_size=500, model_id=ELSER_MODEL_ID):
+    # Streams the new and changed documents, ready for bulk indexing with _id set
+    for batch in iter_batches(source, batch_size):
+        fingerprints = {}
+        for doc_id, doc in batch:
+            fingerprints[doc_id] = fingerprint(doc, model_id)
+            seen_ids.add(doc_id)
+        resp = retry_call(
+            client.mget, index=index_name, ids=list(fingerprints), source_includes=[HASH_FIELD],
+            operation="mget"
+        )
+        stored = {
+            doc["_id"]: doc.get("_source", {}).get(HASH_FIELD)
+            for doc in resp["docs"] if doc.get("found")
+        }
+        for doc_id, doc in batch:
+            summary["seen"] += 1
+            if doc_id not in stored:
+                summary["new"] += 1
+            elif stored[doc_id] != fingerprints[doc_id]:
+                summary["changed"] += 1
+            else:
+                summary["unchanged"] += 1
+                continue
+            yield dict(doc, _id=doc_id, **{HASH_FIELD: fingerprints[doc_id]})
+
+
+def delete_missing(client, index_name, seen_ids, batch_size=500):
+    # Scan only the IDs (no _source) and delete whatever the source no longer has
+    actions = (
+        {"_op_type": "delete", "_index": index_name, "_id": hit["_id"]}
+        for hit in helpers.scan(client, index=index_name, query={"query": {"match_all": {}}},
+                                source=False, size=batch_size)
+        if hit["_id"] not in seen_ids
+    )
+    deleted = 0
+    for ok, item in helpers.streaming_bulk(client, actions, chunk_size=batch_size, raise_on_error=False):
+        if ok or item.get("delete", {}).get("status") == 404:
+            deleted += 1
+    return deleted
+
+
+def sync(client, index_name, path, id_field="id", delete=True, batch_size=500, embed_batch_size=32,
+         thread_count=4, max_in_flight=4, model_id=ELSER_MODEL_ID, embedding_cache=None):
+    start = time.perf_counter()
+    if not client.indices.exists(index=index_name):
+        client.indices.create(index=index_name, mappings=INDEX_MAPPINGS)
+
+    summary = {"seen": 0, "new": 0, "changed": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+    seen_ids = set()
+    changed = changed_documents(client, index_name, iter_source(path, id_field), summary, seen_ids,
+                                batch_size, model_id)
+    stats = bulk_index_documents(
+        client, index_name, changed, batch_size=embed_batch_size, thread_count=thread_count,
+        max_in_flight=max_in_flight, refresh="false", model_id=model_id, embedding_cache=embedding_cache
+    )
+    summary["failed"] = stats["failed"]
+
+    # Skip deletions after failed writes: a partial read of the source must
+    # not look like the documents were removed
+    if delete and not stats["failed"]:
+        summary["deleted"] = delete_missing(client, index_name, seen_ids, batch_size)
+
+    client.indices.refresh(index=index_name)
+    search_cache.invalidate_index(index_name)
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync an index with a JSONL/CSV file or a directory of text files")
+    parser.add_argument("source", help="JSONL file, CSV file or directory")
+    parser.add_argument("--index", default="elser_test_index")
+    parser.add_argument("--id-field", default="id", help="field holding the stable document ID")
+    parser.add_argument("--no-delete", action="store_true", help="keep documents missing from the source")
+    parser.add_argument("--batch-size", type=int, default=500, help="documents per mget / delete request")
+    parser.add_argument("--embed-batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--no-embedding-cache", action="store_true")
+    args = parser.parse_args()
+
+    client = get_client()
+    embedding_cache = None if args.no_embedding_cache else get_embedding_cache()
+    summary = sync(client, args.index, args.source, id_field=args.id_field, delete=not args.no_delete,
+                   batch_size=args.batch_size, embed_batch_size=args.embed_batch_size,
+                   thread_count=args.workers, embedding_cache=embedding_cache)
+    print(f"Synced {summary['seen']} documents in {summary['seconds']:.2f}s: {summary['new']} new, "
+          f"{summary['changed']} changed, {summary['unchanged']} unchanged, {summary['deleted']} deleted, "
+          f"{summary['failed']} failed")
+    if embedding_cache is not None:
+        print(format_stats(embedding_cache.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,28 @@
-from elasticsearch import Elasticsearch
-from elasticsearch import helpers, ApiError, NotFoundError, RequestError
+from elasticsearch import ApiError
+import numpy as np
 from dotenv import load_dotenv
-import os
+from es_client import get_client
+from index_templates import build_template_spec, plan_index, print_plan
+from provision import print_report, reconcile
+from vector_loader import VECTOR_FIELD, create_vector_index, format_stats, load_vectors, open_vectors
+
+def create_index(client, index_name, docs=1000, ingest_docs_per_sec=10, dense_dims=3, index_type="int8_hnsw"):
+    # Templates sized for the expected corpus; they apply to index_name when
+    # it is created, so run this before the first document is indexed
+    plan = plan_index(docs, ingest_docs_per_sec=ingest_docs_per_sec, sparse=False, dense_dims=dense_dims,
+                      dense_index_type=index_type)
+    print_plan(plan)
+    spec = build_template_spec(index_name, [index_name], plan)
+    changes = reconcile(client, spec)
+    print_report(changes, dry_run=False)
+    return changes
+
 
-  # Add this at the beginning of your script
-def create_index(client):
-    try:
-        resp = client.indices.put_index_template(
-            name="template_1",
-            index_patterns=["template*"],
-            priority=1,
-            template={
-                "settings": {
-                    "number_of_shards": 2
-                }
-            },
-        )
-        print("Index template created:", resp)
-    except ApiError as e:
-        print(f"Error creating index template: {e}")
 def main():
     load_dotenv()
     
     # Create Elasticsearch client
-    client = Elasticsearch(
-        "https://my-elastic-project-a943bc.es.us-east-1.aws.elastic.cloud:443",
-        api_key=os.getenv('ELASTIC_API_KEY')
-    )
+    client = get_client()
     index_name = "search-rp3o"
 
 
@@ -39,11 +35,14 @@ def main():
         print(f"Error connecting to Elasticsearch: {e}")
         return
 
-    # Create index
-    create_index(client)
+    # Create index templates
+    create_index(client, index_name)
 
     # Add vector to index
-    add_vector_to_index(client, index_name)
+    try:
+        add_vector_to_index(client, index_name)
+    except ValueError as e:
+        print(f"Error adding vectors to index: {e}")
 
     # Use the ELSER model for text embedding
     text = "Elasticsearch is a powerful search and analytics engine."
@@ -59,27 +58,45 @@ def main():
         print(f"Error during text embedding inference: {e}")
 
 
-def add_vector_to_index(client, index_name):
-    docs = [
-        {
-            "text": "Example text 1",
-            "vector": [5.479, 9.789, 2.606]
-        },
-        {
-            "text": "Example text 2",
-            "vector": [7.475, 9.63, 8.804]
-        },
-        {
-            "text": "Example text 3",
-            "vector": [5.535, 6.532, 6.407]
-        }
-    ]
+def check_vector_mapping(client, index_name, dims, vector_field=VECTOR_FIELD):
+    # An existing index must already map the field as dense_vector; a field
+    # that was mapped dynamically holds plain floats and can't serve kNN
+    for name, mapping in client.indices.get_mapping(index=index_name).items():
+        field = mapping.get("mappings", {}).get("properties", {}).get(vector_field, {})
+        field_type = field.get("type", "object" if "properties" in field else None)
+        if field_type != "dense_vector":
+            mapped = f"mapped as {field_type}" if field_type else "not mapped"
+            raise ValueError(f"Field '{vector_field}' of index '{name}' is {mapped}, not dense_vector; "
+                             f"reindex into an index created with create_vector_index")
+        if field.get("dims") not in (None, dims):
+            raise ValueError(f"Field '{vector_field}' of index '{name}' has {field['dims']} dims, "
+                             f"the vectors have {dims}")
+
+
+def add_vector_to_index(client, index_name, vectors=None, texts=None, index_type="int8_hnsw", similarity="cosine",
+                        **load_kwargs):
+    if vectors is None:
+        vectors = np.array([
+            [5.479, 9.789, 2.606],
+            [7.475, 9.63, 8.804],
+            [5.535, 6.532, 6.407]
+        ], dtype=np.float32)
+        texts = ["Example text 1", "Example text 2", "Example text 3"]
 
     try:
-        bulk_response = helpers.bulk(client, docs, index=index_name)
-        print("Bulk insert response:", bulk_response)
+        vectors = open_vectors(vectors)
+        # Without a dense_vector mapping the vectors land as plain float arrays
+        # and can't be searched with kNN
+        if not client.indices.exists(index=index_name):
+            create_vector_index(client, index_name, vectors.shape[1], index_type, similarity)
+        else:
+            check_vector_mapping(client, index_name, vectors.shape[1],
+                                 load_kwargs.get("vector_field", VECTOR_FIELD))
+        stats = load_vectors(client, index_name, vectors, texts=texts, **load_kwargs)
+        print(format_stats(stats))
+        return stats
     except ApiError as e:
         print(f"Error adding vectors to index: {e}")
-   
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,275 @@
+import argparse
+import json
+import math
+from dotenv import load_dotenv
+from es_client import get_client
+from provision import print_report, reconcile
+from vector_loader import SIMILARITIES, VECTOR_INDEX_TYPES, dense_vector_mappings
+
+load_dotenv()
+
+# Builds index settings and mappings from the expected corpus size and ingest
+# rate, and applies them as composable templates through provision.py:
+#   {name}-settings        shards, replicas, refresh_interval, codec, mapping limits, ILM
+#   {name}-mappings-text   title/content text fields
+#   {name}-mappings-sparse ELSER sparse_vector field
+#   {name}-mappings-dense  dense_vector field (vector_loader.py)
+#   {name}                 index template composed of the above
+# The dry run prints the projected shard sizes and what would change on the
+# cluster; nothing is written without --apply.
+
+GB = 1024 ** 3
+
+# Stored fields after compression, as a fraction of the raw _source bytes
+STORED_RATIO = {"default": 0.5, "best_compression": 0.3}
+CODECS = tuple(STORED_RATIO)
+# Inverted index, norms and doc values of the text fields
+INDEX_RATIO = 0.4
+# ELSER writes a few hundred weighted tokens per document
+SPARSE_BYTES_PER_DOC = 1500
+# A float serialized in _source takes about nine characters
+VECTOR_SOURCE_BYTES_PER_DIM = 9
+# Bits per dimension of the vectors HNSW searches; raw float32 vectors are
+# kept on disk alongside for rescoring
+VECTOR_BITS = {"hnsw": 32, "int8_hnsw": 8, "int4_hnsw": 4, "bbq_hnsw": 1, "flat": 32, "int8_flat": 8}
+DEFAULT_HNSW_M = 16
+
+# Searches see new documents after refresh_interval; each refresh writes a
+# small segment that has to be merged later, so busy indices refresh less often
+REFRESH_INTERVALS = ((1000, "30s"), (100, "5s"), (0, "1s"))
+
+TEXT_MAPPINGS = {
+    "properties": {
+        "title": {"type": "text"},
+        "content": {"type": "text"},
+        "content_hash": {"type": "keyword"},
+    }
+}
+SPARSE_FIELD = "content_vector"
+
+
+def per_doc_bytes(avg_doc_bytes, codec="best_compression", sparse=True, dense_dims=None,
+                  dense_index_type="int8_hnsw", m=DEFAULT_HNSW_M):
+    if codec not in STORED_RATIO:
+        raise ValueError(f"Unknown codec '{codec}', expected one of {CODECS}")
+    parts = {
+        "source": avg_doc_bytes * STORED_RATIO[codec],
+        "index": avg_doc_bytes * INDEX_RATIO,
+        "sparse": SPARSE_BYTES_PER_DOC if sparse else 0,
+        "dense": 0,
+        "vector_ram": 0,
+    }
+    if dense_dims:
+        if dense_index_type not in VECTOR_BITS:
+            raise ValueError(f"Unknown vector index type '{dense_index_type}', expected one of {VECTOR_INDEX_TYPES}")
+        bits = VECTOR_BITS[dense_index_type]
+        raw = dense_dims * 4
+        quantized = dense_dims * bits / 8 + 4 if bits < 32 else 0
+        # Layer 0 of the graph holds up to 2 * m neighbours per vector
+        graph = 2 * m * 4 if dense_index_type.endswith("hnsw") else 0
+        parts["source"] += dense_dims * VECTOR_SOURCE_BYTES_PER_DIM * STORED_RATIO[codec]
+        parts["dense"] = raw + quantized + graph
+        # What has to stay in the page cache for fast kNN
+        parts["vector_ram"] = (quantized or raw) + graph
+    return parts
+
+
+def refresh_interval_for(ingest_docs_per_sec):
+    for threshold, interval in REFRESH_INTERVALS:
+        if ingest_docs_per_sec >= threshold:
+            return interval
+
+
+def plan_index(docs, avg_doc_bytes=2048, ingest_docs_per_sec=100, sparse=True, dense_dims=None,
+               dense_index_type="int8_hnsw", replicas=1, codec="best_compression", target_shard_gb=30,
+               shard_ingest_docs_per_sec=5000, data_nodes=1, expected_fields=100, rollover=False,
+               m=DEFAULT_HNSW_M):
+    parts = per_doc_bytes(avg_doc_bytes, codec, sparse, dense_dims, dense_index_type, m)
+    doc_bytes = sum(value for key, value in parts.items() if key != "vector_ram")
+    primary_bytes = docs * doc_bytes
+    shards_by_size = max(1, math.ceil(primary_bytes / (target_shard_gb * GB)))
+    shards_by_ingest = max(1, math.ceil(ingest_docs_per_sec / shard_ingest_docs_per_sec))
+    # With rollover a new index starts whenever a shard reaches the target
+    # size, so only the ingest rate decides the shard count
+    shards = shards_by_ingest if rollover else max(shards_by_size, shards_by_ingest)
+    if shards > 1 and data_nodes > 1:
+        # Spread evenly: a multiple of the data nodes
+        shards = math.ceil(shards / data_nodes) * data_nodes
+    generations = max(1, math.ceil(primary_bytes / (shards * target_shard_gb * GB))) if rollover else 1
+    return {
+        "docs": docs,
+        "avg_doc_bytes": avg_doc_bytes,
+        "ingest_docs_per_sec": ingest_docs_per_sec,
+        "per_doc_bytes": parts,
+        "primary_bytes": primary_bytes,
+        "total_bytes": primary_bytes * (1 + replicas),
+        "vector_ram_bytes": docs * parts["vector_ram"] * (1 + replicas),
+        "shards": shards,
+        "shards_by_size": shards_by_size,
+        "shards_by_ingest": shards_by_ingest,
+        "replicas": replicas,
+        "generations": generations,
+        "shard_bytes": primary_bytes / (shards * generations),
+        "target_shard_gb": target_shard_gb,
+        "refresh_interval": refresh_interval_for(ingest_docs_per_sec),
+        "codec": codec,
+        "total_fields_limit": max(1000, 2 * expected_fields),
+        "rollover": rollover,
+        "sparse": sparse,
+        "dense_dims": dense_dims,
+        "dense_index_type": dense_index_type,
+        "m": m,
+    }
+
+
+def index_settings(plan, policy=None, rollover_alias=None):
+    settings = {
+        "number_of_shards": plan["shards"],
+        "number_of_replicas": plan["replicas"],
+        "refresh_interval": plan["refresh_interval"],
+        "mapping": {
+            # Documents with too many new fields are indexed without them
+            # instead of being rejected
+            "total_fields": {"limit": plan["total_fields_limit"], "ignore_dynamic_beyond_limit": True},
+            "depth": {"limit": 20},
+            "nested_fields": {"limit": 50},
+        },
+    }
+    if plan["codec"] != "default":
+        # Changes only the stored fields; search speed is unaffected
+        settings["codec"] = plan["codec"]
+    if plan["ingest_docs_per_sec"] >= 1000:
+        # Fewer, larger flushes while ingesting
+        settings["translog"] = {"flush_threshold_size": "1gb"}
+    if policy:
+        settings["lifecycle"] = {"name": policy}
+        if rollover_alias:
+            settings["lifecycle"]["rollover_alias"] = rollover_alias
+    return {"index": settings}
+
+
+def lifecycle_policy(plan, retention_days=None):
+    phases = {
+        "hot": {
+            "actions": {
+                "rollover": {"max_primary_shard_size": f"{plan['target_shard_gb']:g}gb"},
+            }
+        }
+    }
+    if retention_days:
+        phases["delete"] = {"min_age": f"{retention_days}d", "actions": {"delete": {}}}
+    return {"phases": phases}
+
+
+def build_template_spec(name, index_patterns, plan, priority=200, similarity="cosine", ef_construction=None,
+                        retention_days=None, rollover_alias=None):
+    # A provision.py spec with the ILM policy, component templates and index template
+    policy = f"{name}-policy" if plan["rollover"] else None
+    components = [
+        {"name": f"{name}-settings",
+         "template": {"settings": index_settings(plan, policy, rollover_alias)}},
+        {"name": f"{name}-mappings-text", "template": {"mappings": TEXT_MAPPINGS}},
+    ]
+    if plan["sparse"]:
+        components.append({"name": f"{name}-mappings-sparse",
+                           "template": {"mappings": {"properties": {SPARSE_FIELD: {"type": "sparse_vector"}}}}})
+    if plan["dense_dims"]:
+        mappings = dense_vector_mappings(plan["dense_dims"], plan["dense_index_type"], similarity,
+                                         m=plan["m"], ef_construction=ef_construction)
+        components.append({"name": f"{name}-mappings-dense", "template": {"mappings": mappings}})
+    spec = {
+        "component_templates": components,
+        "index_templates": [{
+            "name": name,
+            "index_patterns": list(index_patterns),
+            "priority": priority,
+            "composed_of": [component["name"] for component in components],
+        }],
+    }
+    if policy:
+        spec["ilm_policies"] = [{"name": policy, "policy": lifecycle_policy(plan, retention_days)}]
+    return spec
+
+
+def bootstrap_rollover_index(client, alias):
+    # ILM rollover needs a first index that the alias writes to
+    if client.indices.exists_alias(name=alias):
+        return None
+    index_name = f"{alias}-000001"
+    client.indices.create(index=index_name, aliases={alias: {"is_write_index": True}})
+    return index_name
+
+
+def print_plan(plan):
+    parts = plan["per_doc_bytes"]
+    print(f"Corpus: {plan['docs']:,} docs x {plan['avg_doc_bytes'] / 1024:.1f} KB, "
+          f"ingest {plan['ingest_docs_per_sec']:,} docs/sec")
+    print(f"Per document on disk: source {parts['source'] / 1024:.2f} KB, index {parts['index'] / 1024:.2f} KB, "
+          f"sparse {parts['sparse'] / 1024:.2f} KB, dense {parts['dense'] / 1024:.2f} KB")
+    print(f"Primary data {plan['primary_bytes'] / GB:.2f} GB, {plan['total_bytes'] / GB:.2f} GB "
+          f"with {plan['replicas']} replica(s)")
+    if plan["dense_dims"]:
+        print(f"Vector RAM for {plan['dense_index_type']} (quantized vectors + graph): "
+              f"{plan['vector_ram_bytes'] / GB:.2f} GB")
+    print(f"Shards: {plan['shards']} primary (size needs {plan['shards_by_size']}, "
+          f"ingest needs {plan['shards_by_ingest']}), target {plan['target_shard_gb']} GB per shard")
+    if plan["rollover"]:
+        print(f"Rollover: ~{plan['generations']} backing indices, "
+              f"{plan['shard_bytes'] / GB:.2f} GB per shard at rollover")
+    else:
+        print(f"Projected shard size: {plan['shard_bytes'] / GB:.2f} GB")
+    print(f"refresh_interval {plan['refresh_interval']}, codec {plan['codec']}, "
+          f"total_fields.limit {plan['total_fields_limit']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Size shards and settings from corpus size and ingest rate, "
+                                                 "and apply them as composable index templates")
+    parser.add_argument("--name", default="search", help="prefix of the templates and ILM policy")
+    parser.add_argument("--pattern", action="append", default=None, help="index pattern, repeatable (default NAME-*)")
+    parser.add_argument("--docs", type=int, required=True, help="expected number of documents")
+    parser.add_argument("--avg-doc-kb", type=float, default=2.0, help="average _source size without vectors")
+    parser.add_argument("--ingest-rate", type=int, default=100, help="expected peak docs/sec")
+    parser.add_argument("--no-sparse", action="store_true", help="no ELSER sparse_vector field")
+    parser.add_argument("--dense-dims", type=int, default=None, help="add a dense_vector field")
+    parser.add_argument("--index-type", choices=VECTOR_INDEX_TYPES, default="int8_hnsw")
+    parser.add_argument("--similarity", choices=SIMILARITIES, default="cosine")
+    parser.add_argument("--replicas", type=int, default=1)
+    parser.add_argument("--codec", choices=CODECS, default="best_compression")
+    parser.add_argument("--target-shard-gb", type=float, default=30)
+    parser.add_argument("--shard-ingest-rate", type=int, default=5000, help="docs/sec one primary shard sustains")
+    parser.add_argument("--data-nodes", type=int, default=1)
+    parser.add_argument("--fields", type=int, default=100, help="expected number of mapped fields")
+    parser.add_argument("--rollover", action="store_true", help="roll over at the target shard size with ILM")
+    parser.add_argument("--retention-days", type=int, default=None, help="delete rolled over indices after this")
+    parser.add_argument("--priority", type=int, default=200)
+    parser.add_argument("--apply", action="store_true", help="write the templates (default is a dry run)")
+    parser.add_argument("--offline", action="store_true", help="don't compare with the cluster")
+    parser.add_argument("--json", action="store_true", help="print the provision.py spec")
+    args = parser.parse_args()
+
+    plan = plan_index(args.docs, int(args.avg_doc_kb * 1024), args.ingest_rate, not args.no_sparse,
+                      args.dense_dims, args.index_type, args.replicas, args.codec, args.target_shard_gb,
+                      args.shard_ingest_rate, args.data_nodes, args.fields, args.rollover)
+    patterns = args.pattern or [f"{args.name}-*"]
+    alias = args.name if args.rollover else None
+    spec = build_template_spec(args.name, patterns, plan, args.priority, args.similarity,
+                               retention_days=args.retention_days, rollover_alias=alias)
+    print_plan(plan)
+    if args.json:
+        print(json.dumps(spec, indent=2))
+    if args.offline:
+        return
+
+    client = get_client()
+    print_report(reconcile(client, spec, dry_run=not args.apply), dry_run=not args.apply)
+    if args.apply and alias:
+        created = bootstrap_rollover_index(client, alias)
+        if created:
+            print(f"Created '{created}' as the write index of '{alias}'")
+    elif not args.apply:
+        print("\nDry run: nothing was written, use --apply")
+
+
+if __name__ == "__main__":
+    main()
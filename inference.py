@@ -1,7 +1,8 @@
-from elasticsearch import Elasticsearch, ApiError, ConnectionTimeout, NotFoundError
+from elasticsearch import ApiError
 import os
-import time
 from dotenv import load_dotenv
+from create_inference import create_or_get_inference
+from es_client import get_client
 load_dotenv() 
 
 def main():
@@ -10,10 +11,7 @@ def main():
         print("Error: ELASTIC_API_KEY environment variable is not set.")
         return
 
-    client = Elasticsearch(
-        "https://my-elastic-project-a943bc.es.us-east-1.aws.elastic.cloud:443",
-        api_key=api_key
-    )
+    client = get_client()
 
     # Check connection and print cluster info
     try:
@@ -28,49 +26,5 @@ def main():
     inference_id = "elser_embeddings"
     create_or_get_inference(client, inference_id)
 
-def create_or_get_inference(client, inference_id):
-    max_retries = 3
-    retry_delay = 5
-
-    for attempt in range(max_retries):
-        try:
-            # Check if inference already exists
-            try:
-                existing_inference = client.inference.get(task_type="sparse_embedding", inference_id=inference_id)
-                print(f"Inference '{inference_id}' already exists:")
-                print(existing_inference)
-                return
-            except NotFoundError:
-                # Inference doesn't exist, proceed with creation
-                pass
-
-            resp = client.inference.put(
-                task_type="sparse_embedding",
-                inference_id=inference_id,
-                inference_config={
-                    "service": "elser",
-                    "service_settings": {
-                        "num_allocations": 1,
-                        "num_threads": 1
-                    }
-                }
-            )
-            print("Inference creation response:")
-            print(resp)
-            return
-        except ConnectionTimeout:
-            if attempt < max_retries - 1:
-                print(f"Connection timed out. Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                print("Max retries reached. Unable to create inference due to connection timeout.")
-        except ApiError as e:
-            print(f"Error creating inference: {e}")
-            if "Model IDs must be unique" in str(e):
-                new_id = f"{inference_id}_{int(time.time())}"
-                print(f"Attempting to create inference with a new ID: {new_id}")
-                create_or_get_inference(client, new_id)
-            return
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
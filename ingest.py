@@ -0,0 +1,234 @@
+from elasticsearch import ApiError, NotFoundError, helpers
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import argparse
+import json
+import os
+import time
+from dotenv import load_dotenv
+from create_inference import create_or_get_inference
+from embedding_cache import content_hash, format_stats, get_embedding_cache
+from es_client import get_client
+from retry import retry_call
+from search_cache import search_cache
+
+load_dotenv()
+
+ELSER_MODEL_ID = ".elser_model_2"
+DEFAULT_PIPELINE_ID = "elser_embeddings_pipeline"
+
+# How the index is made searchable once documents are written:
+#   "end"      - a single refresh after the last batch (the old behaviour)
+#   "wait_for" - every bulk request waits for the next scheduled refresh
+#   "true"     - every bulk request forces a refresh (slow, for tiny loads only)
+#   "false"    - never refresh explicitly, rely on the index refresh_interval
+REFRESH_POLICIES = ("end", "wait_for", "true", "false")
+
+
+def iter_batches(iterable, batch_size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def embed_batch(client, docs, model_id=ELSER_MODEL_ID, text_field="content", vector_field="content_vector",
+                cache=None):
+    # One infer_trained_model call for the whole batch instead of one per document.
+    # With a cache, documents whose text was embedded before skip inference.
+    hashes = [content_hash(doc[text_field]) for doc in docs]
+    cached = cache.get_many(model_id, hashes) if cache is not None else {}
+    missing = [(doc, key) for doc, key in zip(docs, hashes) if key not in cached]
+    if missing:
+        start = time.perf_counter()
+        resp = retry_call(
+            client.ml.infer_trained_model,
+            model_id=model_id,
+            docs=[{"text_field": doc[text_field]} for doc, _ in missing],
+            endpoint=f"ml/{model_id}", operation="ml.infer_trained_model"
+        )
+        embedded = {key: result["predicted_value"] for (_, key), result in zip(missing, resp["inference_results"])}
+        if cache is not None:
+            cache.put_many(model_id, embedded, time.perf_counter() - start)
+        cached.update(embedded)
+    for doc, key in zip(docs, hashes):
+        doc[vector_field] = cached[key]
+    return docs
+
+
+def embedded_batches(client, documents, batch_size=32, max_in_flight=4, embed_fn=embed_batch, **embed_kwargs):
+    # Embed batches on a worker pool while keeping at most max_in_flight batches
+    # outstanding. The source generator is only advanced when a slot frees up, so
+    # a slow cluster throttles how fast documents are read (backpressure).
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        pending = deque()
+        for batch in iter_batches(documents, batch_size):
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+            pending.append(executor.submit(embed_fn, client, batch, **embed_kwargs))
+        while pending:
+            yield pending.popleft().result()
+
+
+def create_or_get_ingest_pipeline(client, pipeline_id, inference_id,
+                                  input_field="content", output_field="content_vector"):
+    # Reuse the pipeline if it is already there so repeated runs don't rewrite it
+    try:
+        client.ingest.get_pipeline(id=pipeline_id)
+        print(f"Ingest pipeline '{pipeline_id}' already exists")
+        return pipeline_id
+    except NotFoundError:
+        pass
+
+    client.ingest.put_pipeline(
+        id=pipeline_id,
+        description=f"Embed '{input_field}' into '{output_field}' with inference endpoint '{inference_id}'",
+        processors=[
+            {
+                "inference": {
+                    "model_id": inference_id,
+                    "input_output": [
+                        {"input_field": input_field, "output_field": output_field}
+                    ]
+                }
+            }
+        ]
+    )
+    print(f"Ingest pipeline '{pipeline_id}' created for inference endpoint '{inference_id}'")
+    return pipeline_id
+
+
+def generate_actions(index_name, batches, id_field="_id", start_id=1):
+    next_id = start_id
+    for batch in batches:
+        for doc in batch:
+            doc = dict(doc)
+            doc_id = doc.pop(id_field, None)
+            if doc_id is None:
+                doc_id = next_id
+                next_id += 1
+            yield {"_index": index_name, "_id": str(doc_id), "_source": doc}
+
+
+def bulk_index_documents(client, index_name, documents, batch_size=32, thread_count=4,
+                         max_in_flight=4, refresh="end", model_id=ELSER_MODEL_ID,
+                         text_field="content", vector_field="content_vector", pipeline=None, embed=True,
+                         embedding_cache=None):
+    if refresh not in REFRESH_POLICIES:
+        raise ValueError(f"Unknown refresh policy '{refresh}', expected one of {REFRESH_POLICIES}")
+
+    bulk_kwargs = {"chunk_size": batch_size, "raise_on_error": False}
+    if pipeline or not embed:
+        # Pipeline mode: send raw text and let the ingest pipeline (or a
+        # semantic_text field when embed=False) embed it server-side, so sparse
+        # vectors never travel over the wire
+        batches = iter_batches(documents, batch_size)
+        if pipeline:
+            bulk_kwargs["pipeline"] = pipeline
+    else:
+        batches = embedded_batches(
+            client, documents, batch_size=batch_size, max_in_flight=max_in_flight,
+            model_id=model_id, text_field=text_field, vector_field=vector_field, cache=embedding_cache
+        )
+    actions = generate_actions(index_name, batches)
+
+    if refresh in ("wait_for", "true"):
+        bulk_kwargs["refresh"] = refresh
+
+    # parallel_bulk keeps at most queue_size chunks waiting for a worker thread,
+    # which bounds memory on the bulk side the same way max_in_flight does above
+    if thread_count > 1:
+        results = helpers.parallel_bulk(
+            client, actions, thread_count=thread_count, queue_size=max_in_flight, **bulk_kwargs
+        )
+    else:
+        results = helpers.streaming_bulk(client, actions, **bulk_kwargs)
+
+    stats = {"indexed": 0, "failed": 0, "seconds": 0.0, "docs_per_sec": 0.0}
+    start = time.perf_counter()
+    for ok, item in results:
+        if ok:
+            stats["indexed"] += 1
+        else:
+            stats["failed"] += 1
+            if stats["failed"] <= 5:
+                print(f"Failed to index document: {item}")
+
+    if refresh == "end":
+        client.indices.refresh(index=index_name)
+    # Cached search results for this index are stale now
+    search_cache.invalidate_index(index_name)
+
+    stats["seconds"] = time.perf_counter() - start
+    if stats["seconds"] > 0:
+        stats["docs_per_sec"] = stats["indexed"] / stats["seconds"]
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream documents from a JSONL file into an ELSER index")
+    parser.add_argument("path", help="JSONL file with one {'title': ..., 'content': ...} object per line")
+    parser.add_argument("--index", default="elser_test_index")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4, help="parallel bulk threads")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="embedding batches outstanding at once")
+    parser.add_argument("--refresh", choices=REFRESH_POLICIES, default="end")
+    parser.add_argument("--pipeline-mode", action="store_true",
+                        help="embed server-side with an ingest pipeline instead of client-side")
+    parser.add_argument("--inference-id", default="elser_embeddings")
+    parser.add_argument("--pipeline-id", default=DEFAULT_PIPELINE_ID)
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="re-embed every document instead of reusing cached embeddings")
+    args = parser.parse_args()
+
+    api_key = os.getenv("ELASTIC_API_KEY")
+    if not api_key:
+        print("Error: ELASTIC_API_KEY environment variable is not set.")
+        return
+
+    client = get_client()
+
+    pipeline = None
+    if args.pipeline_mode:
+        inference_id = create_or_get_inference(client, args.inference_id)
+        if not inference_id:
+            print("Failed to create or get inference. Aborting ingestion.")
+            return
+        try:
+            pipeline = create_or_get_ingest_pipeline(client, args.pipeline_id, inference_id)
+        except ApiError as e:
+            print(f"Error creating ingest pipeline: {e}")
+            return
+
+    embedding_cache = None if args.no_embedding_cache or pipeline else get_embedding_cache()
+    try:
+        stats = bulk_index_documents(
+            client, args.index, read_jsonl(args.path),
+            batch_size=args.batch_size, thread_count=args.workers,
+            max_in_flight=args.max_in_flight, refresh=args.refresh, pipeline=pipeline,
+            embedding_cache=embedding_cache
+        )
+    except ApiError as e:
+        print(f"Error during ingestion: {e}")
+        return
+
+    print(f"Indexed {stats['indexed']} documents ({stats['failed']} failed) "
+          f"in {stats['seconds']:.2f}s, {stats['docs_per_sec']:.1f} docs/sec")
+    if embedding_cache is not None:
+        print(format_stats(embedding_cache.stats()))
+
+
+if __name__ == "__main__":
+    main()
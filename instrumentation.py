@@ -0,0 +1,430 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import argparse
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+from latency import LatencyHistogram
+
+load_dotenv()
+
+# Timing for every Elasticsearch call. instrument(client) wraps the client's
+# transport, which every API method and every client.options() copy goes
+# through, and the nodes it sends to, so each logical call is recorded once
+# with its duration, status, request/response bytes, attempts (the transport
+# retries on connection errors and 429/5xx) and the server-side "took" and
+# "ingest_took" (time spent in ingest pipelines, i.e. ELSER inference) when the
+# response has them. Events go to a JSON lines log and, optionally, Prometheus
+# or OpenTelemetry metrics.
+#
+# "retries" counts both retry layers: transport attempts beyond the first, plus
+# one for the first call of every RetryPolicy attempt after the first. Calls
+# made by the policy also carry retry_call_id (shared by all attempts of one
+# logical call) and retry_attempt.
+#
+# Set ES_INSTRUMENTATION=true to enable. When it is off get_recorder() returns
+# a NoopRecorder, instrument() leaves the client untouched and no exporter is
+# imported.
+#
+#   python instrumentation.py summary es_calls.jsonl   # p50/p95/p99 per operation
+
+# Path words that name a sub-API rather than an index, id or model
+SUBRESOURCES = ("scroll", "pipeline", "policy", "trained_models", "completion", "sparse_embedding",
+                "text_embedding", "rerank", "chat_completion")
+
+_current_call = ContextVar("es_instrumentation_call", default=None)
+_current_trace = ContextVar("es_instrumentation_trace", default=None)
+_current_policy_attempt = ContextVar("es_instrumentation_policy_attempt", default=None)
+
+
+def operation_name(method, target):
+    # "POST /my-index/_search?size=10" -> "POST search",
+    # "POST /_inference/completion/my-endpoint" -> "POST inference.completion"
+    segments = [segment for segment in target.split("?", 1)[0].split("/") if segment]
+    api = [segment.lstrip("_") for segment in segments if segment.startswith("_") or segment in SUBRESOURCES]
+    if not api:
+        api = ["index"] if segments else ["cluster"]
+    return f"{method} {'.'.join(api)}"
+
+
+def response_fields(body):
+    fields = {}
+    if isinstance(body, dict):
+        for key in ("took", "ingest_took"):
+            if isinstance(body.get(key), (int, float)):
+                fields[f"{key}_ms"] = body[key]
+    return fields
+
+
+class NoopRecorder:
+    enabled = False
+
+    def record(self, event):
+        pass
+
+    def trace(self, name):
+        return nullcontext()
+
+    def summary(self):
+        return {}
+
+    def print_summary(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Recorder:
+    enabled = True
+
+    def __init__(self, log_path=None, exporters=()):
+        self.histograms = defaultdict(LatencyHistogram)
+        self.totals = defaultdict(lambda: defaultdict(float))
+        self.exporters = list(exporters)
+        self._lock = threading.Lock()
+        if log_path == "-":
+            self._log = sys.stderr
+        elif log_path:
+            # Line buffered, so the log can be tailed while the process runs
+            self._log = open(log_path, "a", encoding="utf-8", buffering=1)
+        else:
+            self._log = None
+
+    def record(self, event):
+        operation = event["operation"]
+        line = json.dumps(event, default=str) if self._log is not None else None
+        with self._lock:
+            histogram = self.histograms[operation]
+            totals = self.totals[operation]
+            totals["errors"] += 1 if event.get("error") else 0
+            for key in ("retries", "request_bytes", "response_bytes"):
+                totals[key] += event.get(key) or 0
+            for key in ("took_ms", "ingest_took_ms"):
+                if event.get(key) is not None:
+                    totals[key] += event[key]
+                    totals[f"{key}_count"] += 1
+            if line is not None:
+                self._log.write(line + "\n")
+        histogram.record(event["duration_ms"] / 1000)
+        for exporter in self.exporters:
+            exporter.export(event)
+
+    @contextmanager
+    def trace(self, name):
+        # Tags every call made inside with one trace id, and records the
+        # whole block as operation "trace <name>"
+        parent = _current_trace.get()
+        trace = {"trace_id": parent["trace_id"] if parent else uuid.uuid4().hex[:16], "trace": name}
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield trace
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _current_trace.reset(token)
+            self.record(dict(trace, ts=time.time(), operation=f"trace {name}",
+                             duration_ms=(time.perf_counter() - start) * 1000, error=error))
+
+    def summary(self):
+        out = {}
+        with self._lock:
+            for operation, histogram in sorted(self.histograms.items()):
+                totals = self.totals[operation]
+                summary = histogram.summary()
+                calls = summary["count"] or 1
+                summary.update({
+                    "errors": int(totals["errors"]),
+                    "retries": int(totals["retries"]),
+                    "mean_request_bytes": totals["request_bytes"] / calls,
+                    "mean_response_bytes": totals["response_bytes"] / calls,
+                    "mean_took_ms": (totals["took_ms"] / totals["took_ms_count"]
+                                     if totals["took_ms_count"] else None),
+                    "mean_ingest_took_ms": (totals["ingest_took_ms"] / totals["ingest_took_ms_count"]
+                                            if totals["ingest_took_ms_count"] else None),
+                })
+                out[operation] = summary
+        return out
+
+    def print_summary(self):
+        print(format_summary(self.summary()))
+
+    def close(self):
+        if self._log is not None and self._log is not sys.stderr:
+            self._log.close()
+
+
+def format_summary(summary):
+    lines = [f"\n{'operation':<36} {'calls':>6} {'err':>4} {'retry':>5} {'p50 ms':>8} {'p95 ms':>8} "
+             f"{'p99 ms':>8} {'req KB':>7} {'resp KB':>8} {'took ms':>8}"]
+    for operation, s in summary.items():
+        took = "-" if s["mean_took_ms"] is None else f"{s['mean_took_ms']:.1f}"
+        lines.append(f"{operation:<36} {s['count']:>6} {s['errors']:>4} {s['retries']:>5} {s['p50_ms']:>8.2f} "
+                     f"{s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['mean_request_bytes'] / 1024:>7.1f} "
+                     f"{s['mean_response_bytes'] / 1024:>8.1f} {took:>8}")
+    return "\n".join(lines)
+
+
+# -- exporters -----------------------------------------------------------
+
+class PrometheusExporter:
+    def __init__(self, port=None):
+        import prometheus_client  # optional dependency, only needed for this exporter
+        labels = ["operation", "status"]
+        self.duration = prometheus_client.Histogram(
+            "elasticsearch_request_duration_seconds", "Elasticsearch call latency", labels,
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+        )
+        self.bytes = prometheus_client.Counter("elasticsearch_request_bytes", "Request and response body bytes",
+                                               ["operation", "direction"])
+        self.retries = prometheus_client.Counter("elasticsearch_request_retries", "Transport and retry policy retries",
+                                                 ["operation"])
+        if port:
+            prometheus_client.start_http_server(port)
+
+    def export(self, event):
+        operation = event["operation"]
+        self.duration.labels(operation, str(event.get("status"))).observe(event["duration_ms"] / 1000)
+        self.bytes.labels(operation, "request").inc(event.get("request_bytes") or 0)
+        self.bytes.labels(operation, "response").inc(event.get("response_bytes") or 0)
+        if event.get("retries"):
+            self.retries.labels(operation).inc(event["retries"])
+
+
+class OpenTelemetryExporter:
+    # Metrics only: spans for each call come from the Elasticsearch client's
+    # own OpenTelemetry support once an SDK is configured
+    def __init__(self):
+        from opentelemetry import metrics  # optional dependency, only needed for this exporter
+        meter = metrics.get_meter("elasticsearch-inference-tools")
+        self.duration = meter.create_histogram("elasticsearch.client.request.duration", unit="s",
+                                               description="Elasticsearch call latency")
+        self.bytes = meter.create_counter("elasticsearch.client.request.body.size", unit="By",
+                                          description="Request and response body bytes")
+        self.retries = meter.create_counter("elasticsearch.client.request.retries",
+                                            description="Transport and retry policy retries")
+
+    def export(self, event):
+        attributes = {"operation": event["operation"], "status": str(event.get("status"))}
+        self.duration.record(event["duration_ms"] / 1000, attributes)
+        self.bytes.add(event.get("request_bytes") or 0, dict(attributes, direction="request"))
+        self.bytes.add(event.get("response_bytes") or 0, dict(attributes, direction="response"))
+        if event.get("retries"):
+            self.retries.add(event["retries"], attributes)
+
+
+EXPORTERS = ("prometheus", "otel")
+
+
+def exporters_from_env():
+    exporters = []
+    for name in filter(None, (n.strip() for n in os.getenv("ES_INSTRUMENTATION_EXPORTERS", "").split(","))):
+        if name == "prometheus":
+            exporters.append(PrometheusExporter(port=int(os.getenv("ES_INSTRUMENTATION_PROMETHEUS_PORT", "0"))))
+        elif name == "otel":
+            exporters.append(OpenTelemetryExporter())
+        else:
+            raise ValueError(f"Unknown exporter '{name}', expected one of {EXPORTERS}")
+    return exporters
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    # Process-wide recorder, configured from the environment on first use
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                if os.getenv("ES_INSTRUMENTATION", "false").strip().lower() in ("1", "true", "yes", "on"):
+                    _recorder = Recorder(log_path=os.getenv("ES_INSTRUMENTATION_LOG", "es_calls.jsonl"),
+                                         exporters=exporters_from_env())
+                else:
+                    _recorder = NoopRecorder()
+    return _recorder
+
+
+# -- client wrapping -----------------------------------------------------
+
+@contextmanager
+def policy_attempt(call_id, attempt):
+    # Set by RetryPolicy around each attempt; see the note on "retries" above
+    token = _current_policy_attempt.set({"retry_call_id": call_id, "retry_attempt": attempt,
+                                         "counted": attempt == 1})
+    try:
+        yield
+    finally:
+        _current_policy_attempt.reset(token)
+
+
+def _start_call():
+    call = {"attempts": 0, "request_bytes": 0, "response_bytes": 0}
+    return call, _current_call.set(call)
+
+
+def _finish_call(recorder, method, target, start, call, resp, error):
+    status = resp.meta.status if resp is not None else None
+    if error is not None:
+        error = type(error).__name__
+    elif status >= 400 and not (method == "HEAD" and status == 404):
+        # The client raises ApiError for these after the transport returns
+        error = f"HTTP {status}"
+    event = {
+        "ts": time.time(),
+        "operation": operation_name(method, target),
+        "path": target.split("?", 1)[0],
+        "status": status,
+        "duration_ms": (time.perf_counter() - start) * 1000,
+        "request_bytes": call["request_bytes"],
+        "response_bytes": call["response_bytes"],
+        "attempts": call["attempts"],
+        "retries": max(0, call["attempts"] - 1),
+        "error": error,
+    }
+    policy = _current_policy_attempt.get()
+    if policy is not None:
+        event["retry_call_id"] = policy["retry_call_id"]
+        event["retry_attempt"] = policy["retry_attempt"]
+        if not policy["counted"]:
+            # The first request of a policy retry
+            policy["counted"] = True
+            event["retries"] += 1
+    if resp is not None:
+        event.update(response_fields(resp.body))
+    trace = _current_trace.get()
+    if trace:
+        event.update(trace)
+    recorder.record(event)
+
+
+def _count_attempt(body):
+    call = _current_call.get()
+    if call is not None:
+        call["attempts"] += 1
+        call["request_bytes"] += len(body or b"")
+    return call
+
+
+def _wrap_node(node):
+    # Nodes see the serialized request and the raw response of every attempt
+    perform_request = node.perform_request
+    if inspect.iscoroutinefunction(perform_request):
+        async def instrumented(method, target, body=None, **kwargs):
+            call = _count_attempt(body)
+            resp = await perform_request(method, target, body=body, **kwargs)
+            if call is not None:
+                call["response_bytes"] += len(resp.body or b"")
+            return resp
+    else:
+        def instrumented(method, target, body=None, **kwargs):
+            call = _count_attempt(body)
+            resp = perform_request(method, target, body=body, **kwargs)
+            if call is not None:
+                call["response_bytes"] += len(resp.body or b"")
+            return resp
+    node.perform_request = instrumented
+    node._instrumented = True
+
+
+def instrument(client, recorder=None):
+    recorder = recorder or get_recorder()
+    transport = client.transport
+    if not recorder.enabled or getattr(transport, "_instrumented", False):
+        return client
+
+    # Wrap nodes as the pool hands them out, which also covers sniffed nodes
+    node_pool = transport.node_pool
+    get_node = node_pool.get
+
+    def get():
+        node = get_node()
+        if not getattr(node, "_instrumented", False):
+            _wrap_node(node)
+        return node
+    node_pool.get = get
+
+    perform_request = transport.perform_request
+    if inspect.iscoroutinefunction(perform_request):
+        async def instrumented(method, target, **kwargs):
+            call, token = _start_call()
+            start, resp, error = time.perf_counter(), None, None
+            try:
+                resp = await perform_request(method, target, **kwargs)
+                return resp
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _current_call.reset(token)
+                _finish_call(recorder, method, target, start, call, resp, error)
+    else:
+        def instrumented(method, target, **kwargs):
+            call, token = _start_call()
+            start, resp, error = time.perf_counter(), None, None
+            try:
+                resp = perform_request(method, target, **kwargs)
+                return resp
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _current_call.reset(token)
+                _finish_call(recorder, method, target, start, call, resp, error)
+    transport.perform_request = instrumented
+    transport._instrumented = True
+    return client
+
+
+def run_with_summary(name, fn, *args, **kwargs):
+    # For script entry points: one trace around the whole run, then the
+    # per-operation summary (nothing is printed when instrumentation is off)
+    recorder = get_recorder()
+    try:
+        with recorder.trace(name):
+            return fn(*args, **kwargs)
+    finally:
+        recorder.print_summary()
+
+
+def summarize_log(path, trace=None):
+    # Replays a JSON lines log into a Recorder, optionally for one trace name
+    recorder = Recorder()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if trace is None or event.get("trace") == trace:
+                recorder.record(event)
+    return recorder.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize instrumented Elasticsearch calls")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="p50/p95/p99 per operation from a JSON lines log")
+    summary_parser.add_argument("log", nargs="?", default=os.getenv("ES_INSTRUMENTATION_LOG", "es_calls.jsonl"))
+    summary_parser.add_argument("--trace", default=None, help="only calls made inside this trace")
+    summary_parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = summarize_log(args.log, args.trace)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
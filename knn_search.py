@@ -0,0 +1,90 @@
+import argparse
+import math
+from dotenv import load_dotenv
+from es_client import get_client
+from vector_loader import VECTOR_FIELD
+
+load_dotenv()
+
+# Approximate kNN over the dense_vector fields written by vector_loader.py.
+# Each shard walks its HNSW graph until it has num_candidates candidates and
+# returns the best k of them, so num_candidates trades latency for recall.
+# Filters are applied while walking the graph (pre-filtering), so a selective
+# filter still returns k hits, unlike filtering the kNN results afterwards.
+# benchmarks/knn.py measures the recall/latency curve against exact scoring.
+
+MAX_NUM_CANDIDATES = 10000
+
+
+def default_num_candidates(k):
+    # Same default as Elasticsearch: 1.5 * k, capped at the maximum
+    return min(max(math.ceil(1.5 * k), k), MAX_NUM_CANDIDATES)
+
+
+def build_knn_search_body(query_vector=None, k=10, num_candidates=None, filter=None, field=VECTOR_FIELD,
+                          query_text=None, model_id=None):
+    num_candidates = num_candidates or default_num_candidates(k)
+    if k < 1 or not k <= num_candidates <= MAX_NUM_CANDIDATES:
+        raise ValueError(f"Expected 1 <= k <= num_candidates <= {MAX_NUM_CANDIDATES}, "
+                         f"got k={k}, num_candidates={num_candidates}")
+    knn = {"field": field, "k": k, "num_candidates": num_candidates}
+    if query_vector is not None:
+        # NumPy vectors become plain lists so cache and coalescer keys see every value
+        knn["query_vector"] = query_vector.tolist() if hasattr(query_vector, "tolist") else list(query_vector)
+    elif query_text and model_id:
+        # Let the cluster embed the query with a deployed text embedding model
+        knn["query_vector_builder"] = {"text_embedding": {"model_id": model_id, "model_text": query_text}}
+    else:
+        raise ValueError("knn search needs a query_vector, or query_text and a model_id")
+    if filter:
+        knn["filter"] = filter
+    return {
+        "knn": knn,
+        "size": k,
+        # The vectors are only needed for scoring
+        "_source": {"excludes": [field]},
+    }
+
+
+def knn_search(client, index_name, query_vector=None, k=10, num_candidates=None, filter=None, field=VECTOR_FIELD,
+               query_text=None, model_id=None, cache=None, coalescer=None):
+    body = build_knn_search_body(query_vector, k, num_candidates, filter, field, query_text, model_id)
+    search = coalescer.search if coalescer is not None else client.search
+    if cache is not None:
+        query = query_text if query_vector is None else " ".join(f"{float(x):.6g}" for x in query_vector)
+        return cache.get_or_search(
+            index_name, query, lambda: search(index=index_name, body=body),
+            knn=field, k=k, num_candidates=body["knn"]["num_candidates"], filter=filter, model_id=model_id
+        )
+    return search(index=index_name, body=body)
+
+
+def parse_vector(text):
+    # "5.4, 9.7, 2.6" -> [5.4, 9.7, 2.6]
+    return [float(value) for value in text.replace(",", " ").split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Approximate kNN search over a dense_vector field")
+    parser.add_argument("query", help="comma-separated query vector, or text with --model-id")
+    parser.add_argument("--index", default="search-rp3o")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--num-candidates", type=int, default=None)
+    parser.add_argument("--model-id", default=None, help="text embedding model that embeds the query")
+    parser.add_argument("--filter-text", default=None, help="only consider documents whose text matches")
+    args = parser.parse_args()
+
+    client = get_client()
+    knn_filter = {"match": {"text": args.filter_text}} if args.filter_text else None
+    if args.model_id:
+        resp = knn_search(client, args.index, k=args.k, num_candidates=args.num_candidates, filter=knn_filter,
+                          query_text=args.query, model_id=args.model_id)
+    else:
+        resp = knn_search(client, args.index, parse_vector(args.query), k=args.k,
+                          num_candidates=args.num_candidates, filter=knn_filter)
+    for hit in resp["hits"]["hits"]:
+        print(f"{hit['_score']:.4f}  {hit['_id']}  {hit['_source'].get('text', '')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import math
+import threading
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile over an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, elapsed=None):
+    values = sorted(latencies)
+    summary = {
+        "count": len(values),
+        "mean_ms": (sum(values) / len(values) * 1000) if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] * 1000) if values else 0.0,
+    }
+    if elapsed:
+        summary["throughput_per_sec"] = len(values) / elapsed
+    return summary
+
+
+class LatencyHistogram:
+    # HdrHistogram-style log-linear buckets over integer microseconds: values
+    # keep `significant_figures` digits of precision, so memory stays bounded
+    # however many samples are recorded and percentiles are within ~1%
+    def __init__(self, significant_figures=2):
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_figures))
+        self.counts = {}
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+        self._lock = threading.Lock()
+
+    def bucket(self, value_us):
+        shift = max(0, value_us.bit_length() - self.sub_bucket_bits)
+        return (value_us >> shift) << shift, (1 << shift) - 1
+
+    def record(self, seconds):
+        value_us = max(0, int(seconds * 1_000_000))
+        lowest, _ = self.bucket(value_us)
+        with self._lock:
+            self.counts[lowest] = self.counts.get(lowest, 0) + 1
+            self.count += 1
+            self.total_us += value_us
+            self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+            self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other):
+        with self._lock:
+            for lowest, count in other.counts.items():
+                self.counts[lowest] = self.counts.get(lowest, 0) + count
+            self.count += other.count
+            self.total_us += other.total_us
+            if other.min_us is not None:
+                self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+            self.max_us = max(self.max_us, other.max_us)
+
+    def value_at_percentile(self, pct):
+        # Highest value equivalent to the bucket holding the nearest-rank sample, in ms
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for lowest in sorted(self.counts):
+            seen += self.counts[lowest]
+            if seen >= rank:
+                _, width = self.bucket(lowest)
+                return min(lowest + width, self.max_us) / 1000
+        return self.max_us / 1000
+
+    def distribution(self):
+        # (upper bound ms, count, cumulative percentile) per non-empty bucket
+        rows, seen = [], 0
+        for lowest in sorted(self.counts):
+            seen += self.counts[lowest]
+            _, width = self.bucket(lowest)
+            rows.append({"le_ms": (lowest + width) / 1000, "count": self.counts[lowest],
+                         "percentile": seen / self.count * 100})
+        return rows
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "min_ms": (self.min_us or 0) / 1000,
+            "mean_ms": (self.total_us / self.count / 1000) if self.count else 0.0,
+            "p50_ms": self.value_at_percentile(50),
+            "p90_ms": self.value_at_percentile(90),
+            "p95_ms": self.value_at_percentile(95),
+            "p99_ms": self.value_at_percentile(99),
+            "p999_ms": self.value_at_percentile(99.9),
+            "max_ms": self.max_us / 1000,
+        }
@@ -1,9 +1,11 @@
-from elasticsearch import Elasticsearch, ApiError, NotFoundError, RequestError
+from elasticsearch import ApiError, NotFoundError, RequestError
 import os
+from es_client import build_client
+from instrumentation import run_with_summary
 
 def main():
     # Connect to Elasticsearch
-    es = Elasticsearch(
+    es = build_client(
         hosts=["http://localhost:9200"],  # Update with your host if different
         basic_auth=(os.getenv('ES_USER') ,os.getenv('ES_PASSWORD')),  # Replace with your credentials
         verify_certs=False
@@ -58,4 +60,4 @@ def main():
         print(f"Error searching test index: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_with_summary("main", main)
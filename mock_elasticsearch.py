@@ -0,0 +1,1252 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from collections import defaultdict
+from functools import lru_cache
+import argparse
+import fnmatch
+import gzip
+import json
+import re
+import threading
+import time
+import uuid
+import zlib
+
+try:
+    import numpy as np  # optional, only needed for knn searches
+except ImportError:
+    np = None
+
+# A small in-memory stand-in for the Elasticsearch REST API. It implements just
+# enough of the endpoints used by this project (indices, bulk, search, ingest
+# pipelines, ELSER inference and the inference API) to run the benchmarks
+# locally, and it counts requests and request bytes so the different ingestion
+# and search strategies can be compared without a cluster.
+
+ELSER_MAX_TOKENS = 512
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def fake_sparse_embedding(text):
+    # Deterministic pseudo-ELSER output: one weighted token per distinct word,
+    # truncated at the same input length as the real model
+    vector = {}
+    for token in tokenize(text)[:ELSER_MAX_TOKENS]:
+        vector[token] = round(0.1 + (zlib.crc32(token.encode()) % 1000) / 250, 4)
+    return vector
+
+
+# Query text is scored against every document, so embed it once
+query_embedding = lru_cache(maxsize=1024)(fake_sparse_embedding)
+
+
+def fake_dense_embedding(text, dims):
+    # Deterministic pseudo text embedding for knn query_vector_builder: each
+    # word adds +-1 to a hashed dimension
+    vector = [0.0] * dims
+    for token in tokenize(text):
+        h = zlib.crc32(token.encode())
+        vector[h % dims] += 1.0 if h & 1 << 31 else -1.0
+    return vector
+
+
+# Bits per dimension of the quantized copy used to pick knn candidates; the
+# float types pick candidates exactly
+QUANTIZATION_BITS = {"int8_hnsw": 8, "int8_flat": 8, "int4_hnsw": 4, "int4_flat": 4, "bbq_hnsw": 1, "bbq_flat": 1}
+
+
+def quantize(matrix, bits):
+    if bits is None:
+        return matrix
+    if bits == 1:
+        # BBQ-style: the sign of each dimension around the centroid, so only
+        # the direction of each vector survives
+        centered = matrix - matrix.mean(axis=0)
+        return np.sign(centered) * np.abs(centered).mean(axis=1, keepdims=True)
+    lower, upper = np.percentile(matrix, [0.5, 99.5])
+    levels = (1 << bits) - 1
+    step = (upper - lower) / levels or 1.0
+    return np.round((np.clip(matrix, lower, upper) - lower) / step) * step + lower
+
+
+def vector_scores(matrix, query, similarity):
+    # Elasticsearch's _score for each similarity
+    dot = matrix @ query
+    if similarity == "cosine":
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        return (1 + dot / np.where(norms == 0, 1.0, norms)) / 2
+    if similarity == "dot_product":
+        return (1 + dot) / 2
+    if similarity == "l2_norm":
+        return 1 / (1 + ((matrix - query) ** 2).sum(axis=1))
+    return np.where(dot < 0, 1 / (1 - dot), dot + 1)
+
+
+class ApiException(Exception):
+    def __init__(self, status, error_type, reason):
+        super().__init__(reason)
+        self.status = status
+        self.error_type = error_type
+        self.reason = reason
+
+
+def flatten_settings(settings, prefix=""):
+    # {"index": {"refresh_interval": "1s"}} and {"refresh_interval": "1s"} both
+    # become {"index.refresh_interval": "1s"}, the way Elasticsearch stores them
+    flat = {}
+    for key, value in settings.items():
+        if isinstance(value, dict):
+            flat.update(flatten_settings(value, f"{prefix}{key}."))
+        else:
+            name = f"{prefix}{key}"
+            flat[name if name.startswith("index.") else f"index.{name}"] = value
+    return flat
+
+
+def nest_settings(flat):
+    nested = {}
+    for key, value in flat.items():
+        node = nested
+        *parents, leaf = key.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = str(value).lower() if isinstance(value, bool) else str(value)
+    return nested
+
+
+def merge_mappings(base, override):
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_mappings(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class DeploymentModel:
+    # Latency curve of a simulated ELSER deployment. Each allocation serves one
+    # request at a time, threads speed a request up following Amdahl's law and
+    # allocations * threads beyond the node's ML processors slow everything down.
+    def __init__(self, base_ms=5.0, per_doc_ms=4.0, parallel_fraction=0.7, processors=8):
+        self.base_ms = base_ms
+        self.per_doc_ms = per_doc_ms
+        self.parallel_fraction = parallel_fraction
+        self.processors = processors
+
+    def service_time(self, docs, allocations, threads):
+        speedup = 1 / ((1 - self.parallel_fraction) + self.parallel_fraction / threads)
+        contention = max(1.0, allocations * threads / self.processors)
+        return (self.base_ms + self.per_doc_ms * docs / speedup) * contention / 1000
+
+
+def deployment_allocations(settings):
+    adaptive = settings.get("adaptive_allocations") or {}
+    if adaptive.get("enabled"):
+        return adaptive.get("min_number_of_allocations") or 1
+    return settings.get("num_allocations", 1)
+
+
+class MockCluster:
+    def __init__(self, latency=0.0, infer_latency_per_doc=0.0, stream_token_delay=0.0, deployment_model=None,
+                 retrievers=True, knn_latency_per_candidate=0.0):
+        self.latency = latency
+        # HNSW visits more of the graph for larger num_candidates
+        self.knn_latency_per_candidate = knn_latency_per_candidate
+        self.vector_cache = {}
+        self.infer_latency_per_doc = infer_latency_per_doc
+        self.stream_token_delay = stream_token_delay
+        self.deployment_model = deployment_model
+        # retrievers=False behaves like a cluster from before the retriever API
+        self.retrievers = retrievers
+        self.allocation_slots = {}
+        self.indices = {}
+        self.pipelines = {}
+        self.inference_endpoints = {}
+        self.index_templates = {}
+        self.component_templates = {}
+        self.ilm_policies = {}
+        self.aliases = {}
+        self.scrolls = {}
+        self.lock = threading.RLock()
+        self.stats = defaultdict(int)
+
+    # -- bookkeeping -----------------------------------------------------
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+
+    def record(self, route, wire_bytes):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_received"] += wire_bytes
+            self.stats[f"requests:{route}"] += 1
+            self.stats[f"bytes:{route}"] += wire_bytes
+
+    def resolve(self, name):
+        # Concrete indices behind a name, which may be an alias
+        if name in self.aliases:
+            return list(self.aliases[name])
+        return [name]
+
+    def write_index(self, name):
+        if name not in self.aliases:
+            return name
+        members = self.aliases[name]
+        writers = [index for index, options in members.items() if options.get("is_write_index")]
+        if len(writers) == 1 or len(members) == 1:
+            return writers[0] if writers else next(iter(members))
+        raise ApiException(400, "illegal_argument_exception",
+                           f"no write index is defined for alias [{name}]")
+
+    def get_index(self, name):
+        index = self.indices.get(self.write_index(name))
+        if index is None:
+            raise ApiException(404, "index_not_found_exception", f"no such index [{name}]")
+        return index
+
+    def matching_template(self, name):
+        # Only the highest priority composable template applies, like Elasticsearch
+        matches = [template for template in self.index_templates.values()
+                   if any(fnmatch.fnmatchcase(name, pattern) for pattern in template.get("index_patterns", []))]
+        return max(matches, key=lambda template: template.get("priority", 0), default=None)
+
+    def new_index(self, name, body=None):
+        body = body or {}
+        # Component templates in composed_of order, then the index template's
+        # own template, then the create request; later values win
+        layers = []
+        template = self.matching_template(name)
+        if template is not None:
+            for component in template.get("composed_of", []):
+                if component in self.component_templates:
+                    layers.append(self.component_templates[component].get("template", {}))
+            layers.append(template.get("template", {}))
+        layers.append(body)
+        mappings, settings = {}, {}
+        for layer in layers:
+            mappings = merge_mappings(mappings, layer.get("mappings", {}))
+            settings.update(flatten_settings(layer.get("settings", {})))
+        return {
+            "mappings": mappings,
+            "settings": settings,
+            "docs": {},
+            "seq_no": 0,
+        }
+
+    # -- inference -------------------------------------------------------
+
+    def infer(self, texts):
+        if self.infer_latency_per_doc:
+            time.sleep(self.infer_latency_per_doc * len(texts))
+        return [fake_sparse_embedding(text) for text in texts]
+
+    def infer_deployment(self, endpoint, texts):
+        # Only one request per allocation runs at a time; the rest queue
+        settings = endpoint.get("service_settings", {})
+        allocations = deployment_allocations(settings)
+        threads = settings.get("num_threads", 1)
+        with self.lock:
+            slots = self.allocation_slots.get(endpoint["inference_id"])
+            if slots is None or slots[0] != allocations:
+                slots = (allocations, threading.Semaphore(allocations))
+                self.allocation_slots[endpoint["inference_id"]] = slots
+        with slots[1]:
+            time.sleep(self.deployment_model.service_time(len(texts), allocations, threads))
+        return [fake_sparse_embedding(text) for text in texts]
+
+    def run_pipeline(self, pipeline_id, source):
+        pipeline = self.pipelines.get(pipeline_id)
+        if pipeline is None:
+            raise ApiException(400, "illegal_argument_exception", f"pipeline with id [{pipeline_id}] does not exist")
+        for processor in pipeline.get("processors", []):
+            if "inference" in processor:
+                config = processor["inference"]
+                for io in config.get("input_output", []):
+                    if io["input_field"] in source:
+                        source[io["output_field"]] = self.infer([source[io["input_field"]]])[0]
+        return source
+
+    # -- documents -------------------------------------------------------
+
+    def index_doc(self, index_name, doc_id, source, pipeline=None):
+        with self.lock:
+            index_name = self.write_index(index_name)
+            if index_name not in self.indices:
+                self.indices[index_name] = self.new_index(index_name)
+            index = self.indices[index_name]
+            pipeline = pipeline or index["settings"].get("index.default_pipeline")
+        if pipeline and pipeline != "_none":
+            source = self.run_pipeline(pipeline, dict(source))
+        semantic = self.semantic_fields(index["mappings"], source)
+        if semantic:
+            # Kept beside the source like the real _inference_fields metadata
+            source = dict(source, _inference_fields=semantic)
+        with self.lock:
+            if doc_id is None:
+                doc_id = str(index["seq_no"] + 1)
+            result = "updated" if doc_id in index["docs"] else "created"
+            index["docs"][doc_id] = source
+            index["seq_no"] += 1
+            return doc_id, result, index["seq_no"]
+
+    def semantic_fields(self, mappings, source):
+        # Embed every semantic_text field, fed directly or through copy_to
+        properties = mappings.get("properties", {})
+        texts = defaultdict(list)
+        for field, config in properties.items():
+            if field not in source:
+                continue
+            if config.get("type") == "semantic_text":
+                texts[field].append(source[field])
+            copy_to = config.get("copy_to", [])
+            for target in [copy_to] if isinstance(copy_to, str) else copy_to:
+                if properties.get(target, {}).get("type") == "semantic_text":
+                    texts[target].append(source[field])
+        return {field: self.infer([" ".join(map(str, values))])[0] for field, values in texts.items()}
+
+    # -- search ----------------------------------------------------------
+
+    def score(self, query, source):
+        if not query or "match_all" in query:
+            return 1.0
+        if "text_expansion" in query:
+            field, config = next(iter(query["text_expansion"].items()))
+            return self.sparse_score(query_embedding(config["model_text"]), source.get(field))
+        if "sparse_vector" in query:
+            config = query["sparse_vector"]
+            query_vector = config.get("query_vector") or query_embedding(config["query"])
+            if config.get("prune"):
+                query_vector = self.prune(query_vector, config.get("pruning_config", {}))
+            return self.sparse_score(query_vector, self.field_vector(source, config["field"]))
+        if "semantic" in query:
+            config = query["semantic"]
+            return self.sparse_score(query_embedding(config["query"]), self.field_vector(source, config["field"]))
+        if "match" in query:
+            field, config = next(iter(query["match"].items()))
+            text = config["query"] if isinstance(config, dict) else config
+            return self.lexical_score(text, [source.get(field, "")])
+        if "multi_match" in query:
+            config = query["multi_match"]
+            fields = [f.split("^")[0] for f in config.get("fields", [])]
+            return self.lexical_score(config["query"], [source.get(f, "") for f in fields])
+        if "nested" in query:
+            scores = [score for score, _, _ in self.nested_scores(query["nested"], source)]
+            if not scores:
+                return None
+            mode = query["nested"].get("score_mode", "avg")
+            if mode == "max":
+                return max(scores)
+            if mode == "sum":
+                return sum(scores)
+            return sum(scores) / len(scores)
+        if "bool" in query:
+            total, matched = 0.0, False
+            for clause in query["bool"].get("must", []) + query["bool"].get("filter", []):
+                score = self.score(clause, source)
+                if score is None:
+                    return None
+                total += score * self.boost(clause)
+                matched = True
+            for clause in query["bool"].get("should", []):
+                score = self.score(clause, source)
+                if score is not None:
+                    total += score * self.boost(clause)
+                    matched = True
+            return total if matched else None
+        raise ApiException(400, "parsing_exception", f"unknown query [{next(iter(query))}]")
+
+    def boost(self, clause):
+        # Boosts only change how bool clauses are weighed against each other here
+        kind, config = next(iter(clause.items()))
+        if kind in ("text_expansion", "match") and isinstance(config, dict):
+            config = next(iter(config.values()), {})
+        return config.get("boost", 1.0) if isinstance(config, dict) else 1.0
+
+    def nested_scores(self, config, source):
+        # (score, offset, object) for each matching object under the nested path;
+        # fields inside the nested query are addressed as "<path>.<field>"
+        path = config["path"]
+        matches = []
+        for offset, item in enumerate(source.get(path) or []):
+            flat = {f"{path}.{key}": value for key, value in item.items()}
+            score = self.score(config["query"], flat)
+            if score is not None:
+                matches.append((score, offset, item))
+        return matches
+
+    def nested_inner_hits(self, query, source, doc_id, index_name):
+        config = query["nested"]
+        options = config["inner_hits"]
+        matches = sorted(self.nested_scores(config, source), key=lambda match: -match[0])
+        hits = []
+        for score, offset, item in matches[:options.get("size", 3)]:
+            hit = {"_index": index_name, "_id": doc_id, "_nested": {"field": config["path"], "offset": offset},
+                   "_score": score}
+            filtered = self.filter_source({f"{config['path']}.{k}": v for k, v in item.items()},
+                                          {"includes": options["_source"]} if "_source" in options else None)
+            if filtered is not None:
+                hit["_source"] = {key.split(".", 1)[1]: value for key, value in filtered.items()}
+            hits.append(hit)
+        name = options.get("name", config["path"])
+        return {name: {"hits": {"total": {"value": len(matches), "relation": "eq"},
+                                "max_score": matches[0][0] if matches else None, "hits": hits}}}
+
+    def collapse(self, scored, config):
+        # Keep the best hit per field value; inner_hits list the group's top hits
+        groups, order = {}, []
+        for item in scored:
+            key = item[4].get(config["field"])
+            if key not in groups:
+                groups[key] = []
+                order.append(key)
+            groups[key].append(item)
+        return [(groups[key][0], groups[key]) for key in order]
+
+    def explanation(self, score):
+        return {"value": score, "description": "mock score", "details": []}
+
+    def field_vector(self, source, field):
+        return source.get("_inference_fields", {}).get(field) or source.get(field)
+
+    def prune(self, query_vector, config):
+        # Approximation of token pruning: drop tokens whose weight is below the
+        # threshold relative to the best token
+        threshold = config.get("tokens_weight_threshold", 0.4) * max(query_vector.values(), default=0)
+        return {token: weight for token, weight in query_vector.items() if weight >= threshold}
+
+    def sparse_score(self, query_vector, doc_vector):
+        if not doc_vector:
+            return None
+        score = sum(weight * doc_vector[token] for token, weight in query_vector.items() if token in doc_vector)
+        return score or None
+
+    def lexical_score(self, text, values):
+        terms = set(tokenize(text))
+        score = 0.0
+        for value in values:
+            tokens = tokenize(value)
+            if tokens:
+                score += sum(1 for token in tokens if token in terms) / len(tokens) ** 0.5
+        return score or None
+
+    def filter_source(self, source, source_filter):
+        if source_filter is False:
+            return None
+        source = {key: value for key, value in source.items() if key != "_inference_fields"}
+        if not isinstance(source_filter, dict):
+            return source
+        includes = source_filter.get("includes")
+        excludes = set(source_filter.get("excludes", []))
+        filtered = {
+            key: value for key, value in source.items()
+            if key not in excludes and (includes is None or key in includes)
+        }
+        # One level of dotted excludes, e.g. "passages.vector" inside nested objects
+        for pattern in excludes:
+            parent, _, child = pattern.partition(".")
+            if child and isinstance(filtered.get(parent), list):
+                filtered[parent] = [
+                    {key: value for key, value in item.items() if key != child} if isinstance(item, dict) else item
+                    for item in filtered[parent]
+                ]
+        return filtered
+
+    def highlight(self, source, config):
+        out = {}
+        for field, options in config.get("fields", {}).items():
+            if field not in source:
+                continue
+            text = str(source[field])
+            size = options.get("fragment_size", 100) if options else len(text)
+            count = options.get("number_of_fragments", 5) if options else 1
+            out[field] = [text[i:i + size] for i in range(0, len(text), size)][:count] if count else [text]
+        return out
+
+    def score_hits(self, hits, query):
+        scored = []
+        for name, doc_id, position, source in hits:
+            score = self.score(query, source)
+            if score is not None:
+                scored.append((score, name, doc_id, position, source))
+        # Only score/_doc sorting is supported, which is what the search profiles use
+        scored.sort(key=lambda item: (-item[0], item[3]))
+        return scored
+
+    def retrieve(self, hits, retriever):
+        if "standard" in retriever:
+            return self.score_hits(hits, retriever["standard"].get("query"))
+        if "rrf" in retriever:
+            # Reciprocal rank fusion over the top rank_window_size of each child
+            config = retriever["rrf"]
+            rank_constant = config.get("rank_constant", 60)
+            window = config.get("rank_window_size", 100)
+            fused, items = defaultdict(float), {}
+            for child in config["retrievers"]:
+                for rank, item in enumerate(self.retrieve(hits, child)[:window], start=1):
+                    key = (item[1], item[2])
+                    fused[key] += 1 / (rank_constant + rank)
+                    items[key] = item
+            scored = [(score, *items[key][1:]) for key, score in fused.items()]
+            scored.sort(key=lambda item: (-item[0], item[3]))
+            return scored
+        raise ApiException(400, "parsing_exception", f"unknown retriever [{next(iter(retriever))}]")
+
+    def vector_matrix(self, name, field, rows):
+        # Float and quantized matrices of one index's vectors, rebuilt after writes
+        index = self.indices[name]
+        # id() tells a recreated index apart; the entry keeps the old one alive
+        version = (id(index), index["seq_no"], len(index["docs"]), len(rows))
+        cached = self.vector_cache.get((name, field))
+        if cached is None or cached[0] != version:
+            mapping = index["mappings"].get("properties", {}).get(field, {})
+            matrix = np.array([source[field] for *_, source in rows], dtype=np.float32)
+            bits = QUANTIZATION_BITS.get(mapping.get("index_options", {}).get("type"))
+            cached = (version, matrix, quantize(matrix, bits), mapping.get("similarity", "cosine"), index)
+            self.vector_cache[(name, field)] = cached
+        return cached[1:4]
+
+    def knn(self, hits, config):
+        # Approximate kNN: the num_candidates best by the quantized vectors are
+        # rescored with the raw floats and the top k are returned
+        if np is None:
+            raise ApiException(400, "mock_unsupported", "knn search in the mock needs numpy")
+        field = config["field"]
+        k = config.get("k", 10)
+        num_candidates = config.get("num_candidates", max(k, 100) if "k" in config else 100)
+        if num_candidates < k:
+            raise ApiException(400, "illegal_argument_exception",
+                               "[num_candidates] cannot be less than [k]")
+        if self.knn_latency_per_candidate:
+            time.sleep(self.knn_latency_per_candidate * num_candidates)
+        filters = config.get("filter", [])
+        filters = [filters] if isinstance(filters, dict) else filters
+        candidates = []
+        for name in sorted({hit[0] for hit in hits}):
+            rows = [hit for hit in hits if hit[0] == name and hit[3].get(field) is not None]
+            if not rows:
+                continue
+            matrix, approx, similarity = self.vector_matrix(name, field, rows)
+            query = config.get("query_vector")
+            if query is None:
+                builder = config["query_vector_builder"]["text_embedding"]
+                query = fake_dense_embedding(builder["model_text"], matrix.shape[1])
+            query = np.asarray(query, dtype=np.float32)
+            if query.shape[0] != matrix.shape[1]:
+                raise ApiException(400, "illegal_argument_exception",
+                                   f"the query vector has a different number of dimensions [{query.shape[0]}] "
+                                   f"than the document vectors [{matrix.shape[1]}]")
+            # Pre-filter: only documents matching the filter are candidates
+            allowed = np.array([all(self.score(f, row[3]) is not None for f in filters) for row in rows])
+            approx_scores = np.where(allowed, vector_scores(approx, query, similarity), -np.inf)
+            top = np.argsort(-approx_scores, kind="stable")[:num_candidates]
+            top = top[np.isfinite(approx_scores[top])]
+            exact = vector_scores(matrix[top], query, similarity)
+            candidates.extend((float(score), *rows[i][:3], rows[i][3]) for score, i in zip(exact, top))
+        candidates.sort(key=lambda item: (-item[0], item[3]))
+        return candidates[:k]
+
+    def search(self, index_names, body):
+        body = body or {}
+        if "knn" in body and "query" in body:
+            raise ApiException(400, "mock_unsupported", "the mock doesn't combine [knn] with [query]")
+        if "retriever" in body:
+            if not self.retrievers:
+                raise ApiException(400, "parsing_exception", "Unknown key for a START_OBJECT in [retriever].")
+            if "query" in body or "sort" in body or "search_after" in body:
+                raise ApiException(400, "action_request_validation_exception",
+                                   "cannot specify [retriever] and [query], [sort] or [search_after]")
+        hits = []
+        with self.lock:
+            for name in {concrete for requested in index_names for concrete in self.resolve(requested)}:
+                for position, (doc_id, source) in enumerate(list(self.get_index(name)["docs"].items())):
+                    hits.append((name, doc_id, position, source))
+        if "retriever" in body:
+            scored = self.retrieve(hits, body["retriever"])
+        elif "knn" in body:
+            scored = self.knn(hits, body["knn"])
+        else:
+            scored = self.score_hits(hits, body.get("query"))
+        total = len(scored)
+        groups = {}
+        if body.get("collapse"):
+            collapsed = self.collapse(scored, body["collapse"])
+            groups = {(best[1], best[2]): members for best, members in collapsed}
+            scored = [best for best, _ in collapsed]
+        if body.get("search_after"):
+            after_score, after_doc = body["search_after"]
+            scored = [item for item in scored if (-item[0], item[3]) > (-after_score, after_doc)]
+            start = 0
+        else:
+            start = body.get("from", 0)
+        size = body.get("size", 10)
+        out = []
+        for score, name, doc_id, position, source in scored[start:start + size]:
+            hit = {"_index": name, "_id": doc_id, "_score": score}
+            filtered = self.filter_source(source, body.get("_source"))
+            if filtered is not None:
+                hit["_source"] = filtered
+            if body.get("sort"):
+                hit["sort"] = [score, position]
+            if body.get("highlight"):
+                hit["highlight"] = self.highlight(source, body["highlight"])
+            if body.get("explain"):
+                hit["_explanation"] = self.explanation(score)
+            query = body.get("query") or {}
+            if "nested" in query and "inner_hits" in query["nested"]:
+                hit["inner_hits"] = self.nested_inner_hits(query, source, doc_id, name)
+            if body.get("collapse"):
+                hit["fields"] = {body["collapse"]["field"]: [source.get(body["collapse"]["field"])]}
+                inner = body["collapse"].get("inner_hits")
+                if inner:
+                    members = groups[(name, doc_id)][:inner.get("size", 3)]
+                    source_filter = {"includes": inner["_source"]} if "_source" in inner else None
+                    hit["inner_hits"] = {inner.get("name", "collapsed"): {"hits": {
+                        "total": {"value": len(groups[(name, doc_id)]), "relation": "eq"},
+                        "hits": [
+                            {"_index": m_name, "_id": m_id, "_score": m_score,
+                             "_source": self.filter_source(m_source, source_filter)}
+                            for m_score, m_name, m_id, _, m_source in members
+                        ],
+                    }}}
+            out.append(hit)
+        return {
+            "took": 1,
+            "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+            "hits": {
+                "total": {"value": total, "relation": "eq"},
+                "max_score": scored[0][0] if scored else None,
+                "hits": out,
+            },
+        }
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this keep-alive
+    # clients see ~40ms delayed-ACK stalls on every request
+    disable_nagle_algorithm = True
+    cluster = None
+    routes = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def do_HEAD(self):
+        self.dispatch("HEAD")
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if raw and self.headers.get("Content-Encoding") == "gzip":
+            return raw, gzip.decompress(raw)
+        return raw, raw
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        wire, raw = self.read_body()
+        for route_method, pattern, handler_name in self.routes:
+            if route_method != method:
+                continue
+            match = pattern.fullmatch(url.path)
+            if match:
+                self.cluster.record(handler_name, len(wire))
+                if self.cluster.latency:
+                    time.sleep(self.cluster.latency)
+                args = {key: unquote(value) for key, value in match.groupdict().items()}
+                try:
+                    status, body = getattr(self, handler_name)(raw, params, **args)
+                except ApiException as e:
+                    status, body = e.status, {"error": {"type": e.error_type, "reason": e.reason}, "status": e.status}
+                except (ValueError, KeyError) as e:
+                    status, body = 400, {"error": {"type": "parse_exception", "reason": str(e)}, "status": 400}
+                if body is not None:
+                    self.send_json(status, body, head=method == "HEAD")
+                return
+        self.send_json(404, {"error": {"type": "mock_unsupported", "reason": f"{method} {url.path}"}, "status": 404})
+
+    def send_json(self, status, body, head=False):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/vnd.elasticsearch+json;compatible-with=8")
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Length", str(0 if head else len(payload)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(payload)
+
+    def json_body(self, raw):
+        return json.loads(raw) if raw else {}
+
+    # -- handlers ----------------------------------------------------------
+
+    def info(self, raw, params):
+        return 200, {
+            "name": "mock-node",
+            "cluster_name": "mock-elasticsearch",
+            "version": {"number": "8.15.0", "build_flavor": "default"},
+            "tagline": "You Know, for Search",
+        }
+
+    def ping(self, raw, params):
+        return 200, {}
+
+    def create_index(self, raw, params, index):
+        with self.cluster.lock:
+            if index in self.cluster.indices or index in self.cluster.aliases:
+                raise ApiException(400, "resource_already_exists_exception", f"index [{index}] already exists")
+            body = self.json_body(raw)
+            self.cluster.indices[index] = self.cluster.new_index(index, body)
+            for alias, options in body.get("aliases", {}).items():
+                self.cluster.aliases.setdefault(alias, {})[index] = options
+        return 200, {"acknowledged": True, "shards_acknowledged": True, "index": index}
+
+    def delete_index(self, raw, params, index):
+        with self.cluster.lock:
+            if index not in self.cluster.indices:
+                raise ApiException(404, "index_not_found_exception", f"no such index [{index}]")
+            del self.cluster.indices[index]
+            for alias in list(self.cluster.aliases):
+                self.cluster.aliases[alias].pop(index, None)
+                if not self.cluster.aliases[alias]:
+                    del self.cluster.aliases[alias]
+        return 200, {"acknowledged": True}
+
+    def exists_index(self, raw, params, index):
+        return (200 if index in self.cluster.indices or index in self.cluster.aliases else 404), {}
+
+    def get_settings(self, raw, params, index, name=None):
+        wanted = name.split(",") if name else None
+        out = {}
+        with self.cluster.lock:
+            for concrete in self.cluster.resolve(index):
+                settings = {key: value for key, value in self.cluster.get_index(concrete)["settings"].items()
+                            if wanted is None or key in wanted}
+                if params.get("flat_settings") == "true":
+                    settings = {key: str(value).lower() if isinstance(value, bool) else str(value)
+                                for key, value in settings.items()}
+                else:
+                    settings = nest_settings(settings)
+                out[concrete] = {"settings": settings}
+        return 200, out
+
+    def put_settings(self, raw, params, index):
+        updates = flatten_settings(self.json_body(raw))
+        with self.cluster.lock:
+            for name in self.cluster.resolve(index):
+                settings = self.cluster.get_index(name)["settings"]
+                for key, value in updates.items():
+                    # null resets a setting to its default
+                    if value is None:
+                        settings.pop(key, None)
+                    else:
+                        settings[key] = value
+        return 200, {"acknowledged": True}
+
+    def forcemerge(self, raw, params, index):
+        for name in self.cluster.resolve(index):
+            self.cluster.get_index(name)
+        return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+    def update_aliases(self, raw, params):
+        # All actions are applied under one lock, so readers never see a
+        # state in between (the real API is atomic too)
+        actions = self.json_body(raw).get("actions", [])
+        with self.cluster.lock:
+            aliases = {alias: dict(members) for alias, members in self.cluster.aliases.items()}
+            indices_to_remove = []
+            for action in actions:
+                op, spec = next(iter(action.items()))
+                names = spec.get("indices") or [spec["index"]]
+                if op == "remove_index":
+                    for name in names:
+                        if name not in self.cluster.indices:
+                            raise ApiException(404, "index_not_found_exception", f"no such index [{name}]")
+                        indices_to_remove.append(name)
+                    continue
+                alias_names = spec.get("aliases") or [spec["alias"]]
+                for name in names:
+                    for alias in alias_names:
+                        if op == "add":
+                            if name not in self.cluster.indices:
+                                raise ApiException(404, "index_not_found_exception", f"no such index [{name}]")
+                            aliases.setdefault(alias, {})[name] = {
+                                key: spec[key] for key in ("is_write_index",) if key in spec
+                            }
+                        elif op == "remove":
+                            if name not in aliases.get(alias, {}):
+                                if spec.get("must_exist"):
+                                    raise ApiException(404, "aliases_not_found_exception",
+                                                       f"aliases [{alias}] missing")
+                                continue
+                            del aliases[alias][name]
+            for name in indices_to_remove:
+                del self.cluster.indices[name]
+                for members in aliases.values():
+                    members.pop(name, None)
+            for alias in aliases:
+                if alias in self.cluster.indices:
+                    raise ApiException(400, "invalid_alias_name_exception",
+                                       f"an index exists with the same name as the alias [{alias}]")
+            self.cluster.aliases = {alias: members for alias, members in aliases.items() if members}
+        return 200, {"acknowledged": True, "errors": False}
+
+    def get_alias(self, raw, params, name):
+        with self.cluster.lock:
+            if name not in self.cluster.aliases:
+                raise ApiException(404, "aliases_not_found_exception", f"alias [{name}] missing")
+            return 200, {index: {"aliases": {name: options}} for index, options in self.cluster.aliases[name].items()}
+
+    def exists_alias(self, raw, params, name):
+        return (200 if name in self.cluster.aliases else 404), {}
+
+    def refresh(self, raw, params, index):
+        self.cluster.get_index(index)
+        return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+    def get_mapping(self, raw, params, index):
+        return 200, {self.cluster.write_index(index): {"mappings": self.cluster.get_index(index)["mappings"]}}
+
+    def index_stats(self, raw, params, index, metric=None):
+        docs = self.cluster.get_index(index)["docs"]
+        size = sum(len(json.dumps(source)) for source in docs.values())
+        primaries = {"docs": {"count": len(docs)}, "store": {"size_in_bytes": size}}
+        return 200, {
+            "_all": {"primaries": primaries, "total": primaries},
+            "indices": {index: {"primaries": primaries, "total": primaries}},
+        }
+
+    def put_doc(self, raw, params, index, id=None):
+        doc_id, result, seq_no = self.cluster.index_doc(index, id, self.json_body(raw), params.get("pipeline"))
+        return (201 if result == "created" else 200), {
+            "_index": index, "_id": doc_id, "result": result, "_seq_no": seq_no, "_primary_term": 1,
+        }
+
+    def get_doc(self, raw, params, index, id):
+        source = self.cluster.get_index(index)["docs"].get(id)
+        if source is None:
+            return 404, {"_index": index, "_id": id, "found": False}
+        return 200, {"_index": index, "_id": id, "found": True, "_source": self.cluster.filter_source(source, None)}
+
+    def bulk(self, raw, params, index=None):
+        lines = [line for line in raw.decode("utf-8").split("\n") if line.strip()]
+        items, errors = [], False
+        i = 0
+        while i < len(lines):
+            action = json.loads(lines[i])
+            op, meta = next(iter(action.items()))
+            target = meta.get("_index", index)
+            doc_id = meta.get("_id")
+            if op == "delete":
+                i += 1
+                with self.cluster.lock:
+                    docs = self.cluster.indices.get(self.cluster.write_index(target), {}).get("docs", {})
+                    found = docs.pop(doc_id, None) is not None
+                items.append({op: {"_index": target, "_id": doc_id, "status": 200 if found else 404,
+                                   "result": "deleted" if found else "not_found"}})
+                continue
+            source = json.loads(lines[i + 1])
+            i += 2
+            if op == "update":
+                with self.cluster.lock:
+                    docs = self.cluster.indices.get(self.cluster.write_index(target), {}).get("docs", {})
+                    existing = dict(docs.get(doc_id, {}))
+                existing.update(source.get("doc", {}))
+                source = existing
+            try:
+                doc_id, result, seq_no = self.cluster.index_doc(
+                    target, doc_id, source, meta.get("pipeline", params.get("pipeline"))
+                )
+                items.append({op: {"_index": target, "_id": doc_id, "result": result, "_seq_no": seq_no,
+                                   "status": 201 if result == "created" else 200}})
+            except ApiException as e:
+                errors = True
+                items.append({op: {"_index": target, "_id": doc_id, "status": e.status,
+                                   "error": {"type": e.error_type, "reason": e.reason}}})
+        return 200, {"took": 1, "errors": errors, "items": items}
+
+    def search(self, raw, params, index=None):
+        names = index.split(",") if index else list(self.cluster.indices)
+        body = self.json_body(raw)
+        if "scroll" not in params:
+            return 200, self.cluster.search(names, body)
+        # Scroll: score everything once and hand out pages from the snapshot
+        size = int(params.get("size", body.get("size", 10)))
+        resp = self.cluster.search(names, dict(body, size=1 << 31))
+        hits = resp["hits"]["hits"]
+        scroll_id = uuid.uuid4().hex
+        with self.cluster.lock:
+            self.cluster.scrolls[scroll_id] = (hits[size:], size)
+        resp["hits"]["hits"] = hits[:size]
+        resp["_scroll_id"] = scroll_id
+        return 200, resp
+
+    def msearch(self, raw, params, index=None):
+        # NDJSON header/body pairs; each search fails or succeeds on its own
+        lines = [json.loads(line) for line in raw.decode().splitlines() if line.strip()]
+        responses = []
+        for header, body in zip(lines[::2], lines[1::2]):
+            target = header.get("index", index)
+            names = target.split(",") if isinstance(target, str) else target or list(self.cluster.indices)
+            try:
+                responses.append(dict(self.cluster.search(names, body), status=200))
+            except ApiException as e:
+                responses.append({"error": {"type": e.error_type, "reason": e.reason}, "status": e.status})
+        return 200, {"took": 1, "responses": responses}
+
+    def count(self, raw, params, index=None):
+        names = index.split(",") if index else list(self.cluster.indices)
+        body = self.json_body(raw)
+        total = self.cluster.search(names, {"query": body.get("query"), "size": 0})["hits"]["total"]["value"]
+        return 200, {"count": total, "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}}
+
+    def scroll(self, raw, params):
+        body = self.json_body(raw)
+        scroll_id = body.get("scroll_id") or params.get("scroll_id")
+        with self.cluster.lock:
+            if scroll_id not in self.cluster.scrolls:
+                raise ApiException(404, "search_context_missing_exception",
+                                   f"No search context found for id [{scroll_id}]")
+            remaining, size = self.cluster.scrolls[scroll_id]
+            self.cluster.scrolls[scroll_id] = (remaining[size:], size)
+        return 200, {
+            "_scroll_id": scroll_id, "took": 1, "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+            "hits": {"hits": remaining[:size]},
+        }
+
+    def clear_scroll(self, raw, params):
+        ids = self.json_body(raw).get("scroll_id", [])
+        with self.cluster.lock:
+            for scroll_id in [ids] if isinstance(ids, str) else ids:
+                self.cluster.scrolls.pop(scroll_id, None)
+        return 200, {"succeeded": True, "num_freed": len(ids)}
+
+    def mget(self, raw, params, index=None):
+        body = self.json_body(raw)
+        requests = body.get("docs") or [{"_id": doc_id} for doc_id in body.get("ids", [])]
+        includes = params.get("_source_includes")
+        source_filter = {"includes": includes.split(",")} if includes else None
+        if params.get("_source") == "false":
+            source_filter = False
+        docs = []
+        for request in requests:
+            name = request.get("_index", index)
+            with self.cluster.lock:
+                concrete = self.cluster.write_index(name)
+                source = self.cluster.indices.get(concrete, {}).get("docs", {}).get(request["_id"])
+            doc = {"_index": concrete, "_id": request["_id"], "found": source is not None}
+            if source is not None:
+                filtered = self.cluster.filter_source(source, source_filter)
+                if filtered is not None:
+                    doc["_source"] = filtered
+            docs.append(doc)
+        return 200, {"docs": docs}
+
+    def explain(self, raw, params, index, id):
+        source = self.cluster.get_index(index)["docs"].get(id)
+        if source is None:
+            return 404, {"_index": index, "_id": id, "matched": False}
+        score = self.cluster.score(self.json_body(raw).get("query"), source)
+        body = {"_index": index, "_id": id, "matched": score is not None}
+        if score is not None:
+            body["explanation"] = self.cluster.explanation(score)
+        return 200, body
+
+    def infer_trained_model(self, raw, params, model_id):
+        docs = self.json_body(raw).get("docs", [])
+        vectors = self.cluster.infer([next(iter(doc.values())) for doc in docs])
+        return 200, {"inference_results": [{"predicted_value": vector} for vector in vectors]}
+
+    def put_pipeline(self, raw, params, id):
+        self.cluster.pipelines[id] = self.json_body(raw)
+        return 200, {"acknowledged": True}
+
+    def get_pipeline(self, raw, params, id):
+        if id not in self.cluster.pipelines:
+            return 404, {}
+        return 200, {id: self.cluster.pipelines[id]}
+
+    def delete_pipeline(self, raw, params, id):
+        if self.cluster.pipelines.pop(id, None) is None:
+            raise ApiException(404, "resource_not_found_exception", f"pipeline [{id}] is missing")
+        return 200, {"acknowledged": True}
+
+    def get_inference(self, raw, params, task_type, inference_id):
+        endpoint = self.cluster.inference_endpoints.get(inference_id)
+        if endpoint is None or endpoint["task_type"] != task_type:
+            raise ApiException(404, "resource_not_found_exception",
+                               f"Inference endpoint not found [{inference_id}]")
+        # Like Elasticsearch, never echo secrets back
+        settings = {k: v for k, v in endpoint.get("service_settings", {}).items() if k != "api_key"}
+        return 200, {"endpoints": [dict(endpoint, service_settings=settings)]}
+
+    def put_inference(self, raw, params, task_type, inference_id):
+        if inference_id in self.cluster.inference_endpoints:
+            raise ApiException(400, "status_exception",
+                               f"Inference endpoint [{inference_id}] already exists")
+        endpoint = dict(self.json_body(raw), inference_id=inference_id, task_type=task_type)
+        self.cluster.inference_endpoints[inference_id] = endpoint
+        return 200, endpoint
+
+    def delete_inference(self, raw, params, task_type, inference_id):
+        if self.cluster.inference_endpoints.pop(inference_id, None) is None:
+            raise ApiException(404, "resource_not_found_exception",
+                               f"Inference endpoint not found [{inference_id}]")
+        return 200, {"acknowledged": True}
+
+    def update_deployment(self, raw, params, model_id):
+        endpoint = self.cluster.inference_endpoints.get(model_id)
+        if endpoint is None:
+            raise ApiException(404, "resource_not_found_exception",
+                               f"No known trained model deployment with id [{model_id}]")
+        body = self.json_body(raw)
+        settings = endpoint.setdefault("service_settings", {})
+        if "number_of_allocations" in body:
+            settings.pop("adaptive_allocations", None)
+            settings["num_allocations"] = body["number_of_allocations"]
+        if "adaptive_allocations" in body:
+            settings.pop("num_allocations", None)
+            settings["adaptive_allocations"] = body["adaptive_allocations"]
+        return 200, {"assignment": {"task_parameters": {"deployment_id": model_id, **settings}}}
+
+    def trained_model_stats(self, raw, params, model_id):
+        endpoint = self.cluster.inference_endpoints.get(model_id)
+        if endpoint is None:
+            raise ApiException(404, "resource_not_found_exception", f"No known trained model with model_id [{model_id}]")
+        settings = endpoint.get("service_settings", {})
+        allocations = deployment_allocations(settings)
+        return 200, {"count": 1, "trained_model_stats": [{
+            "model_id": model_id,
+            "deployment_stats": {
+                "deployment_id": model_id,
+                "state": "started",
+                "number_of_allocations": allocations,
+                "threads_per_allocation": settings.get("num_threads", 1),
+                "allocation_status": {"allocation_count": allocations, "target_allocation_count": allocations,
+                                      "state": "fully_allocated"},
+            },
+        }]}
+
+    def put_index_template(self, raw, params, name):
+        self.cluster.index_templates[name] = self.json_body(raw)
+        return 200, {"acknowledged": True}
+
+    def get_index_template(self, raw, params, name):
+        if name not in self.cluster.index_templates:
+            raise ApiException(404, "resource_not_found_exception", f"index template matching [{name}] not found")
+        return 200, {"index_templates": [{"name": name, "index_template": self.cluster.index_templates[name]}]}
+
+    def delete_index_template(self, raw, params, name):
+        if self.cluster.index_templates.pop(name, None) is None:
+            raise ApiException(404, "resource_not_found_exception", f"index_template [{name}] missing")
+        return 200, {"acknowledged": True}
+
+    def put_component_template(self, raw, params, name):
+        self.cluster.component_templates[name] = self.json_body(raw)
+        return 200, {"acknowledged": True}
+
+    def get_component_template(self, raw, params, name):
+        if name not in self.cluster.component_templates:
+            raise ApiException(404, "resource_not_found_exception", f"component template matching [{name}] not found")
+        return 200, {"component_templates": [
+            {"name": name, "component_template": self.cluster.component_templates[name]}
+        ]}
+
+    def delete_component_template(self, raw, params, name):
+        if self.cluster.component_templates.pop(name, None) is None:
+            raise ApiException(404, "resource_not_found_exception", f"component_template [{name}] missing")
+        return 200, {"acknowledged": True}
+
+    def put_lifecycle(self, raw, params, name):
+        with self.cluster.lock:
+            version = self.cluster.ilm_policies.get(name, {}).get("version", 0) + 1
+            self.cluster.ilm_policies[name] = {"version": version, "policy": self.json_body(raw).get("policy", {})}
+        return 200, {"acknowledged": True}
+
+    def get_lifecycle(self, raw, params, name):
+        if name not in self.cluster.ilm_policies:
+            raise ApiException(404, "resource_not_found_exception", f"Lifecycle policy not found: {name}")
+        return 200, {name: self.cluster.ilm_policies[name]}
+
+    def delete_lifecycle(self, raw, params, name):
+        if self.cluster.ilm_policies.pop(name, None) is None:
+            raise ApiException(404, "resource_not_found_exception", f"Lifecycle policy not found: {name}")
+        return 200, {"acknowledged": True}
+
+    def run_inference(self, raw, params, task_type, inference_id):
+        body = self.json_body(raw)
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if task_type == "sparse_embedding":
+            endpoint = self.cluster.inference_endpoints.get(inference_id)
+            if self.cluster.deployment_model and endpoint and endpoint.get("service") in ("elser", "elasticsearch"):
+                vectors = self.cluster.infer_deployment(endpoint, inputs)
+            else:
+                vectors = self.cluster.infer(inputs)
+            return 200, {"sparse_embedding": [{"is_truncated": False, "embedding": v} for v in vectors]}
+        if task_type == "completion":
+            return 200, {"completion": [{"result": f"Mock completion for: {text}"} for text in inputs]}
+        raise ApiException(400, "status_exception", f"Unsupported task type [{task_type}]")
+
+
+    def stream_inference(self, raw, params, task_type, inference_id):
+        if inference_id not in self.cluster.inference_endpoints:
+            raise ApiException(404, "resource_not_found_exception",
+                               f"Inference endpoint not found [{inference_id}]")
+        text = self.json_body(raw).get("input", "")
+        if isinstance(text, list):
+            text = " ".join(text)
+        # Server-sent events, one word per event, then close the connection
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for word in f"Mock completion for: {text}".split(" "):
+            if self.cluster.stream_token_delay:
+                time.sleep(self.cluster.stream_token_delay)
+            event = {"completion": [{"delta": word + " "}]}
+            self.wfile.write(f"event: message\ndata: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"event: message\ndata: [DONE]\n\n")
+        self.wfile.flush()
+        return 200, None
+
+
+def _route(method, path, handler):
+    pattern = re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", path)
+    return method, re.compile(pattern), handler
+
+
+MockRequestHandler.routes = [
+    _route("GET", "/", "info"),
+    _route("HEAD", "/", "ping"),
+    _route("POST", "/_bulk", "bulk"),
+    _route("PUT", "/_bulk", "bulk"),
+    _route("POST", "/_search/scroll", "scroll"),
+    _route("GET", "/_search/scroll", "scroll"),
+    _route("DELETE", "/_search/scroll", "clear_scroll"),
+    _route("POST", "/_mget", "mget"),
+    _route("POST", "/_msearch", "msearch"),
+    _route("GET", "/_msearch", "msearch"),
+    _route("GET", "/_search", "search"),
+    _route("POST", "/_search", "search"),
+    _route("POST", "/_ml/trained_models/{model_id}/_infer", "infer_trained_model"),
+    _route("POST", "/_ml/trained_models/{model_id}/deployment/_infer", "infer_trained_model"),
+    _route("POST", "/_ml/trained_models/{model_id}/deployment/_update", "update_deployment"),
+    _route("GET", "/_ml/trained_models/{model_id}/_stats", "trained_model_stats"),
+    _route("PUT", "/_index_template/{name}", "put_index_template"),
+    _route("POST", "/_index_template/{name}", "put_index_template"),
+    _route("GET", "/_index_template/{name}", "get_index_template"),
+    _route("DELETE", "/_index_template/{name}", "delete_index_template"),
+    _route("PUT", "/_component_template/{name}", "put_component_template"),
+    _route("POST", "/_component_template/{name}", "put_component_template"),
+    _route("GET", "/_component_template/{name}", "get_component_template"),
+    _route("DELETE", "/_component_template/{name}", "delete_component_template"),
+    _route("PUT", "/_ilm/policy/{name}", "put_lifecycle"),
+    _route("GET", "/_ilm/policy/{name}", "get_lifecycle"),
+    _route("DELETE", "/_ilm/policy/{name}", "delete_lifecycle"),
+    _route("PUT", "/_ingest/pipeline/{id}", "put_pipeline"),
+    _route("GET", "/_ingest/pipeline/{id}", "get_pipeline"),
+    _route("DELETE", "/_ingest/pipeline/{id}", "delete_pipeline"),
+    _route("GET", "/_inference/{task_type}/{inference_id}", "get_inference"),
+    _route("PUT", "/_inference/{task_type}/{inference_id}", "put_inference"),
+    _route("DELETE", "/_inference/{task_type}/{inference_id}", "delete_inference"),
+    _route("POST", "/_inference/{task_type}/{inference_id}", "run_inference"),
+    _route("POST", "/_inference/{task_type}/{inference_id}/_stream", "stream_inference"),
+    _route("POST", "/_aliases", "update_aliases"),
+    _route("GET", "/_alias/{name}", "get_alias"),
+    _route("HEAD", "/_alias/{name}", "exists_alias"),
+    _route("PUT", "/{index}", "create_index"),
+    _route("DELETE", "/{index}", "delete_index"),
+    _route("HEAD", "/{index}", "exists_index"),
+    _route("POST", "/{index}/_refresh", "refresh"),
+    _route("GET", "/{index}/_refresh", "refresh"),
+    _route("GET", "/{index}/_mapping", "get_mapping"),
+    _route("GET", "/{index}/_settings", "get_settings"),
+    _route("GET", "/{index}/_settings/{name}", "get_settings"),
+    _route("PUT", "/{index}/_settings", "put_settings"),
+    _route("POST", "/{index}/_forcemerge", "forcemerge"),
+    _route("GET", "/{index}/_stats", "index_stats"),
+    _route("GET", "/{index}/_stats/{metric}", "index_stats"),
+    _route("POST", "/{index}/_bulk", "bulk"),
+    _route("PUT", "/{index}/_bulk", "bulk"),
+    _route("GET", "/{index}/_count", "count"),
+    _route("POST", "/{index}/_count", "count"),
+    _route("POST", "/{index}/_mget", "mget"),
+    _route("POST", "/{index}/_msearch", "msearch"),
+    _route("GET", "/{index}/_mget", "mget"),
+    _route("GET", "/{index}/_search", "search"),
+    _route("POST", "/{index}/_search", "search"),
+    _route("GET", "/{index}/_explain/{id}", "explain"),
+    _route("POST", "/{index}/_explain/{id}", "explain"),
+    _route("PUT", "/{index}/_doc/{id}", "put_doc"),
+    _route("POST", "/{index}/_doc/{id}", "put_doc"),
+    _route("POST", "/{index}/_doc", "put_doc"),
+    _route("GET", "/{index}/_doc/{id}", "get_doc"),
+]
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 makes concurrent benchmarks stall on SYN retries
+    request_queue_size = 256
+
+
+def start_mock_server(host="127.0.0.1", port=0, latency=0.0, infer_latency_per_doc=0.0, stream_token_delay=0.0,
+                      deployment_model=None, retrievers=True, knn_latency_per_candidate=0.0):
+    cluster = MockCluster(latency=latency, infer_latency_per_doc=infer_latency_per_doc,
+                          stream_token_delay=stream_token_delay, deployment_model=deployment_model,
+                          retrievers=retrievers, knn_latency_per_candidate=knn_latency_per_candidate)
+    handler = type("BoundMockRequestHandler", (MockRequestHandler,), {"cluster": cluster})
+    server = MockServer((host, port), handler)
+    server.cluster = cluster
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://{host}:{server.server_address[1]}"
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an in-memory mock Elasticsearch server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--infer-latency-per-doc", type=float, default=0.0)
+    parser.add_argument("--stream-token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(args.host, args.port, args.latency, args.infer_latency_per_doc,
+                                    args.stream_token_delay)
+    print(f"Mock Elasticsearch listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+from elasticsearch import ApiError, ConnectionError, ConnectionTimeout, NotFoundError
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import re
+import time
+from dotenv import load_dotenv
+from endpoint_cache import registry
+from es_client import get_client
+from retry import CircuitOpenError, retry_call, single_attempt
+
+load_dotenv()
+
+# Declarative provisioning: a spec file lists inference endpoints, ingest
+# pipelines, ILM policies, component templates and index templates; the
+# reconciler reads what the cluster has, works out the difference and applies
+# only the changes, concurrently within each phase. Phases run in dependency
+# order because pipelines reference inference endpoints, component templates
+# can reference pipelines and ILM policies, and index templates are composed
+# of component templates.
+
+PHASES = ("inference_endpoints", "ingest_pipelines", "ilm_policies", "component_templates", "index_templates")
+
+# Settings that can change on a running ELSER/elasticsearch deployment without
+# recreating the endpoint
+DEPLOYMENT_SETTINGS = ("num_allocations", "adaptive_allocations")
+
+# Secrets are never returned by the cluster, so they can't be diffed
+SECRET_KEYS = ("api_key",)
+
+ENV_PATTERN = re.compile(r"\$\{(\w+)\}")
+
+
+def expand_env(value):
+    if isinstance(value, str):
+        return ENV_PATTERN.sub(lambda m: os.getenv(m.group(1), ""), value)
+    if isinstance(value, dict):
+        return {key: expand_env(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [expand_env(item) for item in value]
+    return value
+
+
+def load_spec(path):
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("PyYAML is required for YAML specs (pip install pyyaml), or use a .json spec")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    return expand_env(spec or {})
+
+
+def is_subset(desired, actual):
+    # True when every value in `desired` is present and equal in `actual`.
+    # Scalars are compared as strings because the cluster echoes some settings
+    # back as strings ("2" for number_of_shards).
+    if isinstance(desired, dict):
+        if not isinstance(actual, dict):
+            return False
+        return all(
+            key in SECRET_KEYS or (key in actual and is_subset(value, actual[key]))
+            for key, value in desired.items()
+        )
+    if isinstance(desired, list):
+        if not isinstance(actual, list) or len(desired) != len(actual):
+            return False
+        return all(is_subset(d, a) for d, a in zip(desired, actual))
+    return str(desired).lower() == str(actual).lower()
+
+
+class Change:
+    def __init__(self, kind, name, action, apply=None, detail=""):
+        self.kind = kind
+        self.name = name
+        self.action = action
+        self.apply = apply
+        self.detail = detail
+        self.plan_seconds = 0.0
+        self.apply_seconds = 0.0
+        self.error = None
+
+    def as_dict(self):
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "action": self.action,
+            "detail": self.detail,
+            "plan_ms": round(self.plan_seconds * 1000, 1),
+            "apply_ms": round(self.apply_seconds * 1000, 1),
+            "error": self.error,
+        }
+
+
+# -- inference endpoints -------------------------------------------------
+
+def inference_config(item):
+    return {
+        "service": item["service"],
+        "service_settings": item.get("service_settings", {}),
+        **({"task_settings": item["task_settings"]} if "task_settings" in item else {}),
+    }
+
+
+def plan_inference_endpoint(client, item):
+    inference_id, task_type = item["inference_id"], item["task_type"]
+    desired = inference_config(item)
+    endpoint = f"inference/{task_type}/{inference_id}"
+
+    def create():
+        retry_call(client.inference.put, task_type=task_type, inference_id=inference_id,
+                   inference_config=desired, endpoint=endpoint, operation="inference.put")
+        registry.put(task_type, inference_id)
+
+    try:
+        resp = retry_call(client.inference.get, task_type=task_type, inference_id=inference_id,
+                          endpoint=endpoint, operation="inference.get")
+    except NotFoundError:
+        return Change("inference_endpoint", inference_id, "create", create)
+
+    actual = resp["endpoints"][0]
+    if is_subset(desired, actual):
+        return Change("inference_endpoint", inference_id, "noop")
+
+    desired_settings = desired["service_settings"]
+    actual_settings = actual.get("service_settings", {})
+    other_keys = [key for key in desired_settings if key not in DEPLOYMENT_SETTINGS]
+    only_deployment_changed = (
+        desired["service"] == actual.get("service")
+        and desired["service"] in ("elser", "elasticsearch")
+        and is_subset({key: desired_settings[key] for key in other_keys}, actual_settings)
+        and is_subset(desired.get("task_settings", {}), actual.get("task_settings", {}))
+    )
+    if only_deployment_changed:
+        # Scale the running deployment in place instead of recreating it
+        def update():
+            kwargs = {}
+            if "adaptive_allocations" in desired_settings:
+                kwargs["adaptive_allocations"] = desired_settings["adaptive_allocations"]
+            elif "num_allocations" in desired_settings:
+                kwargs["number_of_allocations"] = desired_settings["num_allocations"]
+            retry_call(client.ml.update_trained_model_deployment, model_id=inference_id, **kwargs,
+                       endpoint=endpoint, operation="ml.update_trained_model_deployment")
+        return Change("inference_endpoint", inference_id, "update", update, "allocations")
+
+    def replace():
+        retry_call(client.inference.delete, task_type=task_type, inference_id=inference_id, force=True,
+                   endpoint=endpoint, operation="inference.delete")
+        registry.invalidate(task_type, inference_id)
+        create()
+    return Change("inference_endpoint", inference_id, "replace", replace, "service settings changed")
+
+
+# -- ingest pipelines ----------------------------------------------------
+
+def plan_ingest_pipeline(client, item):
+    pipeline_id = item["id"]
+    desired = {key: value for key, value in item.items() if key != "id"}
+
+    def put():
+        retry_call(client.ingest.put_pipeline, id=pipeline_id, **desired, operation="ingest.put_pipeline")
+
+    try:
+        resp = retry_call(client.ingest.get_pipeline, id=pipeline_id, operation="ingest.get_pipeline")
+    except NotFoundError:
+        return Change("ingest_pipeline", pipeline_id, "create", put)
+    if is_subset(desired, resp[pipeline_id]):
+        return Change("ingest_pipeline", pipeline_id, "noop")
+    return Change("ingest_pipeline", pipeline_id, "update", put)
+
+
+# -- ILM policies --------------------------------------------------------
+
+def plan_ilm_policy(client, item):
+    name = item["name"]
+    desired = item["policy"]
+
+    def put():
+        # retry_call takes its own policy= keyword, so pass the body through a lambda
+        retry_call(lambda: single_attempt(client).ilm.put_lifecycle(name=name, policy=desired),
+                   operation="ilm.put_lifecycle")
+
+    try:
+        resp = retry_call(client.ilm.get_lifecycle, name=name, operation="ilm.get_lifecycle")
+    except NotFoundError:
+        return Change("ilm_policy", name, "create", put)
+    if is_subset(desired, resp[name]["policy"]):
+        return Change("ilm_policy", name, "noop")
+    return Change("ilm_policy", name, "update", put)
+
+
+# -- component templates -------------------------------------------------
+
+def plan_component_template(client, item):
+    name = item["name"]
+    desired = {key: value for key, value in item.items() if key != "name"}
+
+    def put():
+        retry_call(client.cluster.put_component_template, name=name, **desired,
+                   operation="cluster.put_component_template")
+
+    try:
+        resp = retry_call(client.cluster.get_component_template, name=name,
+                          operation="cluster.get_component_template")
+    except NotFoundError:
+        return Change("component_template", name, "create", put)
+    if is_subset(desired, resp["component_templates"][0]["component_template"]):
+        return Change("component_template", name, "noop")
+    return Change("component_template", name, "update", put)
+
+
+# -- index templates -----------------------------------------------------
+
+def plan_index_template(client, item):
+    name = item["name"]
+    desired = {key: value for key, value in item.items() if key != "name"}
+
+    def put():
+        retry_call(client.indices.put_index_template, name=name, **desired,
+                   operation="indices.put_index_template")
+
+    try:
+        resp = retry_call(client.indices.get_index_template, name=name, operation="indices.get_index_template")
+    except NotFoundError:
+        return Change("index_template", name, "create", put)
+    if is_subset(desired, resp["index_templates"][0]["index_template"]):
+        return Change("index_template", name, "noop")
+    return Change("index_template", name, "update", put)
+
+
+PLANNERS = {
+    "inference_endpoints": plan_inference_endpoint,
+    "ingest_pipelines": plan_ingest_pipeline,
+    "ilm_policies": plan_ilm_policy,
+    "component_templates": plan_component_template,
+    "index_templates": plan_index_template,
+}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    try:
+        return fn(*args), time.perf_counter() - start, None
+    except (ApiError, ConnectionError, ConnectionTimeout, CircuitOpenError) as e:
+        return None, time.perf_counter() - start, e
+
+
+def plan(client, spec, max_workers=8):
+    # Read the current state of every resource in parallel
+    changes = {phase: [] for phase in PHASES}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            (phase, item, executor.submit(timed, PLANNERS[phase], client, item))
+            for phase in PHASES for item in spec.get(phase, [])
+        ]
+        for phase, item, future in futures:
+            change, seconds, error = future.result()
+            if error is not None:
+                kind = phase[:-3] + "y" if phase.endswith("ies") else phase[:-1]
+                change = Change(kind, item.get("inference_id") or item.get("id") or item.get("name"), "error")
+                change.error = str(error)
+            change.plan_seconds = seconds
+            changes[phase].append(change)
+    return changes
+
+
+def apply(changes, max_workers=8):
+    # Phases run in order; the changes inside a phase run concurrently
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for phase in PHASES:
+            pending = [change for change in changes[phase] if change.apply is not None]
+            futures = [(change, executor.submit(timed, change.apply)) for change in pending]
+            for change, future in futures:
+                _, change.apply_seconds, error = future.result()
+                if error is not None:
+                    change.error = str(error)
+    return changes
+
+
+def reconcile(client, spec, dry_run=False, max_workers=8):
+    changes = plan(client, spec, max_workers)
+    if not dry_run:
+        apply(changes, max_workers)
+    return [change for phase in PHASES for change in changes[phase]]
+
+
+def print_report(changes, dry_run):
+    print(f"\n{'kind':<20} {'name':<32} {'action':<8} {'plan ms':>8} {'apply ms':>9}  detail")
+    for change in changes:
+        detail = change.error or change.detail
+        apply_ms = "-" if dry_run or change.apply is None else f"{change.apply_seconds * 1000:.1f}"
+        print(f"{change.kind:<20} {change.name:<32} {change.action:<8} "
+              f"{change.plan_seconds * 1000:>8.1f} {apply_ms:>9}  {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile inference endpoints, pipelines and templates with a spec")
+    parser.add_argument("spec", help="YAML or JSON spec file")
+    parser.add_argument("--dry-run", action="store_true", help="only show what would change")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    client = get_client()
+    start = time.perf_counter()
+    changes = reconcile(client, load_spec(args.spec), dry_run=args.dry_run, max_workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps({"elapsed_ms": elapsed * 1000, "changes": [c.as_dict() for c in changes]}, indent=2))
+    else:
+        print_report(changes, args.dry_run)
+        print(f"\nReconciled {len(changes)} resources in {elapsed:.2f}s"
+              f"{' (dry run)' if args.dry_run else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+from elasticsearch import ApiError, ConnectionError, ConnectionTimeout
+from collections import defaultdict
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+from instrumentation import policy_attempt
+
+load_dotenv()
+
+# Retry policy shared by every entry point: jittered exponential backoff,
+# Retry-After support for throttling responses, a total deadline per call and a
+# circuit breaker per endpoint so a failing service is not hammered.
+
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"Circuit for '{endpoint}' is open, retry in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class RetryMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {"calls": 0, "retries": 0, "failures": 0, "backoff_seconds": 0.0})
+
+    def record_call(self, operation):
+        with self._lock:
+            self._counters[operation]["calls"] += 1
+
+    def record_retry(self, operation, delay):
+        with self._lock:
+            self._counters[operation]["retries"] += 1
+            self._counters[operation]["backoff_seconds"] += delay
+
+    def record_failure(self, operation):
+        with self._lock:
+            self._counters[operation]["failures"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {operation: dict(counters) for operation, counters in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class CircuitBreaker:
+    # closed -> open after failure_threshold consecutive failures; after
+    # reset_timeout one trial call is let through (half-open) and its outcome
+    # closes or re-opens the circuit
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self, endpoint):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self.trial_in_flight):
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+                raise CircuitOpenError(endpoint, retry_in)
+            if state == "half_open":
+                self.trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(
+                failure_threshold=int(os.getenv("RETRY_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("RETRY_BREAKER_RESET", "30")),
+            )
+        return _breakers[endpoint]
+
+
+def retry_after_seconds(error):
+    headers = getattr(getattr(error, "meta", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def single_attempt(client):
+    # A view of the client (sharing its connection pool) without the
+    # transport's own retries, so the policy below is the only retry layer
+    return client.options(max_retries=0, retry_on_status=())
+
+
+def without_transport_retries(fn):
+    # Client API methods are rebound to a single_attempt() view; anything else
+    # (plain functions, lambdas) is called as is
+    owner = getattr(fn, "__self__", None)
+    if owner is None:
+        return fn
+    if hasattr(owner, "transport") and hasattr(owner, "options"):
+        return getattr(single_attempt(owner), fn.__name__)
+    parent = getattr(owner, "_client", None)
+    if hasattr(parent, "options"):
+        # Namespaced APIs (client.inference, client.indices...) wrap their parent client
+        return getattr(type(owner)(single_attempt(parent)), fn.__name__)
+    return fn
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30.0, deadline=60.0,
+                 retryable_statuses=RETRYABLE_STATUSES, metrics=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retryable_statuses = retryable_statuses
+        self.metrics = metrics if metrics is not None else retry_metrics
+
+    def is_retryable(self, error):
+        if isinstance(error, (ConnectionError, ConnectionTimeout)):
+            return True
+        return isinstance(error, ApiError) and error.meta.status in self.retryable_statuses
+
+    def compute_delay(self, attempt, error):
+        # Honor the server's Retry-After, otherwise "full jitter" exponential backoff
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def next_delay(self, attempt, error, started):
+        # Returns the delay before the next attempt, or None to give up
+        if not self.is_retryable(error) or attempt >= self.max_attempts:
+            return None
+        delay = self.compute_delay(attempt, error)
+        if self.deadline is not None and time.monotonic() - started + delay > self.deadline:
+            return None
+        return delay
+
+    def call(self, fn, *args, endpoint=None, operation=None, on_retry=None, **kwargs):
+        operation = operation or getattr(fn, "__name__", "call")
+        fn = without_transport_retries(fn)
+        breaker = get_breaker(endpoint) if endpoint else None
+        started = time.monotonic()
+        call_id = uuid.uuid4().hex[:16]
+        self.metrics.record_call(operation)
+        for attempt in range(1, self.max_attempts + 1):
+            if breaker:
+                breaker.before_call(endpoint)
+            try:
+                with policy_attempt(call_id, attempt):
+                    result = fn(*args, **kwargs)
+            except Exception as e:
+                if breaker:
+                    # Non-retryable errors (404, 400...) still prove the endpoint is up
+                    if self.is_retryable(e):
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                delay = self.next_delay(attempt, e, started)
+                if delay is None:
+                    if self.is_retryable(e):
+                        self.metrics.record_failure(operation)
+                    raise
+                self.metrics.record_retry(operation, delay)
+                if on_retry:
+                    on_retry(e, delay)
+                print(f"{operation} failed ({type(e).__name__}). Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+                continue
+            if breaker:
+                breaker.record_success()
+            return result
+
+    async def call_async(self, fn, *args, endpoint=None, operation=None, on_retry=None, **kwargs):
+        operation = operation or getattr(fn, "__name__", "call")
+        fn = without_transport_retries(fn)
+        breaker = get_breaker(endpoint) if endpoint else None
+        started = time.monotonic()
+        call_id = uuid.uuid4().hex[:16]
+        self.metrics.record_call(operation)
+        for attempt in range(1, self.max_attempts + 1):
+            if breaker:
+                breaker.before_call(endpoint)
+            try:
+                with policy_attempt(call_id, attempt):
+                    result = await fn(*args, **kwargs)
+            except Exception as e:
+                if breaker:
+                    if self.is_retryable(e):
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                delay = self.next_delay(attempt, e, started)
+                if delay is None:
+                    if self.is_retryable(e):
+                        self.metrics.record_failure(operation)
+                    raise
+                self.metrics.record_retry(operation, delay)
+                if on_retry:
+                    on_retry(e, delay)
+                await asyncio.sleep(delay)
+                continue
+            if breaker:
+                breaker.record_success()
+            return result
+
+
+def policy_from_env():
+    return RetryPolicy(
+        max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "5")),
+        base_delay=float(os.getenv("RETRY_BASE_DELAY", "0.5")),
+        max_delay=float(os.getenv("RETRY_MAX_DELAY", "30")),
+        deadline=float(os.getenv("RETRY_DEADLINE", "60")),
+    )
+
+
+retry_metrics = RetryMetrics()
+default_policy = policy_from_env()
+
+
+def retry_call(fn, *args, policy=None, **kwargs):
+    return (policy or default_policy).call(fn, *args, **kwargs)
+
+
+async def retry_call_async(fn, *args, policy=None, **kwargs):
+    return await (policy or default_policy).call_async(fn, *args, **kwargs)
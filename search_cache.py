@@ -0,0 +1,150 @@
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Result cache for semantic_search. Keys are built from the normalized query
+# text, the index and the index generation; the generation is bumped whenever
+# index_documents writes to the index, so stale results are never served after
+# a write and old entries simply age out of the LRU.
+
+
+def normalize_query(query):
+    return " ".join(str(query).lower().split())
+
+
+class InProcessBackend:
+    # Size-bounded LRU with a per-entry TTL. Values are copied in and out, so
+    # callers mutating a result can't change what later hits return.
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key, value, ttl):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    # External backend shared between processes. Redis applies the TTL and its
+    # own maxmemory/LRU policy, so no local bookkeeping is needed.
+    def __init__(self, url="redis://localhost:6379/0", prefix="semantic_search:"):
+        import redis  # optional dependency, only needed for this backend
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.redis.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.redis.set(self.prefix + key, json.dumps(value, default=str), ex=max(1, int(ttl)))
+
+    # Generations live in Redis too, so a write from one process invalidates
+    # the results cached by all of them
+    def generation(self, index_name):
+        return int(self.redis.get(f"{self.prefix}generation:{index_name}") or 0)
+
+    def bump_generation(self, index_name):
+        self.redis.incr(f"{self.prefix}generation:{index_name}")
+
+    def clear(self):
+        for key in self.redis.scan_iter(self.prefix + "*"):
+            self.redis.delete(key)
+
+
+class SearchCache:
+    def __init__(self, backend=None, ttl=300.0):
+        self.backend = backend if backend is not None else InProcessBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, index_name):
+        if hasattr(self.backend, "generation"):
+            return self.backend.generation(index_name)
+        return self._generations.get(index_name, 0)
+
+    def invalidate_index(self, index_name):
+        # Bump the generation so every key for this index changes
+        if hasattr(self.backend, "bump_generation"):
+            self.backend.bump_generation(index_name)
+            return
+        with self._lock:
+            self._generations[index_name] = self._generations.get(index_name, 0) + 1
+
+    def make_key(self, index_name, query, **variant):
+        raw = json.dumps(
+            [index_name, self.generation(index_name), normalize_query(query), variant],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get_or_search(self, index_name, query, search, **variant):
+        key = self.make_key(index_name, query, **variant)
+        result = self.backend.get(key)
+        with self._lock:
+            if result is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if result is not None:
+            return result
+        # Hits and misses both return the plain body, not the ObjectApiResponse
+        # wrapper; the backend keeps its own copy
+        result = search()
+        result = getattr(result, "body", result)
+        self.backend.set(key, result, self.ttl)
+        return result
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+def backend_from_env():
+    url = os.getenv("SEARCH_CACHE_REDIS_URL")
+    if url:
+        return RedisBackend(url)
+    return InProcessBackend(max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024")))
+
+
+# Shared cache; pass it as semantic_search(..., cache=search_cache) to enable caching
+search_cache = SearchCache(backend=backend_from_env(), ttl=float(os.getenv("SEARCH_CACHE_TTL", "300")))
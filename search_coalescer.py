@@ -0,0 +1,171 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import copy
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from latency import LatencyHistogram
+
+load_dotenv()
+
+# Coalesces concurrent searches into _msearch requests. Searches that arrive
+# within max_wait of the first one waiting (or until max_batch are waiting) go
+# out together, and each caller gets its own response back. A search identical
+# to one already waiting or in flight doesn't get sent again; it waits for the
+# same response, and gets its own copy so callers can't change each other's
+# results. Results are not kept after they are delivered, which is what
+# search_cache is for.
+
+
+class MultiSearchError(Exception):
+    # One failed search of an _msearch; attributes mirror elasticsearch.ApiError
+    def __init__(self, status_code, body):
+        super().__init__(f"search failed with status {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class SearchCoalescer:
+    def __init__(self, client, max_wait=0.005, max_batch=32, max_in_flight=4):
+        self.client = client
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.searches = 0
+        self.deduplicated = 0
+        self.sent = 0
+        self.batches = 0
+        self.max_batch_size = 0
+        self.wait_times = LatencyHistogram()
+        self._queue = []
+        self._in_flight = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        # Batches are sent from a pool so a slow _msearch doesn't hold up the next one
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    def submit(self, index, body):
+        key = json.dumps([index, body], sort_keys=True, default=str)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SearchCoalescer is closed")
+            self.searches += 1
+            future = Future()
+            waiters = self._in_flight.get(key)
+            if waiters is not None:
+                self.deduplicated += 1
+                waiters.append(future)
+                return future
+            self._in_flight[key] = [future]
+            self._queue.append((key, index, body, future, time.perf_counter()))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="search-coalescer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def search(self, index, body, timeout=None):
+        # Drop-in for client.search(index=..., body=...); returns the plain response body
+        return self.submit(index, body).result(timeout)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # The window starts when the oldest search started waiting
+                deadline = self._queue[0][4] + self.max_wait
+                while len(self._queue) < self.max_batch and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        sent_at = time.perf_counter()
+        for *_, queued_at in batch:
+            self.wait_times.record(sent_at - queued_at)
+        searches = []
+        for _, index, body, _, _ in batch:
+            searches.extend([{"index": index}, body])
+        try:
+            responses = self.client.msearch(searches=searches)["responses"]
+        except Exception as e:
+            responses = [e] * len(batch)
+        with self._cond:
+            self.batches += 1
+            self.sent += len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            # Searches arriving from now on are sent again rather than joining this result
+            waiters = [self._in_flight.pop(key, [future]) for key, _, _, future, _ in batch]
+        for futures, resp in zip(waiters, responses):
+            if isinstance(resp, Exception):
+                error = resp
+            elif "error" in resp:
+                error = MultiSearchError(resp.get("status"), resp["error"])
+            else:
+                resp.pop("status", None)
+                # Copies are taken before the first caller can touch the response
+                results = [resp] + [copy.deepcopy(resp) for _ in futures[1:]]
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+                continue
+            for future in futures:
+                future.set_exception(error)
+
+    def stats(self):
+        with self._cond:
+            waits = self.wait_times.summary()
+            return {
+                "searches": self.searches,
+                "deduplicated": self.deduplicated,
+                "batches": self.batches,
+                "mean_batch_size": self.sent / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                # One _msearch instead of one search per caller
+                "round_trips_saved": max(0, self.sent + self.deduplicated - self.batches),
+                "wait_p50_ms": waits["p50_ms"],
+                "wait_p95_ms": waits["p95_ms"],
+                "wait_max_ms": waits["max_ms"],
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown(wait=True)
+
+
+_coalescers = {}
+_coalescers_lock = threading.Lock()
+
+
+def get_search_coalescer(client):
+    # One coalescer per cluster connection (client.options() copies share the
+    # transport); set SEARCH_COALESCING=false to send searches directly
+    if os.getenv("SEARCH_COALESCING", "true").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    with _coalescers_lock:
+        coalescer = _coalescers.get(client.transport)
+        if coalescer is None:
+            coalescer = SearchCoalescer(
+                client,
+                max_wait=float(os.getenv("SEARCH_COALESCE_WAIT_MS", "5")) / 1000,
+                max_batch=int(os.getenv("SEARCH_COALESCE_MAX_BATCH", "32")),
+            )
+            _coalescers[client.transport] = coalescer
+        return coalescer
+
+
+def format_stats(stats):
+    return (f"Search coalescing: {stats['searches']} searches in {stats['batches']} _msearch requests "
+            f"(mean batch {stats['mean_batch_size']:.1f}, max {stats['max_batch_size']}), "
+            f"{stats['deduplicated']} deduplicated, {stats['round_trips_saved']} round-trips saved, "
+            f"p95 wait {stats['wait_p95_ms']:.1f} ms")
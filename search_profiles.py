@@ -0,0 +1,58 @@
+import copy
+
+# Search profiles shape everything in a search request except the query itself.
+#   "lean"  - the default: no explain, no sparse vectors in _source, short
+#             highlight fragments and search_after pagination
+#   "debug" - the original behaviour: explain on every hit, whole-field
+#             highlights and the full _source including content_vector
+SEARCH_PROFILES = {
+    "lean": {
+        "_source": {"excludes": ["content_vector", "content_semantic"]},
+        "highlight": {
+            "fields": {
+                "content": {"fragment_size": 150, "number_of_fragments": 3}
+            }
+        },
+        # _doc is a cheap tiebreaker so search_after has a stable position;
+        # use a point in time with _shard_doc if pages must be exact across refreshes
+        "sort": [{"_score": "desc"}, {"_doc": "asc"}],
+    },
+    "debug": {
+        "highlight": {
+            "fields": {
+                "content": {}
+            }
+        },
+        "explain": True,
+    },
+}
+
+DEFAULT_PROFILE = "lean"
+
+
+def apply_profile(query_body, profile=DEFAULT_PROFILE, size=10, search_after=None):
+    if profile not in SEARCH_PROFILES:
+        raise ValueError(f"Unknown search profile '{profile}', expected one of {list(SEARCH_PROFILES)}")
+    body = copy.deepcopy(SEARCH_PROFILES[profile])
+    body.update(query_body)
+    body["size"] = size
+    if search_after is not None:
+        if "sort" not in body:
+            raise ValueError(f"Search profile '{profile}' does not support search_after pagination")
+        body["search_after"] = search_after
+    return body
+
+
+def next_search_after(results):
+    # Sort values of the last hit, to pass as search_after for the next page
+    hits = results["hits"]["hits"]
+    if not hits or "sort" not in hits[-1]:
+        return None
+    return hits[-1]["sort"]
+
+
+def explain_hit(client, index_name, query_body, doc_id):
+    # Fetch the relevance explanation for a single hit on demand instead of
+    # computing it for every hit of every search
+    resp = client.explain(index=index_name, id=doc_id, query=query_body["query"])
+    return resp.get("explanation")
@@ -0,0 +1,118 @@
+from elasticsearch import ApiError
+import argparse
+from dotenv import load_dotenv
+from create_inference import create_or_get_inference
+from es_client import get_client
+from ingest import bulk_index_documents
+from search_cache import search_cache
+
+load_dotenv()
+
+# Migration path away from the deprecated text_expansion query and the manually
+# populated content_vector field:
+#   "text_expansion" - current behaviour, query .elser_model_2 directly
+#   "sparse_vector"  - same content_vector mapping, but queried with the
+#                      sparse_vector query through an inference endpoint, with
+#                      optional token pruning
+#   "semantic_text"  - content is copied into a semantic_text field bound to the
+#                      inference endpoint, so Elasticsearch embeds on write and the
+#                      client never calls infer_trained_model
+QUERY_MODES = ("text_expansion", "sparse_vector", "semantic_text")
+
+SEMANTIC_FIELD = "content_semantic"
+
+# Drop query tokens that are very frequent in the index and carry little weight;
+# see the sparse_vector query documentation for the meaning of each threshold
+DEFAULT_PRUNING_CONFIG = {
+    "tokens_freq_ratio_threshold": 5,
+    "tokens_weight_threshold": 0.4,
+    "only_score_pruned_tokens": False
+}
+
+
+def semantic_text_mappings(inference_id):
+    return {
+        "properties": {
+            "title": {"type": "text"},
+            "content": {"type": "text", "copy_to": SEMANTIC_FIELD},
+            SEMANTIC_FIELD: {"type": "semantic_text", "inference_id": inference_id}
+        }
+    }
+
+
+def create_semantic_text_index(client, index_name, inference_id):
+    client.options(ignore_status=[400, 404]).indices.delete(index=index_name)
+    client.indices.create(index=index_name, mappings=semantic_text_mappings(inference_id))
+    search_cache.invalidate_index(index_name)
+    print(f"Index '{index_name}' created with semantic_text field bound to '{inference_id}'.")
+
+
+def index_semantic_text_documents(client, index_name, documents, **bulk_kwargs):
+    # Raw text only: the semantic_text field runs inference inside Elasticsearch
+    return bulk_index_documents(client, index_name, documents, embed=False, **bulk_kwargs)
+
+
+def build_sparse_vector_query(query, inference_id, pruning_config=None, field="content_vector"):
+    sparse_vector = {
+        "field": field,
+        "inference_id": inference_id,
+        "query": query
+    }
+    if pruning_config:
+        sparse_vector["prune"] = True
+        if pruning_config is not True:
+            sparse_vector["pruning_config"] = pruning_config
+    return {"query": {"sparse_vector": sparse_vector}}
+
+
+def build_semantic_text_query(query, field=SEMANTIC_FIELD):
+    return {"query": {"semantic": {"field": field, "query": query}}}
+
+
+def index_size_in_bytes(client, index_name):
+    stats = client.indices.stats(index=index_name, metric="store")
+    return stats["indices"][index_name]["primaries"]["store"]["size_in_bytes"]
+
+
+def main():
+    # Imported here because usage_examples builds its queries with this module
+    from usage_examples import SAMPLE_DOCUMENTS, semantic_search
+
+    parser = argparse.ArgumentParser(description="Create a semantic_text index and query it")
+    parser.add_argument("--index", default="elser_semantic_index")
+    parser.add_argument("--inference-id", default="elser_embeddings")
+    parser.add_argument("--query", default="What are the benefits of exercise?")
+    parser.add_argument("--mode", choices=("semantic_text", "sparse_vector"), default="semantic_text")
+    args = parser.parse_args()
+
+    client = get_client()
+    inference_id = create_or_get_inference(client, args.inference_id)
+    if not inference_id:
+        print("Failed to create or get inference.")
+        return
+
+    try:
+        if args.mode == "semantic_text":
+            create_semantic_text_index(client, args.index, inference_id)
+            stats = index_semantic_text_documents(client, args.index, [dict(d) for d in SAMPLE_DOCUMENTS])
+        else:
+            from usage_examples import create_index, index_documents
+            create_index(client, args.index)
+            stats = index_documents(client, args.index)
+        print(f"{stats['indexed']} documents indexed.")
+
+        results = semantic_search(client, args.index, args.query, mode=args.mode,
+                                  inference_id=inference_id, pruning_config=DEFAULT_PRUNING_CONFIG)
+    except ApiError as e:
+        print(f"Error: {e}")
+        return
+
+    print(f"\nSearch Query: {args.query}")
+    for hit in results['hits']['hits']:
+        print(f"Score: {hit['_score']}")
+        print(f"Title: {hit['_source']['title']}")
+        print("---")
+
+
+if __name__ == "__main__":
+    main()
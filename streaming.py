@@ -0,0 +1,130 @@
+from urllib.request import Request, urlopen
+from urllib.parse import quote
+from urllib.error import HTTPError
+import json
+import time
+from es_client import client_settings
+from instrumentation import get_recorder
+
+# Streaming completions through the inference _stream API (server-sent events).
+# The Elasticsearch Python client reads whole response bodies before returning,
+# so the stream is consumed with a plain HTTP connection to the same node,
+# using the URL and API key from es_client.client_settings().
+
+
+class StreamError(Exception):
+    pass
+
+
+class StreamTimings:
+    def __init__(self):
+        self.started = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def total(self):
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started
+
+    def as_dict(self):
+        return {
+            "time_to_first_token_ms": self.time_to_first_token * 1000 if self.first_token_at else None,
+            "total_ms": self.total * 1000 if self.finished_at else None,
+            "tokens": self.tokens,
+        }
+
+
+def iter_sse_events(lines):
+    # Minimal SSE parser: yields (event, data) once a blank line ends an event
+    event, data = "message", []
+    for raw in lines:
+        line = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+        line = line.rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].lstrip())
+    if data:
+        yield event, "\n".join(data)
+
+
+def iter_completion_deltas(events):
+    for event, data in events:
+        if data == "[DONE]":
+            return
+        payload = json.loads(data)
+        if event == "error" or "error" in payload:
+            raise StreamError(payload.get("error", payload))
+        for chunk in payload.get("completion", []):
+            delta = chunk.get("delta")
+            if delta:
+                yield delta
+
+
+def open_completion_stream(inference_id, input_text, base_url=None, api_key=None, timeout=None):
+    settings = client_settings()
+    base_url = (base_url or settings["hosts"][0]).rstrip("/")
+    api_key = api_key if api_key is not None else settings.get("api_key")
+    headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+    if api_key:
+        headers["Authorization"] = f"ApiKey {api_key}"
+    request = Request(
+        f"{base_url}/_inference/completion/{quote(inference_id, safe='')}/_stream",
+        data=json.dumps({"input": input_text}).encode(),
+        headers=headers,
+        method="POST",
+    )
+    try:
+        return urlopen(request, timeout=timeout or settings["request_timeout"])
+    except HTTPError as e:
+        raise StreamError(f"HTTP {e.code}: {e.read().decode('utf-8', 'replace')}") from e
+
+
+def stream_completion(inference_id, input_text, timings=None, base_url=None, api_key=None, timeout=None):
+    # Yields completion text deltas as they arrive; pass a StreamTimings to get
+    # time-to-first-token and total latency once the generator is exhausted
+    timings = timings if timings is not None else StreamTimings()
+    timings.started = time.perf_counter()
+    response = open_completion_stream(inference_id, input_text, base_url, api_key, timeout)
+    error = None
+    try:
+        for delta in iter_completion_deltas(iter_sse_events(response)):
+            if timings.first_token_at is None:
+                timings.first_token_at = time.perf_counter()
+            timings.tokens += 1
+            yield delta
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        timings.finished_at = time.perf_counter()
+        response.close()
+        # Streams bypass the client's transport, so they are recorded here
+        recorder = get_recorder()
+        if recorder.enabled:
+            recorder.record({
+                "ts": time.time(),
+                "operation": "POST inference.completion.stream",
+                "path": f"/_inference/completion/{inference_id}/_stream",
+                "status": response.status,
+                "duration_ms": timings.total * 1000,
+                "time_to_first_token_ms": (timings.time_to_first_token * 1000
+                                           if timings.first_token_at else None),
+                "chunks": timings.tokens,
+                "error": error,
+            })
@@ -1,96 +1,111 @@
 import streamlit as st
-from elasticsearch import Elasticsearch, ApiError, ConnectionTimeout, NotFoundError
-import os
-import time
+from elasticsearch import ApiError, ConnectionError, ConnectionTimeout
 from dotenv import load_dotenv
-from usage_examples import semantic_search
+from es_client import get_client
+from create_inference_openai import create_or_get_inference, extract_completion, run_completion
+from endpoint_cache import registry
+from hybrid_search import HYBRID_METHODS, hybrid_search
+from instrumentation import format_summary, get_recorder
+from knn_search import knn_search, parse_vector
+from latency import summarize
+from retry import CircuitOpenError
+from search_cache import search_cache
+from search_coalescer import format_stats as format_coalescer_stats, get_search_coalescer
+from search_profiles import next_search_after
+from streaming import StreamError, StreamTimings, stream_completion
+from usage_examples import explain_result, semantic_search
+from contextlib import contextmanager
 import json
+import os
+import time
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Elasticsearch client
-client = Elasticsearch(
-    "https://my-elastic-project-a943bc.es.us-east-1.aws.elastic.cloud:443",
-    api_key=os.getenv('ELASTIC_API_KEY')
-)
+# Streamlit runs this whole script on every interaction; the timing panel in
+# the sidebar shows where each rerun spends its time
+rerun_started = time.perf_counter()
+rerun_timings = {}
+RERUN_HISTORY = 50
+
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        rerun_timings[phase] = rerun_timings.get(phase, 0.0) + time.perf_counter() - start
 
 # Define the index name
 index_name = "elser_test_index"
+# Dense vectors loaded by vector_loader.py, searched in kNN mode. Without a
+# text embedding model the query is typed in as a vector.
+vector_index_name = os.getenv("VECTOR_INDEX", "search-rp3o")
+knn_model_id = os.getenv("KNN_MODEL_ID")
 
-def create_or_get_inference(client, inference_id):
-    max_retries = 3
-    retry_delay = 5
 
-    for attempt in range(max_retries):
-        try:
-            # Check if inference already exists
-            try:
-                existing_inference = client.inference.get(task_type="completion", inference_id=inference_id)
-                print(f"Inference '{inference_id}' already exists:")
-                print(existing_inference)
-                return True
-            except NotFoundError:
-                # Inference doesn't exist, proceed with creation
-                pass
-
-            resp = client.inference.put(
-                task_type="completion",
-                inference_id=inference_id,
-                inference_config={
-                    "service": "openai",
-                    "service_settings": {
-                        "api_key": os.getenv("OPENAI_API_KEY"),
-                        "model_id": "gpt-3.5-turbo"
-                    }
-                }
-            )
-            if resp:
-                print("Inference creation response:")
-                print(resp)
-                return True
-            else:
-                print("No response received from the inference creation request.")
-                return False
-        except ConnectionTimeout:
-            if attempt < max_retries - 1:
-                print(f"Connection timed out. Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+@st.cache_resource
+def get_connection():
+    # One client per server process, shared by every session and rerun.
+    # Searches from concurrent sessions are batched into shared _msearch requests.
+    client = get_client()
+    return client, get_search_coalescer(client)
+
+
+@st.cache_resource(show_spinner="Setting up the OpenAI inference endpoint...")
+def get_inference_endpoint(inference_id):
+    client, _ = get_connection()
+    return create_or_get_inference(client, inference_id)
+
+
+@st.cache_data(ttl=search_cache.ttl, max_entries=256, show_spinner=False)
+def run_search(mode, query, generation, profile, search_after, hybrid_method, knn_k, knn_num_candidates,
+               knn_filter_text):
+    # Keyed by every argument; generation changes whenever the index is
+    # written, so results cached here never outlive a write
+    client, coalescer = get_connection()
+    with get_recorder().trace(f"streamlit {mode} search"):
+        if mode == "knn":
+            knn_filter = {"match": {"text": knn_filter_text}} if knn_filter_text else None
+            if knn_model_id:
+                results = knn_search(client, vector_index_name, k=knn_k, num_candidates=knn_num_candidates,
+                                     filter=knn_filter, query_text=query, model_id=knn_model_id,
+                                     cache=search_cache, coalescer=coalescer)
             else:
-                print("Max retries reached. Unable to create inference due to connection timeout.")
-                return False
-        except ApiError as e:
-            print(f"Error creating inference: {e}")
-            if "Model IDs must be unique" in str(e):
-                new_id = f"{inference_id}_{int(time.time())}"
-                print(f"Attempting to create inference with a new ID: {new_id}")
-                return create_or_get_inference(client, new_id)
-            return False
+                results = knn_search(client, vector_index_name, parse_vector(query), k=knn_k,
+                                     num_candidates=knn_num_candidates, filter=knn_filter,
+                                     cache=search_cache, coalescer=coalescer)
+        elif mode == "hybrid":
+            results = hybrid_search(client, index_name, query, cache=search_cache, method=hybrid_method,
+                                    profile=profile, search_after=search_after, coalescer=coalescer)
+        else:
+            results = semantic_search(client, index_name, query, cache=search_cache,
+                                      profile=profile, search_after=search_after, coalescer=coalescer)
+    # Plain body, not the ObjectApiResponse wrapper
+    return getattr(results, "body", results)
+
+
+@st.cache_data(ttl=search_cache.ttl, max_entries=256, show_spinner=False)
+def cached_explanation(hit_index, query, doc_id, generation):
+    # generation is only part of the cache key, as in run_search
+    client, _ = get_connection()
+    return explain_result(client, hit_index, query, doc_id)
+
 
 def use_openai_inference(client, inference_id, input_text):
     try:
-        resp = client.inference.inference(
-            task_type="completion",
-            inference_id=inference_id,
-            input=input_text,
-        )
-        # Print the full response for debugging
-        print("Full response:", resp)
-        
-        # Check if 'completion' is directly in the response
-        if 'completion' in resp:
-            return resp['completion']
-        # Check if 'inference_results' is in the response
-        elif 'inference_results' in resp and len(resp['inference_results']) > 0:
-            return resp['inference_results'][0].get('completion', 'No completion found')
-        else:
-            return "Unable to extract completion from response"
-    except ApiError as e:
+        resp = run_completion(client, inference_id, input_text)
+        return extract_completion(resp)
+    except (ApiError, ConnectionError, ConnectionTimeout, CircuitOpenError) as e:
         st.error(f"Error during inference: {e}")
         return None
 
 st.set_page_config(layout="wide")
 
+with timed("setup"):
+    client, coalescer = get_connection()
+
 st.title("Semantic Search and OpenAI Inference App")
 
 # Create two columns
@@ -99,54 +114,161 @@ col1, col2 = st.columns(2)
 with col1:
     st.header("Semantic Search")
     search_query = st.text_input("Enter your search query:")
+    debug_mode = st.checkbox("Debug mode (explain every hit, full documents)", key="search_debug_mode")
+    search_mode = st.radio("Search mode", ("ELSER", "Hybrid (BM25 + ELSER)", "Vector (kNN)"), horizontal=True,
+                           key="search_mode")
+    # Lexical matching alongside ELSER, still one request to the cluster
+    hybrid_mode = search_mode == "Hybrid (BM25 + ELSER)"
+    hybrid_method = st.radio("Fusion method", HYBRID_METHODS, horizontal=True, key="search_hybrid_method",
+                             disabled=not hybrid_mode)
+    knn_mode = search_mode == "Vector (kNN)"
+    if knn_mode:
+        knn_cols = st.columns(3)
+        knn_k = knn_cols[0].number_input("k", min_value=1, max_value=100, value=10, key="knn_k")
+        # More candidates per shard: better recall, slower search
+        knn_num_candidates = knn_cols[1].number_input("num_candidates", min_value=int(knn_k), max_value=10000,
+                                                      value=max(100, int(knn_k)), key="knn_num_candidates")
+        knn_filter_text = knn_cols[2].text_input("Only documents matching", key="knn_filter_text")
+        st.caption(f"kNN over '{vector_index_name}': "
+                   + (f"the query is embedded with '{knn_model_id}'" if knn_model_id
+                      else "enter the query as a comma-separated vector"))
     if st.button("Run Semantic Search", key="semantic_search_button"):
         if search_query:
-            try:
-                results = semantic_search(client, index_name, search_query)
-                st.subheader("Search Results:")
-                if results['hits']['total']['value'] > 0:
-                    for hit in results['hits']['hits']:
-                        with st.expander(f"Title: {hit['_source'].get('title', 'No title')}"):
-                            content = hit['_source'].get('content', 'No content available')
-                            highlighted_content = hit.get('highlight', {}).get('content', [content])[0]
-                            st.markdown(f"Content: {highlighted_content}", unsafe_allow_html=True)
-                            st.write(f"Score: {hit['_score']}")
-                            if 'explanation' in hit:
-                                with st.expander("Why is this relevant?"):
-                                    st.json(hit['explanation'])
-                            else:
-                                st.write("(No relevance explanation available)")
-                else:
-                    st.write("No results found.")
-                
-                with st.expander("Raw Results"):
-                    st.code(json.dumps(results, indent=2, default=str))
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
-                st.exception(e)
+            # Keep the query across reruns so explanations and paging work
+            st.session_state["active_query"] = search_query
+            st.session_state["search_pages"] = [None]
         else:
             st.warning("Please enter a search query.")
 
+    active_query = st.session_state.get("active_query")
+    if active_query:
+        profile = "debug" if debug_mode else "lean"
+        search_after = st.session_state["search_pages"][-1] if profile == "lean" else None
+        try:
+            if knn_mode:
+                mode, searched_index = "knn", vector_index_name
+                knn_args = (int(knn_k), int(knn_num_candidates), knn_filter_text)
+            else:
+                mode, searched_index = ("hybrid" if hybrid_mode else "semantic"), index_name
+                knn_args = (None, None, None)
+                # Only the linear method keeps a sort to page with
+                if hybrid_mode and hybrid_method != "linear":
+                    search_after = None
+            with timed("search"):
+                results = run_search(mode, active_query, search_cache.generation(searched_index), profile,
+                                     search_after, hybrid_method if hybrid_mode else None, *knn_args)
+            render_started = time.perf_counter()
+            st.subheader("Search Results:")
+            if results['hits']['hits']:
+                for hit in results['hits']['hits']:
+                    source = hit.get('_source', {})
+                    with st.expander(f"Title: {source.get('title') or source.get('text') or 'No title'}"):
+                        content = source.get('content') or source.get('text') or 'No content available'
+                        highlighted_content = " … ".join(hit.get('highlight', {}).get('content', [content]))
+                        st.markdown(f"Content: {highlighted_content}", unsafe_allow_html=True)
+                        st.write(f"Score: {hit['_score']}")
+                        # Explanations are only requested when the user asks for them
+                        if not knn_mode and st.checkbox("Why is this relevant?",
+                                                        key=f"explain_{hit['_index']}_{hit['_id']}"):
+                            with timed("explain"):
+                                explanation = hit.get('_explanation') or cached_explanation(
+                                    hit['_index'], active_query, hit['_id'], search_cache.generation(hit['_index'])
+                                )
+                            if explanation:
+                                st.json(explanation)
+                            else:
+                                st.write("(No relevance explanation available)")
+            else:
+                st.write("No results found.")
+
+            page_cols = st.columns(2)
+            if len(st.session_state["search_pages"]) > 1 and page_cols[0].button("Previous page"):
+                st.session_state["search_pages"].pop()
+                st.rerun()
+            next_page = next_search_after(results)
+            if profile == "lean" and next_page is not None and page_cols[1].button("Next page"):
+                st.session_state["search_pages"].append(next_page)
+                st.rerun()
+
+            # Serializing the whole response is slow for large pages, so only on request
+            if st.checkbox("Show raw results", key="show_raw_results"):
+                st.code(json.dumps(results, indent=2, default=str))
+            rerun_timings["render"] = time.perf_counter() - render_started
+        except Exception as e:
+            st.error(f"An error occurred: {str(e)}")
+            st.exception(e)
+
 with col2:
     st.header("OpenAI Inference")
-    inference_id = "openai_chat_completions"
-    if create_or_get_inference(client, inference_id):
+    # Looked up once per server process, not on every rerun
+    with timed("inference setup"):
+        inference_id = get_inference_endpoint("openai_chat_completions")
+    if not inference_id:
+        # Don't keep the failure; try again on the next rerun
+        get_inference_endpoint.clear()
+    if inference_id:
         input_text = st.text_area("Enter text for OpenAI inference:", height=150)
+        stream_output = st.checkbox("Stream the response", value=True, key="stream_completion")
         if st.button("Run OpenAI Inference", key="openai_inference_button"):
-            with st.spinner("Running inference..."):
-                result = use_openai_inference(client, inference_id, input_text)
-                if result:
-                    st.success("Inference Result:")
-                    st.markdown(f"""
-                    <div style="border:1px solid #28a745; border-radius:5px; padding:10px; background-color:#f8f9fa;">
-                        {result[0].get('result', 'No content available')}
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.error("Failed to get inference result")
+            if stream_output:
+                st.success("Inference Result:")
+                timings = StreamTimings()
+                try:
+                    # Tokens are rendered as they arrive instead of after the full generation
+                    st.write_stream(stream_completion(inference_id, input_text, timings=timings))
+                    st.caption(
+                        f"Time to first token: {timings.time_to_first_token * 1000:.0f} ms, "
+                        f"total: {timings.total * 1000:.0f} ms"
+                        if timings.first_token_at else "No tokens received"
+                    )
+                except (StreamError, OSError) as e:
+                    st.error(f"Error during streaming inference: {e}")
+            else:
+                with st.spinner("Running inference..."), timed("inference"):
+                    result = use_openai_inference(client, inference_id, input_text)
+                    if result:
+                        st.success("Inference Result:")
+                        st.markdown(f"""
+                        <div style="border:1px solid #28a745; border-radius:5px; padding:10px; background-color:#f8f9fa;">
+                            {result[0].get('result', 'No content available')}
+                        </div>
+                        """, unsafe_allow_html=True)
+                    else:
+                        st.error("Failed to get inference result")
     else:
         st.error("Failed to create or get inference.")
 
+endpoint_stats = registry.stats()
+st.sidebar.caption(
+    f"Inference endpoint cache: {endpoint_stats['hits']} hits, {endpoint_stats['misses']} misses "
+    f"({endpoint_stats['hit_rate']:.0%} hit rate)"
+)
+cache_stats = search_cache.stats()
+st.sidebar.caption(
+    f"Search result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+    f"({cache_stats['hit_rate']:.0%} hit rate)"
+)
+if coalescer is not None:
+    st.sidebar.caption(format_coalescer_stats(coalescer.stats()))
+
+recorder = get_recorder()
+if recorder.enabled:
+    # Every Elasticsearch call made by this server process, all sessions
+    with st.sidebar.expander("Elasticsearch calls"):
+        st.code(format_summary(recorder.summary()))
+
+# Rerun timing: this rerun by phase, and percentiles over this session's recent reruns
+rerun_total = time.perf_counter() - rerun_started
+rerun_history = st.session_state.setdefault("rerun_history", [])
+rerun_history.append(rerun_total)
+del rerun_history[:-RERUN_HISTORY]
+rerun_summary = summarize(rerun_history)
+with st.sidebar.expander("Rerun timing", expanded=True):
+    st.metric("This rerun", f"{rerun_total * 1000:.0f} ms")
+    st.table({"phase": list(rerun_timings), "ms": [round(seconds * 1000, 1) for seconds in rerun_timings.values()]})
+    st.caption(f"Last {rerun_summary['count']} reruns: p50 {rerun_summary['p50_ms']:.0f} ms, "
+               f"p95 {rerun_summary['p95_ms']:.0f} ms, max {rerun_summary['max_ms']:.0f} ms")
+
 # Add some custom CSS to make it look nicer
 st.markdown("""
 <style>
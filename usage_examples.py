@@ -1,25 +1,30 @@
-from elasticsearch import Elasticsearch
-import os
+import time
 from dotenv import load_dotenv
+from chunking import chunked_search_body
+from embedding_cache import format_stats, get_embedding_cache
+from es_client import get_client
+from instrumentation import get_recorder, run_with_summary
+from ingest import bulk_index_documents
+from search_cache import search_cache
+from search_profiles import DEFAULT_PROFILE, apply_profile, explain_hit
+from semantic_text import QUERY_MODES, build_semantic_text_query, build_sparse_vector_query
 
 # Load environment variables
 load_dotenv()
 
 def main():
     # Initialize Elasticsearch client
-    client = Elasticsearch(
-        "https://my-elastic-project-a943bc.es.us-east-1.aws.elastic.cloud:443",
-        api_key=os.getenv('ELASTIC_API_KEY')
-    )
+    client = get_client()
 
     # Define the index name
     index_name = "elser_test_index"
 
-    # Create the index with appropriate mappings
-    create_index(client, index_name)
+    recorder = get_recorder()
 
-    # Index some sample documents
-    index_documents(client, index_name)
+    # Build a new index with the sample documents and point the alias at it;
+    # searches keep hitting the previous index until the swap
+    with recorder.trace("rebuild_index"):
+        rebuild_index(client, index_name)
 
     # Print all documents in the index
     print("\nAll documents in the index:")
@@ -32,7 +37,8 @@ def main():
 
     # Perform a semantic search
     search_query = "What are the benefits of exercise?"
-    search_results = semantic_search(client, index_name, search_query)
+    with recorder.trace("semantic_search"):
+        search_results = semantic_search(client, index_name, search_query)
 
     # Print the search results
     print(f"\nSearch Query: {search_query}")
@@ -61,56 +67,141 @@ def main():
     sample_doc = client.get(index=index_name, id=1)
     print(sample_doc)
 
-def create_index(client, index_name):
-    index_body = {
-        "mappings": {
-            "properties": {
-                "title": {"type": "text"},
-                "content": {"type": "text"},
-                "content_vector": {"type": "sparse_vector"}
-            }
-        }
+INDEX_MAPPINGS = {
+    "properties": {
+        "title": {"type": "text"},
+        "content": {"type": "text"},
+        "content_vector": {"type": "sparse_vector"},
+        # Fingerprint written by incremental_sync.py for change detection
+        "content_hash": {"type": "keyword"}
     }
+}
+
+def create_index(client, index_name):
+    # Delete-and-recreate: searches fail until indexing finishes. Use
+    # rebuild_index for an index that is serving traffic.
     client.options(ignore_status=[400, 404]).indices.delete(index=index_name)
-    client.indices.create(index=index_name, body=index_body)
+    client.indices.create(index=index_name, body={"mappings": INDEX_MAPPINGS})
+    search_cache.invalidate_index(index_name)
     print(f"Index '{index_name}' created.")
 
-def index_documents(client, index_name):
-    documents = [
-        {
-            "title": "Benefits of Exercise",
-            "content": "Regular exercise improves cardiovascular health, strengthens muscles, and boosts mental well-beingHelp you get to and stay at a healthy weight. Along with diet, exercise plays an important role in maintaining a healthy weight and preventing obesity. If you are at a healthy weight, you can maintain it if the calories you eat and drink are equal to the amount of energy you burn. To lose weight, you need to use more calories than you eat and drink Help your body manage blood glucose (blood sugar) and insulin levels. Exercise can lower your blood glucose levels and help your insulin work better. This can reduce your risk of metabolic syndrome and type 2 diabetes. And if you already have one of these diseases, exercise can help you to manage it"
-        },
-        {
-            "title": "Healthy Eating Habits",
-            "content": "A balanced diet rich in fruits, vegetables, and whole grains provides essential nutrients for optimal health."
-        },
-        {
-            "title": "Importance of Sleep",
-            "content": "Adequate sleep is crucial for physical recovery, cognitive function, and overall health maintenance."
-        }
-    ]
-
-    for i, doc in enumerate(documents, start=1):
-        # Generate ELSER embedding for the content
-        embedding = client.ml.infer_trained_model(
-            model_id=".elser_model_2",
-            docs=[{"text_field": doc["content"]}]
-        )
-        
-        # Add the embedding to the document
-        doc["content_vector"] = embedding["inference_results"][0]["predicted_value"]
-
-        # Index the document with a unique ID
-        response = client.index(index=index_name, id=str(i), document=doc)
-        print(f"Document {i} indexed: {response['result']}")
-    
-    # Refresh the index to make the documents searchable immediately
-    client.indices.refresh(index=index_name)
-    print(f"{len(documents)} documents indexed and refreshed.")
-
-def semantic_search(client, index_name, query):
-    search_body = {
+SAMPLE_DOCUMENTS = [
+    {
+        "title": "Benefits of Exercise",
+        "content": "Regular exercise improves cardiovascular health, strengthens muscles, and boosts mental well-beingHelp you get to and stay at a healthy weight. Along with diet, exercise plays an important role in maintaining a healthy weight and preventing obesity. If you are at a healthy weight, you can maintain it if the calories you eat and drink are equal to the amount of energy you burn. To lose weight, you need to use more calories than you eat and drink Help your body manage blood glucose (blood sugar) and insulin levels. Exercise can lower your blood glucose levels and help your insulin work better. This can reduce your risk of metabolic syndrome and type 2 diabetes. And if you already have one of these diseases, exercise can help you to manage it"
+    },
+    {
+        "title": "Healthy Eating Habits",
+        "content": "A balanced diet rich in fruits, vegetables, and whole grains provides essential nutrients for optimal health."
+    },
+    {
+        "title": "Importance of Sleep",
+        "content": "Adequate sleep is crucial for physical recovery, cognitive function, and overall health maintenance."
+    }
+]
+
+def index_documents(client, index_name, documents=None, batch_size=32, thread_count=4,
+                    max_in_flight=4, refresh="end", pipeline=None, embedding_cache=None,
+                    use_embedding_cache=True):
+    if documents is None:
+        documents = [dict(doc) for doc in SAMPLE_DOCUMENTS]
+    # Recreating the index doesn't mean re-embedding unchanged documents
+    if embedding_cache is None and use_embedding_cache and not pipeline:
+        embedding_cache = get_embedding_cache()
+
+    # Embed in batches and bulk index them instead of one round-trip per document
+    stats = bulk_index_documents(
+        client, index_name, documents,
+        batch_size=batch_size, thread_count=thread_count,
+        max_in_flight=max_in_flight, refresh=refresh, pipeline=pipeline, embedding_cache=embedding_cache
+    )
+    print(f"{stats['indexed']} documents indexed ({stats['failed']} failed) "
+          f"in {stats['seconds']:.2f}s, refresh policy '{refresh}'.")
+    if embedding_cache is not None:
+        print(format_stats(embedding_cache.stats()))
+    return stats
+
+def alias_indices(client, alias):
+    if not client.indices.exists_alias(name=alias):
+        return []
+    return list(client.indices.get_alias(name=alias))
+
+def swap_alias(client, alias, new_index):
+    # One update_aliases call, so searches see either the old or the new index,
+    # never neither. Also used to roll back to a kept previous index.
+    old_indices = [name for name in alias_indices(client, alias) if name != new_index]
+    actions = [{"remove": {"index": name, "alias": alias}} for name in old_indices]
+    if not old_indices and client.indices.exists(index=alias):
+        # A concrete index left by create_index is replaced in the same call
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": new_index, "alias": alias, "is_write_index": True}})
+    client.indices.update_aliases(actions=actions)
+    search_cache.invalidate_index(alias)
+    return old_indices
+
+def serving_settings(client, alias):
+    # Replicas and refresh interval of the index the alias serves from now; a
+    # refresh_interval of None means the cluster default
+    settings = {"number_of_replicas": 1, "refresh_interval": None}
+    if not client.indices.exists(index=alias):
+        return settings
+    resp = client.indices.get_settings(index=alias, name="index.number_of_replicas,index.refresh_interval",
+                                       flat_settings=True)
+    current = next(iter(resp.values()), {}).get("settings", {})
+    if "index.number_of_replicas" in current:
+        settings["number_of_replicas"] = int(current["index.number_of_replicas"])
+    settings["refresh_interval"] = current.get("index.refresh_interval")
+    return settings
+
+def rebuild_index(client, alias, documents=None, replicas=None, refresh_interval=None, force_merge=False,
+                  keep_previous=False, max_failures=0, **index_kwargs):
+    # Blue/green rebuild: bulk load a new versioned index while the alias keeps
+    # serving the current one, then repoint the alias atomically. Replicas and
+    # refresh interval default to those of the current index.
+    restore = serving_settings(client, alias)
+    if replicas is not None:
+        restore["number_of_replicas"] = replicas
+    if refresh_interval is not None:
+        restore["refresh_interval"] = refresh_interval
+    new_index = f"{alias}_{int(time.time() * 1000)}"
+    client.indices.create(index=new_index, mappings=INDEX_MAPPINGS, settings={
+        # No periodic refreshes and no replica copies during the bulk load
+        "index": {"refresh_interval": "-1", "number_of_replicas": 0}
+    })
+    # Until the alias moves, a failure drops the half-built index
+    try:
+        stats = index_documents(client, new_index, documents, refresh="false", **index_kwargs)
+        if stats["failed"] > max_failures:
+            client.options(ignore_status=404).indices.delete(index=new_index)
+            print(f"Rebuild aborted: {stats['failed']} documents failed; '{alias}' is unchanged.")
+            return dict(stats, index=None, previous=alias_indices(client, alias))
+
+        # null resets refresh_interval to the cluster default
+        client.indices.put_settings(index=new_index, settings={"index": restore})
+        client.indices.refresh(index=new_index)
+        if force_merge:
+            # The index is read-mostly from now on; one segment per shard searches fastest
+            client.indices.forcemerge(index=new_index, max_num_segments=1)
+    except Exception:
+        client.options(ignore_status=404).indices.delete(index=new_index)
+        raise
+
+    old_indices = swap_alias(client, alias, new_index)
+    if not keep_previous:
+        for name in old_indices:
+            client.options(ignore_status=404).indices.delete(index=name)
+    print(f"Alias '{alias}' now points at '{new_index}'"
+          f"{f' (previous: {old_indices})' if old_indices else ''}.")
+    return dict(stats, index=new_index, previous=old_indices)
+
+def build_semantic_query(query, mode="text_expansion", inference_id=None, pruning_config=None):
+    if mode not in QUERY_MODES:
+        raise ValueError(f"Unknown query mode '{mode}', expected one of {QUERY_MODES}")
+    if mode == "sparse_vector":
+        return build_sparse_vector_query(query, inference_id, pruning_config)
+    if mode == "semantic_text":
+        return build_semantic_text_query(query)
+    return {
         "query": {
             "text_expansion": {
                 "content_vector": {
@@ -118,16 +209,38 @@ def semantic_search(client, index_name, query):
                     "model_text": query
                 }
             }
-        },
-        "highlight": {
-            "fields": {
-                "content": {}
-            }
-        },
-        "explain": True
+        }
     }
-    
-    return client.search(index=index_name, body=search_body)
+
+def build_semantic_search_body(query, profile=DEFAULT_PROFILE, size=10, search_after=None,
+                               mode="text_expansion", inference_id=None, pruning_config=None, chunk_storage=None):
+    body = apply_profile(
+        build_semantic_query(query, mode, inference_id, pruning_config),
+        profile, size=size, search_after=search_after
+    )
+    if chunk_storage:
+        # Index built by chunking.py: return parent documents, not passages
+        body = chunked_search_body(body, chunk_storage)
+    return body
+
+def semantic_search(client, index_name, query, cache=None, profile=DEFAULT_PROFILE, size=10, search_after=None,
+                    mode="text_expansion", inference_id=None, pruning_config=None, chunk_storage=None,
+                    coalescer=None):
+    search_body = build_semantic_search_body(query, profile, size=size, search_after=search_after,
+                                             mode=mode, inference_id=inference_id, pruning_config=pruning_config,
+                                             chunk_storage=chunk_storage)
+    # With a coalescer, concurrent searches share _msearch round-trips
+    search = coalescer.search if coalescer is not None else client.search
+    if cache is not None:
+        return cache.get_or_search(
+            index_name, query, lambda: search(index=index_name, body=search_body),
+            profile=profile, size=size, search_after=search_after,
+            mode=mode, inference_id=inference_id, pruning_config=pruning_config, chunk_storage=chunk_storage
+        )
+    return search(index=index_name, body=search_body)
+
+def explain_result(client, index_name, query, doc_id, mode="text_expansion", inference_id=None):
+    return explain_hit(client, index_name, build_semantic_query(query, mode, inference_id), doc_id)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_with_summary("usage_examples", main)
\ No newline at end of file
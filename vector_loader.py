@@ -0,0 +1,167 @@
+from elasticsearch import helpers
+import argparse
+import time
+import numpy as np
+from dotenv import load_dotenv
+from es_client import get_client
+from search_cache import search_cache
+
+load_dotenv()
+
+# Bulk loader for dense vectors held in NumPy arrays, .npy files or raw
+# float32 files. Files are memory-mapped and read one chunk at a time, so
+# millions of vectors can be loaded without holding them in memory. Rows are
+# handed to the client as array views; with orjson installed the client
+# serializes them straight from the buffer (see es_client), otherwise the
+# default serializer falls back to tolist().
+#
+# index_type picks the HNSW quantization:
+#   "hnsw"      - raw float32, 4 bytes per dimension
+#   "int8_hnsw" - 1 byte per dimension, the Elasticsearch default since 8.14
+#   "int4_hnsw" - half a byte per dimension
+#   "bbq_hnsw"  - 1 bit per dimension with rescoring, needs 64+ dimensions
+#   "flat" / "int8_flat" - brute force, for small or heavily filtered indices
+VECTOR_INDEX_TYPES = ("hnsw", "int8_hnsw", "int4_hnsw", "bbq_hnsw", "flat", "int8_flat")
+SIMILARITIES = ("cosine", "dot_product", "l2_norm", "max_inner_product")
+
+VECTOR_FIELD = "vector"
+TEXT_FIELD = "text"
+
+
+def dense_vector_mappings(dims, index_type="int8_hnsw", similarity="cosine", m=None, ef_construction=None,
+                          vector_field=VECTOR_FIELD, text_field=TEXT_FIELD):
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type '{index_type}', expected one of {VECTOR_INDEX_TYPES}")
+    if similarity not in SIMILARITIES:
+        raise ValueError(f"Unknown similarity '{similarity}', expected one of {SIMILARITIES}")
+    if index_type == "bbq_hnsw" and dims < 64:
+        raise ValueError(f"bbq_hnsw needs at least 64 dimensions, got {dims}")
+    index_options = {"type": index_type}
+    if m is not None and index_type.endswith("hnsw"):
+        index_options["m"] = m
+    if ef_construction is not None and index_type.endswith("hnsw"):
+        index_options["ef_construction"] = ef_construction
+    return {
+        "properties": {
+            text_field: {"type": "text"},
+            vector_field: {
+                "type": "dense_vector",
+                "dims": dims,
+                "index": True,
+                "similarity": similarity,
+                "index_options": index_options,
+            },
+        }
+    }
+
+
+def create_vector_index(client, index_name, dims, index_type="int8_hnsw", similarity="cosine", **mapping_kwargs):
+    client.options(ignore_status=[400, 404]).indices.delete(index=index_name)
+    client.indices.create(index=index_name,
+                          mappings=dense_vector_mappings(dims, index_type, similarity, **mapping_kwargs))
+    search_cache.invalidate_index(index_name)
+    print(f"Index '{index_name}' created for {dims}-dim {index_type} vectors ({similarity}).")
+
+
+def open_vectors(source, dims=None, dtype="float32"):
+    # An array is used as is; .npy files are memory-mapped; anything else is
+    # read as a raw little-endian matrix of `dims` columns
+    if isinstance(source, np.ndarray):
+        vectors = source
+    elif str(source).endswith(".npy"):
+        vectors = np.load(source, mmap_mode="r")
+    else:
+        if not dims:
+            raise ValueError(f"dims is required to read raw vectors from '{source}'")
+        vectors = np.memmap(source, dtype=dtype, mode="r").reshape(-1, dims)
+    if vectors.ndim != 2:
+        raise ValueError(f"Expected a 2-d array of vectors, got shape {vectors.shape}")
+    return vectors
+
+
+def vector_actions(index_name, vectors, ids=None, texts=None, start_id=0, read_rows=8192,
+                   vector_field=VECTOR_FIELD, text_field=TEXT_FIELD):
+    for offset in range(0, len(vectors), read_rows):
+        # One slice per read_rows rows: a memmap only pages in what is read.
+        # orjson needs C-contiguous float32/float64 rows, which .npy files
+        # already are, so this only copies unusual dtypes or layouts.
+        block = vectors[offset:offset + read_rows]
+        if block.dtype not in (np.float32, np.float64) or not block.flags.c_contiguous:
+            block = np.ascontiguousarray(block, dtype=np.float32)
+        for i, row in enumerate(block):
+            n = offset + i
+            source = {vector_field: row}
+            if texts is not None:
+                source[text_field] = texts[n]
+            doc_id = ids[n] if ids is not None else start_id + n
+            yield {"_index": index_name, "_id": str(doc_id), "_source": source}
+
+
+def load_vectors(client, index_name, vectors, ids=None, texts=None, chunk_size=500, thread_count=4,
+                 queue_size=4, max_chunk_bytes=50 * 1024 * 1024, fast_load=True, start_id=0,
+                 vector_field=VECTOR_FIELD, text_field=TEXT_FIELD):
+    vectors = open_vectors(vectors)
+    if fast_load:
+        # No refreshes while loading; HNSW graphs are built once per segment at the end
+        previous = client.indices.get_settings(index=index_name, name="index.refresh_interval",
+                                               flat_settings=True)
+        refresh_interval = next(iter(previous.values()), {}).get("settings", {}).get("index.refresh_interval")
+        client.indices.put_settings(index=index_name, settings={"index": {"refresh_interval": "-1"}})
+
+    actions = vector_actions(index_name, vectors, ids, texts, start_id, vector_field=vector_field,
+                             text_field=text_field)
+    stats = {"indexed": 0, "failed": 0, "seconds": 0.0, "docs_per_sec": 0.0, "bytes": 0, "bytes_per_sec": 0.0}
+    start = time.perf_counter()
+    try:
+        for ok, item in helpers.parallel_bulk(client, actions, thread_count=thread_count, chunk_size=chunk_size,
+                                              queue_size=queue_size, max_chunk_bytes=max_chunk_bytes,
+                                              raise_on_error=False):
+            if ok:
+                stats["indexed"] += 1
+            else:
+                stats["failed"] += 1
+                if stats["failed"] <= 5:
+                    print(f"Failed to index vector: {item}")
+    finally:
+        if fast_load:
+            # null restores the cluster default
+            client.indices.put_settings(index=index_name, settings={"index": {"refresh_interval": refresh_interval}})
+    client.indices.refresh(index=index_name)
+    search_cache.invalidate_index(index_name)
+
+    stats["seconds"] = time.perf_counter() - start
+    # Raw vector bytes read from the source; the JSON on the wire is ~3x larger
+    stats["bytes"] = stats["indexed"] * vectors.shape[1] * vectors.dtype.itemsize
+    if stats["seconds"] > 0:
+        stats["docs_per_sec"] = stats["indexed"] / stats["seconds"]
+        stats["bytes_per_sec"] = stats["bytes"] / stats["seconds"]
+    return stats
+
+
+def format_stats(stats):
+    return (f"Loaded {stats['indexed']} vectors ({stats['failed']} failed) in {stats['seconds']:.2f}s: "
+            f"{stats['docs_per_sec']:.0f} docs/sec, {stats['bytes_per_sec'] / 1e6:.1f} MB/sec of vector data")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load dense vectors from a .npy or raw float32 file")
+    parser.add_argument("path", help=".npy file, or a raw float32 file with --dims")
+    parser.add_argument("--index", default="search-rp3o")
+    parser.add_argument("--dims", type=int, default=None, help="vector dimensions of a raw file")
+    parser.add_argument("--index-type", choices=VECTOR_INDEX_TYPES, default="int8_hnsw")
+    parser.add_argument("--similarity", choices=SIMILARITIES, default="cosine")
+    parser.add_argument("--append", action="store_true", help="load into the existing index instead of recreating it")
+    parser.add_argument("--chunk-size", type=int, default=500, help="vectors per bulk request")
+    parser.add_argument("--workers", type=int, default=4, help="parallel bulk threads")
+    args = parser.parse_args()
+
+    client = get_client()
+    vectors = open_vectors(args.path, args.dims)
+    if not args.append:
+        create_vector_index(client, args.index, vectors.shape[1], args.index_type, args.similarity)
+    stats = load_vectors(client, args.index, vectors, chunk_size=args.chunk_size, thread_count=args.workers)
+    print(format_stats(stats))
+
+
+if __name__ == "__main__":
+    main()